@@ -5,22 +5,69 @@
 # Author: Jules L'Ortye (juleslortye@gmail.com)
 #
 # This script generates flight schedules and overview of arriving and departing flights
-# Parameters to be set in the main method include:
+# Parameters are read from a config file (flightdata.ini, section [FlightData]) and can be overridden with command
+# line flags, see getDefaultConfig and getArgumentParser. Parameters include:
 #
 #   - baseInputPath: path to input folder
 #   - baseOutputPath = path to output folder. This folder should contain a 'FlightSchedules', 'Flights',
 #     'Probabilities' and 'FlightStatistics' folder
 #   - checkExistingFiles = boolean to indicate whether existing overviews can be used if available (decreases
-#     computational time)
+#     computational time). Flight lists are reloaded from the memory-mapped column cache next to the csv
+#     (<name>.columns/) when it is up to date
 #   - computeProbDists = boolean to indicate whether the presence probabilities should be calculated based on
 #     arrFlightList and depFlightList
 #   - baseDate = base date which contains the year and the month, example: '2018-07-'
-#   - dayRange = range of days that belong to the base date, for example: range(1, 32)
+#   - dayStart, dayEnd = first and last day that belong to the base date, for example: 1 and 31
 #   - minBucket = minimum size of the buckets used to compute probability distributions
 #   - airlineMin = minimum of A/D movements per day for airline to be included in statistics in separate category
+#   - useStageCache = boolean to indicate whether statistics, probability distributions and the flight schedule are
+#     cached on disk and reused when their inputs (flight lists, parameters and input files) did not change
+#   - cachePath = path to the stage cache folder, containing the cached results and a manifest.json
+#   - occupancyBucket = bucket size in minutes of the aircraft on ground counts written to the 'Occupancy' folder
+#   - towMinutes = minutes a towed aircraft (GateIn differs from GateOut) holds each gate, used for the gate overlaps,
+#     gaps and utilisation written to the 'Gates' folder
+#   - distributionBackend = 'histogram' or 'sketch': the probability distributions are read from 2880-bin histograms
+#     (clipped at +/- one day) or from mergeable t-digest sketches with compression sketchCompression
+#   - sketchGroupBy = groups of the delay sketches written by the 'sketches' command, for example Airline,Hour
+#   - chunkSize = when larger than 0, the 'stats' and 'probs' commands read the flight list files of the base dates in
+#     partitions (comma separated, default baseDate) chunkSize flights at a time instead of loading them in memory,
+#     and the 'schedule' command builds one schedule of all partitions from sorted runs of chunkSize flights
+#   - forecastWeight = schedule column weighting every turnaround in the expected presence per minute per pier and
+#     terminal written by the 'forecast' command to the 'Forecast' folder ('none' counts aircraft)
+#   - scenarios, percentiles = number of delay scenarios drawn by the 'simulate' command from the presence
+#     probabilities and the percentiles of the aircraft on ground over them per simulationBucket minutes, written to
+#     the 'Occupancy' folder. simulationSeed seeds the draws, simulationSchedules > 0 also writes the flight schedules
+#     of that many scenarios with simulated ATA/ATD to the 'Simulation' folder
+#   - useFlightStore = boolean to indicate whether fetched flight lists are also stored in the SQLite flight store
+#     flightStore (default <baseOutputPath>/Flights/flights.sqlite), indexed on registration, scheduled time, airline,
+#     origin/destination, region and gate. Flight lists without a file are then read from the store when it holds
+#     every day of the period, before fetching them. The 'store' command stores the flight lists of the period, see
+#     FlightStore
+#   - the 'cube' command writes the movement counts per date, hour, direction, airline, region, customs class, pier and
+#     AC size to FlightStatistics/rollupCube<period>.npz, see readRollupCube and RollupCube.rollup for slicing it
+#   - outputCompression = 'none', 'gzip' or 'zstd': the flight lists, statistics, probability distributions and flight
+#     schedules are written as <name>.csv.gz or <name>.csv.zst, compressed on a separate thread. Readers detect the
+#     compression from the file contents. zstd needs the optional zstandard package (pip install .[zstd])
+#   - sweepMinBuckets, sweepAirlineMins = comma separated minBucket and airlineMin values of the 'sweep' command, which
+#     counts the flights once and writes the probability distributions and statistics of every value to the 'Sweep'
+#     folder, together with a summary of the groups kept and merged per value (default: minBucket and airlineMin)
+#   - writerQueue = the 'write' command writes every output on a background thread as soon as its stage is done; at
+#     most writerQueue outputs wait to be written before the next stage blocks (0 writes in the foreground)
+#   - probabilityFormat = 'csv', 'binary' or 'both': file format of the probability distributions. The binary format
+#     (ProbDists_<n>D.bin) holds all distributions as memory-mappable uint16 or float32 rows (probabilityDtype)
 #
-# Ensure proper credentials are set in the function getCredentials!
-# Ensure that all packages as indicated under IMPORT PACKAGES are installed. In addition, install xlrd!
+# Usage: schiphol-flightdata {fetch,stats,probs,schedule,occupancy,gates,rotations,sketches,forecast,simulate,cube,store,sweep,write,status,serve} [--config FILE] [flags]
+# (or python main.py ...)
+#
+# To use the script as a library, for example in a scheduling service, create one FlightDataEngine(config) and ask it
+# for the flight lists, flight schedules, statistics and probability distributions of any period. It keeps the
+# reference files, the API connection and the recent results in memory and can be shared by threads.
+#
+# Ensure proper credentials are set in the function getCredentials! With several keys, set credentials in the config
+# file or the SCHIPHOL_CREDENTIALS environment variable as 'id:key,id:key': days are then fetched in parallel, one
+# worker process per key.
+# Ensure that all packages as indicated under IMPORT PACKAGES are installed (pip install . installs them together with
+# the schiphol-flightdata command). In addition, install xlrd!
 #
 # Ensure that the proper input files are available in the input folder. These include:
 #   InputAircraft.xlsx and InputAirport.xls
@@ -31,10 +78,47 @@
 #######################
 
 
-import requests, sys, time, numpy as np, math, pandas, os
-from datetime import datetime
-from pandas import DataFrame
-from collections import Counter
+import sys, time, math, os, hashlib, json, pickle, argparse, configparser, importlib.util, shutil, heapq, re
+import multiprocessing, urllib.parse, itertools, csv, io, threading, queue, atexit
+from datetime import datetime, timedelta
+from collections import Counter, OrderedDict
+
+
+# numpy, pandas and requests take about a second to import, they are only loaded when first used so that
+# light commands such as 'status' start immediately
+
+def lazyImport(moduleName):
+
+    if moduleName in sys.modules:
+        return sys.modules[moduleName]
+
+    spec = importlib.util.find_spec(moduleName)
+
+    if spec is None:
+        return MissingModule(moduleName)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[moduleName] = module
+    loader.exec_module(module)
+
+    return module
+
+
+class MissingModule:
+
+    def __init__(self, moduleName):
+        self.moduleName = moduleName
+
+    def __getattr__(self, name):
+        raise ImportError("Package '" + self.moduleName + "' is required for this command, install it first")
+
+
+np = lazyImport('numpy')
+pandas = lazyImport('pandas')
+requests = lazyImport('requests')
+zstandard = lazyImport('zstandard')
 
 
 #########################
@@ -42,30 +126,46 @@ from collections import Counter
 #########################
 
 
-def getIntervals(dataRaw):
-    flight = dataRaw[0]
-    baseDate = dataRaw[1]
+def getIntervalsBatch(baseDate, scheduleTimes, startTimes, endTimes):
 
-    startTimeRaw = "{}".format(flight['checkinAllocations']['checkinAllocations'][0][u'startTime'])
-    endTimeRaw = "{}".format(flight['checkinAllocations']['checkinAllocations'][0][u'endTime'])
-    flightTimeRaw = "{}".format(flight['scheduleTime'])[0:5]
+    # Check-in and departure intervals (minutes) of all departures of a day: baseDate is 'dd-mm-YYYY', scheduleTimes
+    # 'HH:MM:SS' and startTimes/endTimes the check-in allocation timestamps, None where there is no allocation. The
+    # differences are taken modulo one day, like timedelta.seconds. Returns [checkin, departure, allocated].
 
-    flightTime = datetime.strptime(baseDate + " " + flightTimeRaw, '%d-%m-%Y %H:%M')
-    startTime = datetime.strptime(startTimeRaw[0:10] + " " + startTimeRaw[11:16], '%Y-%m-%d %H:%M')
-    endTime = datetime.strptime(endTimeRaw[0:10] + " " + endTimeRaw[11:16], '%Y-%m-%d %H:%M')
+    isoDate = baseDate[6:10] + '-' + baseDate[3:5] + '-' + baseDate[0:2]
 
-    checkinIntervalSeconds = endTime - startTime
-    departureIntervalSeconds = flightTime - endTime
+    # 'YYYY-mm-ddTHH:MM' parsed by numpy, a value numpy cannot parse becomes NaT like a missing one
+    def toMinutes(timestamps):
+        timestamps = [v[0:10] + 'T' + v[11:16] if isinstance(v, str) else 'NaT' for v in timestamps]
+        try:
+            return np.array(timestamps, dtype='datetime64[m]')
+        except ValueError:
+            return np.array([parseMinute(v) for v in timestamps], dtype='datetime64[m]')
+
+    def parseMinute(timestamp):
+        try:
+            return np.datetime64(timestamp, 'm')
+        except ValueError:
+            return np.datetime64('NaT', 'm')
+
+    flightTime = toMinutes([isoDate + ' ' + v[0:5] if isinstance(v, str) else None for v in scheduleTimes])
+    startTime = toMinutes(startTimes)
+    endTime = toMinutes(endTimes)
 
-    checkinIntervalMinutes = checkinIntervalSeconds.seconds / 60
-    departureIntervalMinutes = departureIntervalSeconds.seconds / 60
+    allocated = ~(np.isnat(flightTime) | np.isnat(startTime) | np.isnat(endTime))
 
-    shortage = max(0, 40 - departureIntervalMinutes)
+    checkinIntervalMinutes = np.where(allocated, (endTime - startTime).astype(np.int64), 0) % 1440
+    departureIntervalMinutes = np.where(allocated, (flightTime - endTime).astype(np.int64), 0) % 1440
+
+    shortage = np.maximum(0, 40 - departureIntervalMinutes)
 
     checkinIntervalMinutes -= shortage
     departureIntervalMinutes += shortage
 
-    return list([max(min(checkinIntervalMinutes,200),80), max(min(departureIntervalMinutes,80),40)])
+    checkinIntervalMinutes = np.clip(checkinIntervalMinutes, 80, 200)
+    departureIntervalMinutes = np.clip(departureIntervalMinutes, 40, 80)
+
+    return list([checkinIntervalMinutes, departureIntervalMinutes, allocated])
 
 
 def removeNoneFlights(grid):
@@ -152,7 +252,7 @@ def getFlightsHeaders():
          'TimeDiff', 'BaggageClaim'])
 
     depHeaders = list(['Rego', 'FlightNumber', 'STD', 'ATD', 'AC Type', 'Destination', 'Airline', 'Gate', 'Terminal', 'Codeshares',
-         'TimeDiff', 'CheckinInterval', 'DepartureInterval'])
+         'TimeDiff', 'CheckinInterval', 'DepartureInterval', 'CheckinAllocated'])
 
     return list([arrHeaders,depHeaders])
 
@@ -179,6 +279,8 @@ def makeList(checkList):
 
 
 def getColumn(matrix, i):
+    if isinstance(matrix, FlightColumns):
+        return matrix.getColumnValues(i)
     return [row[i] for row in matrix]
 
 
@@ -207,52 +309,89 @@ def cleanAddClean(addCleanRawSorted):
     return addClean
 
 
-def getFlightIDS(flightsNoIn, flightsNoOut):
+def encodeCodeshares(codeshares):
 
-    if '[]' in flightsNoIn:
-        flightsNoIn.remove('[]')
+    # codeshares are stored as 'KL1234;AF5678', a flight without codeshares as 'NS'
 
-    if '[]' in flightsNoOut:
-        flightsNoOut.remove('[]')
+    codeshares = [str(codeshare) for codeshare in codeshares if str(codeshare) != '']
 
+    if codeshares == []:
+        return 'NS'
 
-    inKL = makeList([s.startswith('KL') for s in flightsNoIn])
-    outKL = makeList([s.startswith('KL') for s in flightsNoOut])
+    return ';'.join(codeshares)
 
-    if sum(inKL) > 0 and sum(outKL) > 0:
 
-        # Both KL
-        indexInKL = makeList([i for i, x in enumerate(inKL) if x])[0]
-        indexOutKL = makeList([i for i, x in enumerate(outKL) if x])[0]
+def decodeCodeshares(codesharesRaw):
 
-        flightNo = list([flightsNoIn[indexInKL], flightsNoOut[indexOutKL]])
+    # accepts lists, the encoding of encodeCodeshares and the list representation of older flight list files
 
-    else:
+    if isinstance(codesharesRaw, list):
+        return [str(codeshare) for codeshare in codesharesRaw]
+
+    if not isinstance(codesharesRaw, str) or codesharesRaw in ['NS', '', '[]', 'nan']:
+        return []
+
+    if codesharesRaw.startswith('['):
+        return re.findall(r"'([^']*)'", codesharesRaw)
+
+    return codesharesRaw.split(';')
+
+
+def getCarrierFlights(flightNumber, codeshares):
+
+    # carrier prefix -> flight number, the operating flight first followed by the codeshares in their listed order
+
+    carrierFlights = {}
+
+    for flight in [str(flightNumber)] + codeshares:
+        if flight != '' and flight[0:2] not in carrierFlights:
+            carrierFlights[flight[0:2]] = flight
 
-        AirlinesIn = [x[0:2] for i, x in enumerate(flightsNoIn)]
-        AirlinesOut = [x[0:2] for i, x in enumerate(flightsNoOut)]
+    return carrierFlights
 
-        AirlinesBothAll = list(filter(lambda x: x in AirlinesIn, AirlinesOut))
+
+def getFlightIDS(carriersIn, carriersOut):
+
+    # Both KL
+    if 'KL' in carriersIn and 'KL' in carriersOut:
+
+        flightNo = list([carriersIn['KL'], carriersOut['KL']])
+
+    else:
+
+        AirlinesBothAll = [carrier for carrier in carriersOut if carrier in carriersIn]
 
         # No matching airlines
         if AirlinesBothAll == []:
 
-            flightNo = list([flightsNoIn[0], flightsNoOut[0]])
+            flightNo = list([next(iter(carriersIn.values())), next(iter(carriersOut.values()))])
 
         # matching airlines other than KL
         else:
 
             AirlinesBoth = AirlinesBothAll[0]
 
-            inAirline = makeList([s.startswith(AirlinesBoth) for s in flightsNoIn])
-            outAirline = makeList([s.startswith(AirlinesBoth) for s in flightsNoOut])
+            flightNo = list([carriersIn[AirlinesBoth], carriersOut[AirlinesBoth]])
 
-            indexInAirline = makeList([i for i, x in enumerate(inAirline) if x])[0]
-            indexOutAirline = makeList([i for i, x in enumerate(outAirline) if x])[0]
+    return flightNo
 
-            flightNo = list([flightsNoIn[indexInAirline], flightsNoOut[indexOutAirline]])
 
-    return flightNo
+class CodeshareIndex:
+
+    # getCarrierFlights of every row of one flight list, decoded once, rows are positions in the flight list
+
+    def __init__(self, FlightList):
+
+        flightNumbers = getColumn(FlightList, 1)
+        codeshares = getColumn(FlightList, 9)
+
+        self.carrierFlights = []
+
+        for row in range(len(flightNumbers)):
+            self.carrierFlights.append(getCarrierFlights(flightNumbers[row], decodeCodeshares(codeshares[row])))
+
+    def getCarrierFlights(self, row):
+        return self.carrierFlights[row]
 
 
 def getRegions(baseInputPath,airportInOut):
@@ -275,6 +414,38 @@ def getRegions(baseInputPath,airportInOut):
     return regionInOut
 
 
+def getAirportReference(baseInputPath, AirportData=None):
+
+    # airport -> [region, customs] from InputAirport.xls (or its already read AirportData), read once instead of once
+    # per lookup as in getRegions
+
+    if AirportData is None:
+        AirportData = pandas.read_excel(baseInputPath + 'InputAirport.xls')
+    Airports = AirportData["TNA_CODE_IATA"]
+
+    airportReference = {}
+
+    for IndexAirportInt, airport in enumerate(Airports):
+
+        if airport in airportReference:
+            continue
+
+        RegionAirport = "{}".format(AirportData.iat[IndexAirportInt, 5])
+        EU = "{}".format(AirportData.iat[IndexAirportInt, 18])
+        ER = "{}".format(AirportData.iat[IndexAirportInt, 17])
+
+        if EU == 'Y':
+            CustomsAirport = '1'
+        elif ER == 'Y':
+            CustomsAirport = '2'
+        else:
+            CustomsAirport = '3'
+
+        airportReference[airport] = [RegionAirport, CustomsAirport]
+
+    return airportReference
+
+
 def enforceBounds(timeDiff,timeDim):
 
     emptystatement = ""
@@ -289,19 +460,22 @@ def enforceBounds(timeDiff,timeDim):
 
 def statsAirlineProcessor(statsAirline,airlineMin):
 
-    newStatsAirline = DataFrame(columns = statsAirline.columns)
-    otherStatsAirline = DataFrame(columns = statsAirline.columns)
+    newRows = []
+    otherRows = []
 
     for index, row in statsAirline.iterrows():
         if sum(row)/len(row) >= airlineMin:
-            newStatsAirline = newStatsAirline.append(row)
+            newRows.append(row)
         else:
-            otherStatsAirline = otherStatsAirline.append(row)
+            otherRows.append(row)
+
+    newStatsAirline = pandas.DataFrame(newRows, columns = statsAirline.columns)
+    otherStatsAirline = pandas.DataFrame(otherRows, columns = statsAirline.columns)
 
     otherLine = otherStatsAirline.sum(axis=0)
     otherLine = otherLine.rename("Other")
     otherLine = otherLine.astype('int64')
-    newStatsAirline = newStatsAirline.append(otherLine)
+    newStatsAirline = pandas.concat([newStatsAirline, otherLine.to_frame().T])
 
     return newStatsAirline
 
@@ -311,10 +485,18 @@ def statsAirlineProcessor(statsAirline,airlineMin):
 ######################
 
 
-def getData(paramList,page):
+class FlightAPIError(Exception):
+
+    # a request to the flight API failed or did not answer in time, or a day could not be fetched completely
+
+    pass
+
+
+def requestFlightsPage(paramList,page,credentials=None,session=None):
     url = "https://api.schiphol.nl/public-flights/flights"
 
-    credentials = getCredentials()
+    if credentials is None:
+        credentials = getCredentials()
 
     Qappid = credentials[0]
     Qappkey = credentials[1]
@@ -323,189 +505,320 @@ def getData(paramList,page):
     Qflightdirection = paramList[2]
 
     querystring = {"app_id": Qappid, "app_key": Qappkey, "scheduledate": Qscheduledate, "scheduletime": Qscheduletime,
-                   "flightdirection": Qflightdirection, "page": page}
+                   "page": page}
+
+    # without a flight direction the API returns arrivals and departures together
+    if Qflightdirection in ['A', 'D']:
+        querystring["flightdirection"] = Qflightdirection
 
     resourceversion = "v3"
 
     headers = {"resourceversion": resourceversion}
 
-    departurePars = list(
-        ['aircraftRegistration', 'flightName', 'scheduleTime', 'actualOffBlockTime', 'aircraftType', 'route',
-         'prefixICAO', 'gate', 'terminal', 'codeshares', 'timeDiff', 'checkinAllocations'])
-    arrivalPars = list(
-        ['aircraftRegistration', 'flightName', 'scheduleTime', 'actualLandingTime', 'aircraftType', 'route',
-         'prefixICAO', 'gate', 'terminal', 'codeshares', 'timeDiff', 'baggageClaim'])
+    # seconds to wait for the connection and for each read, a request that does not answer in time fails
+    requestTimeout = 60
 
-    lenDepPars = len(departurePars)
-    lenArrPars = len(arrivalPars)
+    try:
 
-    baseDate = Qscheduledate[8:10] + '-' + Qscheduledate[5:7] + '-' + Qscheduledate[0:4]
+        # a requests.Session keeps the connection to the API open between pages and days
+        if session is None:
+            response = requests.request("GET", url, headers=headers, params=querystring, timeout=requestTimeout)
+        else:
+            response = session.request("GET", url, headers=headers, params=querystring, timeout=requestTimeout)
+
+    except requests.exceptions.RequestException as error:
+
+        raise FlightAPIError("Request for " + Qscheduledate + " page " + str(page) + " failed: " + str(error))
+
+    return response
 
-    try:
 
-        response = requests.request("GET", url, headers=headers, params=querystring)
+def getLastPage(response):
 
-    except requests.exceptions.ConnectionError as error:
+    # last page number from the Link header (rel="last"), None when the response has no such link
 
-        print(error)
-        sys.exit()
+    lastUrl = response.links.get('last', {}).get('url')
 
-    if response.status_code == 200:
+    if lastUrl is None:
+        return None
 
-        flightList = response.json()
-        flights = flightList["flights"]
+    query = urllib.parse.parse_qs(urllib.parse.urlparse(lastUrl).query)
 
-        lenFlights = len(flights)
+    if 'page' not in query:
+        return None
 
-        if Qflightdirection == 'D':
-
-            h, w = lenFlights, lenDepPars + 1
-            result = [[None for x in range(w)] for y in range(h)]
-
-            count = 0
-
-            for flight in flights:
-
-                flightServiceType = "{}".format(flight['serviceType'])
+    return int(query['page'][0])
 
-                if flightServiceType == 'J' or flightServiceType == 'C':
 
-                    try:
+def getFlightPages(paramList,credentials=None,session=None):
 
-                        for parNum in range(0, lenDepPars):
+    # Raw flights of every page of one day. The first response tells which page is the last one, so exactly the pages
+    # up to it are requested; when the API sends no Link header pages are requested until the first non-200 response.
+    # A page that fails before the last one raises a FlightAPIError, so a day is never returned with pages missing.
 
-                            if departurePars[parNum] == 'aircraftType':
-                                result[count][parNum] = "{}".format(flight['aircraftType']['iatasub'])
-                            elif departurePars[parNum] == 'route':
-                                result[count][parNum] = "{}".format(flight['route']['destinations'][0])
-                            elif departurePars[parNum] == 'scheduleTime':
-                                scheduleTime = "{}".format(flight['scheduleTime'])
-                                result[count][parNum] = "{}".format(baseDate + " " + scheduleTime[0:5])
-                            elif departurePars[parNum] == 'actualOffBlockTime':
-                                AOBT = "{}".format(flight['actualOffBlockTime'])
-                                result[count][parNum] = "{}".format(AOBT[8:10] + "-" + AOBT[5:7] + "-" + AOBT[0:4] + " " + AOBT[11:16])
-                            elif departurePars[parNum] == 'codeshares':
-                                try:
-                                    result[count][parNum] = ["{}".format(s) for s in flight["codeshares"]["codeshares"]]
-                                except Exception as e:
-                                    result[count][parNum] = '[]'
-                            elif departurePars[parNum] == 'timeDiff':
-                                try:
-                                    STD = flight["scheduleTime"]
-                                    ATD = flight["actualOffBlockTime"]
-                                    timeDiff = datetime.strptime(baseDate + " " + STD[0:5],'%d-%m-%Y %H:%M') - datetime.strptime(ATD[0:10] + " " + ATD[11:16], '%Y-%m-%d %H:%M')
-                                    result[count][parNum] = int(-timeDiff.total_seconds() / 60)
-                                except Exception as e:
-                                    pass
-                            elif departurePars[parNum] == 'checkinAllocations':
-                                try:
-                                    intervals = getIntervals(list([flight, baseDate]))
-                                    result[count][parNum] = str(int(intervals[0]))
-                                    result[count][parNum + 1] = str(int(intervals[1]))
-                                except Exception as e:
-                                    pass
-                            else:
-                                result[count][parNum] = "{}".format(flight[departurePars[parNum]])
+    timePause = 60 / float(200) + 1
+
+    # without a flight direction a day has the flights of both directions
+    maxFlightsDay = 6000 if paramList[2] in ['A', 'D'] else 12000
+    maxQueries = int(maxFlightsDay/20)
+
+    response = requestFlightsPage(paramList, 0, credentials, session)
 
-                    except Exception as e:
+    if response.status_code != 200:
+        raise FlightAPIError("No flights received for " + paramList[0] + ", status " + str(response.status_code))
 
-                        print("Type Error: error in field other than codeshares, checkinAllocations and timeDiff")
+    FlightPages = [response.json()["flights"]]
 
-                    count += 1
+    lastPage = getLastPage(response)
 
-            result = result[0:count][:]
+    if lastPage is None:
+        plannedPages = range(1, maxQueries)
+    else:
+        plannedPages = range(1, lastPage + 1)
 
-        elif Qflightdirection == 'A':
+    for page in plannedPages:
 
-            h, w = lenFlights, lenArrPars
-            result = [[None for x in range(w)] for y in range(h)]
+        time.sleep(timePause)
 
-            count = 0
+        response = requestFlightsPage(paramList, page, credentials, session)
 
-            for flight in flights:
+        # without a Link header a non-200 response marks the end of the day, unless the API is limiting or failing
+        if response.status_code != 200 and (lastPage is not None or response.status_code == 429 or response.status_code >= 500):
+            raise FlightAPIError("Page " + str(page) + " of " + paramList[0] + " failed with status " + str(response.status_code))
+        elif response.status_code != 200:
+            break
 
-                flightServiceType = "{}".format(flight['serviceType'])
+        FlightPages.append(response.json()["flights"])
 
-                if flightServiceType == 'J' or flightServiceType == 'C':
+    time.sleep(timePause)
 
-                    try:
+    return FlightPages
 
-                        for parNum in range(0, lenArrPars):
 
-                            if arrivalPars[parNum] == 'aircraftType':
-                                result[count][parNum] = "{}".format(flight['aircraftType']['iatasub'])
-                            elif arrivalPars[parNum] == 'route':
-                                result[count][parNum] = "{}".format(flight['route']['destinations'][0])
-                            elif arrivalPars[parNum] == 'scheduleTime':
-                                scheduleTime = "{}".format(flight['scheduleTime'])
-                                result[count][parNum] = "{}".format(baseDate + " " + scheduleTime[0:5])
-                            elif arrivalPars[parNum] == 'actualLandingTime':
-                                ALT = "{}".format(flight['actualLandingTime'])
-                                result[count][parNum] = "{}".format(ALT[8:10] + "-" + ALT[5:7] + "-" + ALT[0:4] + " " + ALT[11:16])
-                            elif arrivalPars[parNum] == 'codeshares':
-                                try:
-                                    result[count][parNum] = ["{}".format(s) for s in flight["codeshares"]["codeshares"]]
-                                except Exception as e:
-                                    result[count][parNum] = '[]'
-                            elif arrivalPars[parNum] == 'baggageClaim':
-                                try:
-                                    result[count][parNum] = "{}".format(flight['baggageClaim']['belts'][0])
-                                except Exception as e:
-                                    pass
-                            elif arrivalPars[parNum] == 'timeDiff':
-                                try:
-                                    STA = flight["scheduleTime"]
-                                    ATA = flight["actualLandingTime"]
-                                    timeDiff = datetime.strptime(baseDate + " " + STA[0:5],'%d-%m-%Y %H:%M') - datetime.strptime(ATA[0:10] + " " + ATA[11:16], '%Y-%m-%d %H:%M')
-                                    result[count][parNum] = int(-timeDiff.total_seconds() / 60)
-                                except Exception as e:
-                                    pass
-                            else:
-                                result[count][parNum] = "{}".format(flight[arrivalPars[parNum]])
-
-                    except Exception as e:
-
-                        print("Type Error: error in field other than codeshares, bagaggeClaim and timeDiff")
-
-                    count += 1
-
-            result = result[0:count][:]
+def parseFlights(flights,paramList):
 
-        else:
+    Qscheduledate = paramList[0]
+    Qflightdirection = paramList[2]
+
+    departurePars = list(
+        ['aircraftRegistration', 'flightName', 'scheduleTime', 'actualOffBlockTime', 'aircraftType', 'route',
+         'prefixICAO', 'gate', 'terminal', 'codeshares', 'timeDiff', 'checkinAllocations'])
+    arrivalPars = list(
+        ['aircraftRegistration', 'flightName', 'scheduleTime', 'actualLandingTime', 'aircraftType', 'route',
+         'prefixICAO', 'gate', 'terminal', 'codeshares', 'timeDiff', 'baggageClaim'])
 
-            print("No valid departure/arrival code given")
-            result = 'stop'
+    lenDepPars = len(departurePars)
+    lenArrPars = len(arrivalPars)
+
+    baseDate = Qscheduledate[8:10] + '-' + Qscheduledate[5:7] + '-' + Qscheduledate[0:4]
+
+    lenFlights = len(flights)
+
+    if Qflightdirection == 'D':
+
+        h, w = lenFlights, lenDepPars + 2
+        result = [[None for x in range(w)] for y in range(h)]
+
+        count = 0
+
+        checkinRows = []
+        scheduleTimes = []
+        startTimes = []
+        endTimes = []
+
+        for flight in flights:
+
+            flightServiceType = "{}".format(flight['serviceType'])
+
+            if flightServiceType == 'J' or flightServiceType == 'C':
+
+                try:
+
+                    for parNum in range(0, lenDepPars):
+
+                        if departurePars[parNum] == 'aircraftType':
+                            result[count][parNum] = "{}".format(flight['aircraftType']['iatasub'])
+                        elif departurePars[parNum] == 'route':
+                            result[count][parNum] = "{}".format(flight['route']['destinations'][0])
+                        elif departurePars[parNum] == 'scheduleTime':
+                            scheduleTime = "{}".format(flight['scheduleTime'])
+                            result[count][parNum] = "{}".format(baseDate + " " + scheduleTime[0:5])
+                        elif departurePars[parNum] == 'actualOffBlockTime':
+                            AOBT = "{}".format(flight['actualOffBlockTime'])
+                            result[count][parNum] = "{}".format(AOBT[8:10] + "-" + AOBT[5:7] + "-" + AOBT[0:4] + " " + AOBT[11:16])
+                        elif departurePars[parNum] == 'codeshares':
+                            try:
+                                result[count][parNum] = encodeCodeshares(["{}".format(s) for s in flight["codeshares"]["codeshares"]])
+                            except Exception as e:
+                                result[count][parNum] = 'NS'
+                        elif departurePars[parNum] == 'timeDiff':
+                            try:
+                                STD = flight["scheduleTime"]
+                                ATD = flight["actualOffBlockTime"]
+                                timeDiff = datetime.strptime(baseDate + " " + STD[0:5],'%d-%m-%Y %H:%M') - datetime.strptime(ATD[0:10] + " " + ATD[11:16], '%Y-%m-%d %H:%M')
+                                result[count][parNum] = int(-timeDiff.total_seconds() / 60)
+                            except Exception as e:
+                                pass
+                        elif departurePars[parNum] == 'checkinAllocations':
+                            # intervals are computed for all flights at once after the loop
+                            checkinRows.append(count)
+                            scheduleTimes.append("{}".format(flight['scheduleTime']))
+                            try:
+                                allocation = flight['checkinAllocations']['checkinAllocations'][0]
+                                startTimes.append("{}".format(allocation[u'startTime']))
+                                endTimes.append("{}".format(allocation[u'endTime']))
+                            except Exception as e:
+                                startTimes.append(None)
+                                endTimes.append(None)
+                        else:
+                            result[count][parNum] = "{}".format(flight[departurePars[parNum]])
+
+                except Exception as e:
+
+                    print("Type Error: error in field other than codeshares, checkinAllocations and timeDiff")
+
+                count += 1
+
+        # flights without a check-in allocation are kept with CheckinAllocated = 'N' and zero intervals
+        if checkinRows != []:
+            intervals = getIntervalsBatch(baseDate, scheduleTimes, startTimes, endTimes)
+            for k, row in enumerate(checkinRows):
+                allocated = intervals[2][k]
+                result[row][lenDepPars - 1] = str(int(intervals[0][k])) if allocated else '0'
+                result[row][lenDepPars] = str(int(intervals[1][k])) if allocated else '0'
+                result[row][lenDepPars + 1] = 'Y' if allocated else 'N'
+
+        result = result[0:count][:]
+
+    elif Qflightdirection == 'A':
+
+        h, w = lenFlights, lenArrPars
+        result = [[None for x in range(w)] for y in range(h)]
+
+        count = 0
+
+        for flight in flights:
+
+            flightServiceType = "{}".format(flight['serviceType'])
+
+            if flightServiceType == 'J' or flightServiceType == 'C':
+
+                try:
+
+                    for parNum in range(0, lenArrPars):
+
+                        if arrivalPars[parNum] == 'aircraftType':
+                            result[count][parNum] = "{}".format(flight['aircraftType']['iatasub'])
+                        elif arrivalPars[parNum] == 'route':
+                            result[count][parNum] = "{}".format(flight['route']['destinations'][0])
+                        elif arrivalPars[parNum] == 'scheduleTime':
+                            scheduleTime = "{}".format(flight['scheduleTime'])
+                            result[count][parNum] = "{}".format(baseDate + " " + scheduleTime[0:5])
+                        elif arrivalPars[parNum] == 'actualLandingTime':
+                            ALT = "{}".format(flight['actualLandingTime'])
+                            result[count][parNum] = "{}".format(ALT[8:10] + "-" + ALT[5:7] + "-" + ALT[0:4] + " " + ALT[11:16])
+                        elif arrivalPars[parNum] == 'codeshares':
+                            try:
+                                result[count][parNum] = encodeCodeshares(["{}".format(s) for s in flight["codeshares"]["codeshares"]])
+                            except Exception as e:
+                                result[count][parNum] = 'NS'
+                        elif arrivalPars[parNum] == 'baggageClaim':
+                            try:
+                                result[count][parNum] = "{}".format(flight['baggageClaim']['belts'][0])
+                            except Exception as e:
+                                pass
+                        elif arrivalPars[parNum] == 'timeDiff':
+                            try:
+                                STA = flight["scheduleTime"]
+                                ATA = flight["actualLandingTime"]
+                                timeDiff = datetime.strptime(baseDate + " " + STA[0:5],'%d-%m-%Y %H:%M') - datetime.strptime(ATA[0:10] + " " + ATA[11:16], '%Y-%m-%d %H:%M')
+                                result[count][parNum] = int(-timeDiff.total_seconds() / 60)
+                            except Exception as e:
+                                pass
+                        else:
+                            result[count][parNum] = "{}".format(flight[arrivalPars[parNum]])
+
+                except Exception as e:
+
+                    print("Type Error: error in field other than codeshares, bagaggeClaim and timeDiff")
+
+                count += 1
+
+        result = result[0:count][:]
 
     else:
 
+        print("No valid departure/arrival code given")
         result = 'stop'
 
     return result
 
 
-def getFlightsDay(paramList):
-
-    timePause = 60 / float(200) + 1
-
-    maxFlightsDay = 6000
-    maxQueries = int(maxFlightsDay/20)
+def getFlightsDay(paramList,credentials=None):
 
     FlightList = []
 
-    for page in range(maxQueries):
-        addFlightListRaw = getData(paramList,page)
-        if isinstance(addFlightListRaw,list):
-            addFlightList = removeNoneFlights(addFlightListRaw)
-            FlightList = addRowsFlightList(FlightList, addFlightList)
-            time.sleep(timePause)
-        else:
-            break
+    # the flights of all pages are parsed together, so the check-in intervals are computed once per day
+    flights = [flight for page in getFlightPages(paramList, credentials) for flight in page]
+
+    addFlightListRaw = parseFlights(flights, paramList)
+    if isinstance(addFlightListRaw,list):
+        addFlightList = removeNoneFlights(addFlightListRaw)
+        FlightList = addRowsFlightList(FlightList, addFlightList)
 
     UniqueFlightList = createUniqueFlightList(FlightList, paramList)
 
     return UniqueFlightList
 
 
+def getFlightsDayCombined(date,credentials=None,session=None):
+
+    # Arrivals and departures of one day from one paged request stream without a flight direction. This needs about as
+    # many pages as fetching the directions separately (20 flights per page either way), it saves the partly filled
+    # last page of one direction and the 30 second pause of a second pass over the days.
+
+    FlightPages = getFlightPages(list([date, '00:00', 'AD']), credentials, session)
+
+    FlightLists = []
+
+    for flightDirection in ['A', 'D']:
+
+        paramList = list([date, '00:00', flightDirection])
+        flights = [flight for page in FlightPages for flight in page if flight.get('flightDirection') == flightDirection]
+
+        FlightList = removeNoneFlights(parseFlights(flights, paramList))
+        FlightLists.append(createUniqueFlightList(FlightList, paramList))
+
+    return FlightLists
+
+
+def getDateString(baseDate, day):
+
+    if day < 10:
+        date = baseDate + '0' + str(day)
+    else:
+        date = baseDate + str(day)
+
+    return date
+
+
+def getDayWithRetries(fetchDay, date, maxAttempts=3):
+
+    # fetchDay() of one date, tried again after the pause between days when it raises a FlightAPIError. A day that
+    # still fails after maxAttempts raises, so it never leaves a gap in a flight list.
+
+    for attempt in range(maxAttempts):
+
+        try:
+            return fetchDay()
+        except FlightAPIError as error:
+            print(error)
+            if attempt == maxAttempts - 1:
+                raise FlightAPIError("No flights received after " + str(maxAttempts) + " attempts for " + date)
+
+        time.sleep(30)
+
+
 def getFlightListFromAPI(baseDate, dayRange, flightDirection):
 
     FlightList = []
@@ -514,18 +827,11 @@ def getFlightListFromAPI(baseDate, dayRange, flightDirection):
 
         t = time.time()
 
-        if i < 10:
-            date = baseDate + '0' + str(i)
-        else:
-            date = baseDate + str(i)
+        date = getDateString(baseDate, i)
 
         paramList = list([date, '00:00', flightDirection])
-        try:
-            DayFlightList = getFlightsDay(paramList)
-        except Exception as e:
-            print(e)
-        else:
-            FlightList = addRowsFlightList(FlightList, DayFlightList)
+        DayFlightList = getDayWithRetries(lambda: getFlightsDay(paramList), date)
+        FlightList = addRowsFlightList(FlightList, DayFlightList)
 
         elapsed = time.time() - t
         progressIndicator = flightDirection + ": " + str(i) + "/" + str(max(dayRange)) + " in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
@@ -536,62 +842,231 @@ def getFlightListFromAPI(baseDate, dayRange, flightDirection):
     return FlightList
 
 
-def getFlightSchedule(baseInputPath,baseDate, arrFlightList, depFlightList):
+def getFlightListsFromAPI(baseDate, dayRange):
 
-    t = time.time()
+    # both directions in one pass over the days, see getFlightsDayCombined
 
-    uniqueRegos = list(set(getColumn(arrFlightList, 0) + getColumn(depFlightList, 0)))
-    FlightSchedulePerACDay = []
+    arrFlightList = []
+    depFlightList = []
+
+    for i in dayRange:
+
+        t = time.time()
 
-    all_rows = 0
-    del_rows = 0
+        date = getDateString(baseDate, i)
 
-    for rego in uniqueRegos:
+        DayFlightLists = getDayWithRetries(lambda: getFlightsDayCombined(date), date)
+        arrFlightList = addRowsFlightList(arrFlightList, DayFlightLists[0])
+        depFlightList = addRowsFlightList(depFlightList, DayFlightLists[1])
 
-        arrFlights = makeList(getIndexMatch(getColumn(arrFlightList, 0), rego))
-        arrFlightsDay = getElementsList(getColumn(arrFlightList, 2), arrFlights)
-        arrSize = (len(arrFlightsDay), 5)
-        arrFlightsDayClean = np.zeros(arrSize)
+        elapsed = time.time() - t
+        progressIndicator = "AD: " + str(i) + "/" + str(max(dayRange)) + " in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+        print(progressIndicator)
 
-        for j in range(len(arrFlightsDay)):
-            arrFlight = arrFlightsDay[j]
-            arrFlightMinutes = arrFlight[-2:]
-            arrFlightHours = arrFlight[-5:-3]
-            arrFlightDay = arrFlight[0:2]
+        time.sleep(30)
 
-            arrFlightsDayClean[j, :] = [arrFlights[j], int(arrFlightDay), int(arrFlightHours), int(arrFlightMinutes), 0]
+    return list([arrFlightList, depFlightList])
 
-        arrFlightsDayClean = arrFlightsDayClean.astype(int)
 
-        depFlights = makeList(getIndexMatch(getColumn(depFlightList, 0), rego))
-        depFlightsDay = getElementsList(getColumn(depFlightList, 2), depFlights)
+def getScheduleMinutes(scheduleTime):
 
-        depSize = (len(depFlightsDay), 5)
-        depFlightsDayClean = np.zeros(depSize)
+    # 100 * hour + minute of a 'dd-mm-YYYY HH:MM' time, as STAnum and STDnum
 
-        for j in range(len(depFlightsDay)):
-            depFlight = depFlightsDay[j]
-            depFlightMinutes = depFlight[-2:]
-            depFlightHours = depFlight[-5:-3]
-            depFlightDay = depFlight[0:2]
+    return 100 * int(scheduleTime[-5:-3]) + int(scheduleTime[-2:])
 
-            depFlightsDayClean[j, :] = [depFlights[j], int(depFlightDay), int(depFlightHours), int(depFlightMinutes), 1]
 
-        depFlightsDayClean = depFlightsDayClean.astype(int)
+def cleanMovements(movements):
 
-        addCleanRaw = DataFrame(np.concatenate((arrFlightsDayClean, depFlightsDayClean), axis=0),columns=['a', 'b', 'c', 'd', 'e'])
-        addCleanRawSorted = addCleanRaw.sort_values(['b', 'c', 'd'], ascending=[True, True, True])
+    # of consecutive movements in the same direction only the last one is kept, as cleanAddClean
 
-        all_rows += len(addCleanRawSorted.index)
+    return [movements[q] for q in range(len(movements)) if q == len(movements) - 1 or movements[q + 1][0] != movements[q][0]]
 
-        addClean = cleanAddClean(addCleanRawSorted)
 
-        del_rows += len(addClean.index)
+def getDayRotation(rego, movements, Date, dateString):
 
-        days = list(set(addClean.iloc[:, 1].copy()))
+    # Schedule rows of one registration on one day. movements are [direction (0 arrival, 1 departure), flight list row,
+    # carrier flights] in time order, dateString ('YYYY-MM-DD') is the day, Date the value of the Date column. A first
+    # departure without arrival and a last arrival without departure get a row of their own.
 
-        emptyValueString = 'NS'
-        emptyValueInteger = 0
+    emptyValueString = 'NS'
+    emptyValueInteger = 0
+
+    Lines = []
+
+    ns = 0
+    lenFlightsPerDay = len(movements)
+    movementsPerDay = lenFlightsPerDay
+
+    if movements[0][0] == 1:
+        movementsPerDay = movementsPerDay - 1
+
+        depFlight = movements[0][1]
+
+        AC_reg = rego
+        ID_in = emptyValueString
+        ID_out = depFlight[1]
+        STAnum = emptyValueInteger  # set for sorting
+        STDnum = getScheduleMinutes(depFlight[2])
+        STA = emptyValueString
+        STD = depFlight[2]
+        ATA = emptyValueString
+        ATD = depFlight[3]
+        AC_type = depFlight[4]
+        Origin = emptyValueString
+        Destination = depFlight[5]
+        Operator = depFlight[6]
+        GateGroupIn = emptyValueString
+        GateGroupOut = depFlight[7][0] + '-pier'
+        GateIn = emptyValueString
+        GateOut = depFlight[7]
+        TerminalIn = emptyValueInteger
+        TerminalOut = str(int(depFlight[8]))
+        BaggageBelt = emptyValueString
+        CII = depFlight[11]
+        CheckInInterval = int(CII) if CII is not None else emptyValueInteger
+        DI = depFlight[12]
+        DepartureInterval = int(DI) if DI is not None else emptyValueInteger
+        ADI = datetime.strptime(STD, '%d-%m-%Y %H:%M') - datetime.strptime(dateString + " 00:00", '%Y-%m-%d %H:%M')
+        ArrDepInterval = int(ADI.seconds / 60)
+
+        Line = [Date, AC_reg, ID_in, ID_out, STAnum, STDnum, STA, STD, ATA, ATD, AC_type, Origin,
+                Destination, Operator, GateGroupIn, GateGroupOut, GateIn, GateOut, TerminalIn, TerminalOut,
+                BaggageBelt, CheckInInterval, DepartureInterval,ArrDepInterval]
+        Lines.append(Line)
+        ns = 1
+
+    if movementsPerDay > 1:
+
+        for n in range(0, int(math.floor(movementsPerDay / 2))):
+
+            if movements[ns][0] == 0:
+                offsetArr = 0
+                offsetDep = 1
+            else:
+                offsetArr = 1
+                offsetDep = 0
+
+            arrNo = n*2 + offsetArr + ns
+            depNo = n*2 + offsetDep + ns
+
+            arrFlight = movements[arrNo][1]
+            depFlight = movements[depNo][1]
+
+            IDs = getFlightIDS(movements[arrNo][2], movements[depNo][2])
+
+            AC_reg = rego
+            ID_in = IDs[0]
+            ID_out = IDs[1]
+            STAnum = getScheduleMinutes(arrFlight[2])
+            STDnum = getScheduleMinutes(depFlight[2])
+            STA = arrFlight[2]
+            STD = depFlight[2]
+            ATA = arrFlight[3]
+            ATD = depFlight[3]
+            AC_type = depFlight[4]
+            Origin = arrFlight[5]
+            Destination = depFlight[5]
+            Operator = depFlight[6]
+            GateGroupIn = arrFlight[7][0] + '-pier'  # arr
+            GateGroupOut = depFlight[7][0] + '-pier'
+            GateIn = arrFlight[7]  # arr
+            GateOut = depFlight[7]
+            TerminalIn = str(int(arrFlight[8]))
+            TerminalOut = str(int(depFlight[8]))
+            BBval = arrFlight[11]
+            BaggageBelt = BBval if BBval is not None else emptyValueString
+            CII = depFlight[11]
+            CheckInInterval = int(CII) if CII is not None else emptyValueInteger
+            DI = depFlight[12]
+            DepartureInterval = int(DI) if DI is not None else emptyValueInteger
+            ADI = datetime.strptime(STD, '%d-%m-%Y %H:%M') - datetime.strptime(STA, '%d-%m-%Y %H:%M')
+            ArrDepInterval = int(ADI.seconds/60)
+
+            Line = [Date, AC_reg, ID_in, ID_out, STAnum, STDnum, STA, STD, ATA, ATD, AC_type, Origin,
+                    Destination, Operator, GateGroupIn, GateGroupOut, GateIn, GateOut, TerminalIn, TerminalOut,
+                    BaggageBelt, CheckInInterval, DepartureInterval,ArrDepInterval]
+            Lines.append(Line)
+
+    if movements[lenFlightsPerDay - 1][0] == 0:
+
+        arrFlight = movements[lenFlightsPerDay - 1][1]
+
+        AC_reg = rego
+        ID_in = arrFlight[1]
+        ID_out = emptyValueString
+        STAnum = getScheduleMinutes(arrFlight[2])
+        STDnum = 2359  # set for sorting
+        STA = arrFlight[2]
+        STD = emptyValueString
+        ATA = arrFlight[3]
+        ATD = emptyValueString
+        AC_type = arrFlight[4]
+        Origin = arrFlight[5]
+        Destination = emptyValueString
+        Operator = arrFlight[6]
+        GateGroupIn = arrFlight[7][0] + '-pier'
+        GateGroupOut = emptyValueString
+        GateIn = arrFlight[7]
+        GateOut = emptyValueString
+        TerminalIn = str(int(arrFlight[8]))
+        TerminalOut = emptyValueInteger
+        BBval = arrFlight[11]
+        BaggageBelt = BBval if BBval != '0' else emptyValueString
+        CheckInInterval = emptyValueInteger
+        DepartureInterval = emptyValueInteger
+        ADI = datetime.strptime(dateString + " 23:59", '%Y-%m-%d %H:%M') - datetime.strptime(STA, '%d-%m-%Y %H:%M')
+        ArrDepInterval = int(ADI.seconds / 60)
+
+        Line = [Date, AC_reg, ID_in, ID_out, STAnum, STDnum, STA, STD, ATA, ATD, AC_type, Origin,
+                Destination, Operator, GateGroupIn, GateGroupOut, GateIn, GateOut, TerminalIn, TerminalOut,
+                BaggageBelt, CheckInInterval, DepartureInterval,ArrDepInterval]
+        Lines.append(Line)
+
+    return Lines
+
+
+def getScheduleHeaders():
+
+    headers = ["Date", "AC_reg", "ID_in", "ID_out", "STAnum", "STDnum", "STA", "STD", "ATA", "ATD", "AC_type", "Origin",
+               "Destination", "Operator", "GateGroupIn", "GateGroupOut", "GateIn", "GateOut", "TerminalIn", "TerminalOut",
+               "BaggageBelt", "CheckInInterval", "DepartureInterval","ArrDepInterval"]
+
+    orderColumns = ["ID_in", "ID_out", "STAnum", "STDnum", "AC_Size", "Customs_In", "Customs_Out", "Operator", "Origin",
+                    "Destination", "AC_type", "AC_reg", "Region_In", "Region_Out", "Date", "GateGroupIn", "GateGroupOut",
+                    "GateIn", "GateOut", "STA", "STD", "ATA", "ATD", "TerminalIn", "TerminalOut", "BaggageBelt",
+                     "CheckInInterval", "DepartureInterval","ArrDepInterval"]
+
+    return list([headers, orderColumns])
+
+
+def getFlightSchedule(baseInputPath,baseDate, arrFlightList, depFlightList, ReferenceData=None):
+
+    t = time.time()
+
+    arrRegos = getColumn(arrFlightList, 0)
+    depRegos = getColumn(depFlightList, 0)
+
+    uniqueRegos = list(set(arrRegos + depRegos))
+    FlightSchedulePerACDay = []
+
+    arrCodeshares = CodeshareIndex(arrFlightList)
+    depCodeshares = CodeshareIndex(depFlightList)
+
+    regoMovements = {}
+
+    for row, rego in enumerate(arrRegos):
+        regoMovements.setdefault(rego, []).append([0, arrFlightList[row], arrCodeshares.getCarrierFlights(row)])
+
+    for row, rego in enumerate(depRegos):
+        regoMovements.setdefault(rego, []).append([1, depFlightList[row], depCodeshares.getCarrierFlights(row)])
+
+    for rego in uniqueRegos:
+
+        # movements in day, hour and minute order, arrivals before departures at the same time
+        movements = sorted(regoMovements[rego], key=lambda movement: [int(movement[1][2][0:2]), getScheduleMinutes(movement[1][2])])
+        movements = cleanMovements(movements)
+
+        days = list(set([int(movement[1][2][0:2]) for movement in movements]))
 
         for day in days:
 
@@ -600,156 +1075,11 @@ def getFlightSchedule(baseInputPath,baseDate, arrFlightList, depFlightList):
             else:
                 dayString = str(day)
 
-            ns = 0
-            flightsPerDay = addClean.iloc[[i for i, x in enumerate(list(addClean.iloc[:, 1] == day)) if x], :]
-
-            lenFlightsPerDay = len(flightsPerDay)
-            movementsPerDay = lenFlightsPerDay
-
-            if flightsPerDay.iat[0, 4] == 1:
-                movementsPerDay = movementsPerDay - 1
-
-                Date = day
-                AC_reg = rego
-                ID_in = emptyValueString
-                ID_out = depFlightList[flightsPerDay.iat[0, 0]][1]
-                STAnum = emptyValueInteger  # set for sorting
-                STDnum = 100 * flightsPerDay.iat[0, 2] + flightsPerDay.iat[0, 3]
-                STA = emptyValueString
-                STD = depFlightList[flightsPerDay.iat[0, 0]][2]
-                ATA = emptyValueString
-                ATD = depFlightList[flightsPerDay.iat[0, 0]][3]
-                AC_type = depFlightList[flightsPerDay.iat[0, 0]][4]
-                Origin = emptyValueString
-                Destination = depFlightList[flightsPerDay.iat[0, 0]][5]
-                Operator = depFlightList[flightsPerDay.iat[0, 0]][6]
-                GateGroupIn = emptyValueString
-                GateGroupOut = depFlightList[flightsPerDay.iat[0, 0]][7][0] + '-pier'
-                GateIn = emptyValueString
-                GateOut = depFlightList[flightsPerDay.iat[0, 0]][7]
-                TerminalIn = emptyValueInteger
-                TerminalOut = str(int(depFlightList[flightsPerDay.iat[0, 0]][8]))
-                BaggageBelt = emptyValueString
-                CII = depFlightList[flightsPerDay.iat[0, 0]][11]
-                CheckInInterval = int(CII) if CII is not None else emptyValueInteger
-                DI = depFlightList[flightsPerDay.iat[0, 0]][12]
-                DepartureInterval = int(DI) if DI is not None else emptyValueInteger
-                ADI = datetime.strptime(STD, '%d-%m-%Y %H:%M') - datetime.strptime(baseDate + dayString + " 00:00", '%Y-%m-%d %H:%M')
-                ArrDepInterval = int(ADI.seconds / 60)
-
-                Line = [Date, AC_reg, ID_in, ID_out, STAnum, STDnum, STA, STD, ATA, ATD, AC_type, Origin,
-                        Destination, Operator, GateGroupIn, GateGroupOut, GateIn, GateOut, TerminalIn, TerminalOut,
-                        BaggageBelt, CheckInInterval, DepartureInterval,ArrDepInterval]
-                FlightSchedulePerACDay.append(Line)
-                ns = 1
-
-            if movementsPerDay > 1:
-
-                for n in range(0, int(math.floor(movementsPerDay / 2))):
-
-                    if flightsPerDay.iat[ns, 4] == 0:
-                        offsetArr = 0
-                        offsetDep = 1
-                    else:
-                        offsetArr = 1
-                        offsetDep = 0
-
-                    arrNo = n*2 + offsetArr + ns
-                    depNo = n*2 + offsetDep + ns
-
-                    codeSharesInRaw = arrFlightList[flightsPerDay.iat[arrNo, 0]][9]
-                    if isinstance(codeSharesInRaw, list):
-                        codesharesIn = makeList(codeSharesInRaw)
-                    else:
-                        codesharesIn = makeList(eval(codeSharesInRaw))
-
-                    codeSharesOutRaw = depFlightList[flightsPerDay.iat[depNo, 0]][9]
-                    if isinstance(codeSharesOutRaw, list):
-                        codesharesOut = makeList(codeSharesOutRaw)
-                    else:
-                        codesharesOut = makeList(eval(codeSharesOutRaw))
-
-                    flightIn = makeList(arrFlightList[flightsPerDay.iat[arrNo, 0]][1])
-                    flightOut = makeList(depFlightList[flightsPerDay.iat[depNo, 0]][1])
-
-                    flightsNoIn = list(set(codesharesIn + flightIn))
-                    flightsNoOut = list(set(codesharesOut + flightOut))
-
-                    IDs = getFlightIDS(flightsNoIn,flightsNoOut)
-
-                    Date = day
-                    AC_reg = rego
-                    ID_in = IDs[0]
-                    ID_out = IDs[1]
-                    STAnum = 100 * flightsPerDay.iat[arrNo, 2] + flightsPerDay.iat[arrNo, 3]
-                    STDnum = 100 * flightsPerDay.iat[depNo, 2] + flightsPerDay.iat[depNo, 3]
-                    STA = arrFlightList[flightsPerDay.iat[arrNo, 0]][2]
-                    STD = depFlightList[flightsPerDay.iat[depNo, 0]][2]
-                    ATA = arrFlightList[flightsPerDay.iat[arrNo, 0]][3]
-                    ATD = depFlightList[flightsPerDay.iat[depNo, 0]][3]
-                    AC_type = depFlightList[flightsPerDay.iat[depNo, 0]][4]
-                    Origin = arrFlightList[flightsPerDay.iat[arrNo, 0]][5]
-                    Destination = depFlightList[flightsPerDay.iat[depNo, 0]][5]
-                    Operator = depFlightList[flightsPerDay.iat[depNo, 0]][6]
-                    GateGroupIn = arrFlightList[flightsPerDay.iat[arrNo, 0]][7][0] + '-pier'  # arr
-                    GateGroupOut = depFlightList[flightsPerDay.iat[depNo, 0]][7][0] + '-pier'
-                    GateIn = arrFlightList[flightsPerDay.iat[arrNo, 0]][7]  # arr
-                    GateOut = depFlightList[flightsPerDay.iat[depNo, 0]][7]
-                    TerminalIn = str(int(arrFlightList[flightsPerDay.iat[arrNo, 0]][8]))
-                    TerminalOut = str(int(depFlightList[flightsPerDay.iat[depNo, 0]][8]))
-                    BBval = arrFlightList[flightsPerDay.iat[arrNo, 0]][11]
-                    BaggageBelt = BBval if BBval is not None else emptyValueString
-                    CII = depFlightList[flightsPerDay.iat[depNo, 0]][11]
-                    CheckInInterval = int(CII) if CII is not None else emptyValueInteger
-                    DI = depFlightList[flightsPerDay.iat[depNo, 0]][12]
-                    DepartureInterval = int(DI) if DI is not None else emptyValueInteger
-                    ADI = datetime.strptime(STD, '%d-%m-%Y %H:%M') - datetime.strptime(STA, '%d-%m-%Y %H:%M')
-                    ArrDepInterval = int(ADI.seconds/60)
-
-                    Line = [Date, AC_reg, ID_in, ID_out, STAnum, STDnum, STA, STD, ATA, ATD, AC_type, Origin,
-                            Destination, Operator, GateGroupIn, GateGroupOut, GateIn, GateOut, TerminalIn, TerminalOut,
-                            BaggageBelt, CheckInInterval, DepartureInterval,ArrDepInterval]
-                    FlightSchedulePerACDay.append(Line)
-
-            if flightsPerDay.iat[lenFlightsPerDay - 1, 4] == 0:
-                finalIndex = lenFlightsPerDay - 1
-
-                Date = day
-                AC_reg = rego
-                ID_in = arrFlightList[flightsPerDay.iat[finalIndex, 0]][1]
-                ID_out = emptyValueString
-                STAnum = 100 * flightsPerDay.iat[finalIndex, 2] + flightsPerDay.iat[finalIndex, 3]
-                STDnum = 2359  # set for sorting
-                STA = arrFlightList[flightsPerDay.iat[finalIndex, 0]][2]
-                STD = emptyValueString
-                ATA = arrFlightList[flightsPerDay.iat[finalIndex, 0]][3]
-                ATD = emptyValueString
-                AC_type = arrFlightList[flightsPerDay.iat[finalIndex, 0]][4]
-                Origin = arrFlightList[flightsPerDay.iat[finalIndex, 0]][5]
-                Destination = emptyValueString
-                Operator = arrFlightList[flightsPerDay.iat[finalIndex, 0]][6]
-                GateGroupIn = arrFlightList[flightsPerDay.iat[finalIndex, 0]][7][0] + '-pier'
-                GateGroupOut = emptyValueString
-                GateIn = arrFlightList[flightsPerDay.iat[finalIndex, 0]][7]
-                GateOut = emptyValueString
-                TerminalIn = str(int(arrFlightList[flightsPerDay.iat[finalIndex, 0]][8]))
-                TerminalOut = emptyValueInteger
-                BBval = arrFlightList[flightsPerDay.iat[finalIndex, 0]][11]
-                BaggageBelt = BBval if BBval != '0' else emptyValueString
-                CheckInInterval = emptyValueInteger
-                DepartureInterval = emptyValueInteger
-                ADI = datetime.strptime(baseDate + dayString + " 23:59", '%Y-%m-%d %H:%M') - datetime.strptime(STA, '%d-%m-%Y %H:%M')
-                ArrDepInterval = int(ADI.seconds / 60)
-
-                Line = [Date, AC_reg, ID_in, ID_out, STAnum, STDnum, STA, STD, ATA, ATD, AC_type, Origin,
-                        Destination, Operator, GateGroupIn, GateGroupOut, GateIn, GateOut, TerminalIn, TerminalOut,
-                        BaggageBelt, CheckInInterval, DepartureInterval,ArrDepInterval]
-                FlightSchedulePerACDay.append(Line)
+            flightsPerDay = [movement for movement in movements if int(movement[1][2][0:2]) == day]
+            FlightSchedulePerACDay.extend(getDayRotation(rego, flightsPerDay, day, baseDate + dayString))
 
-    headers = ["Date", "AC_reg", "ID_in", "ID_out", "STAnum", "STDnum", "STA", "STD", "ATA", "ATD", "AC_type", "Origin",
-               "Destination", "Operator", "GateGroupIn", "GateGroupOut", "GateIn", "GateOut", "TerminalIn", "TerminalOut",
-               "BaggageBelt", "CheckInInterval", "DepartureInterval","ArrDepInterval"]
-    FlightSchedule = DataFrame(FlightSchedulePerACDay, columns=headers)
+    headers = getScheduleHeaders()
+    FlightSchedule = pandas.DataFrame(FlightSchedulePerACDay, columns=headers[0])
 
     FlightSchedule['STAnum'].astype('int')
     FlightSchedule['STDnum'].astype('int')
@@ -758,14 +1088,9 @@ def getFlightSchedule(baseInputPath,baseDate, arrFlightList, depFlightList):
     FlightScheduleSorted = FlightSchedule.sort_values(['Date', 'STAnum', 'STDnum', 'Operator'],
                                                       ascending=[True, True, True, True])
 
-    FlightScheduleComplete = enrichFlightSchedule(FlightScheduleSorted, baseInputPath)
-
-    orderColumns = ["ID_in", "ID_out", "STAnum", "STDnum", "AC_Size", "Customs_In", "Customs_Out", "Operator", "Origin",
-                    "Destination", "AC_type", "AC_reg", "Region_In", "Region_Out", "Date", "GateGroupIn", "GateGroupOut",
-                    "GateIn", "GateOut", "STA", "STD", "ATA", "ATD", "TerminalIn", "TerminalOut", "BaggageBelt",
-                     "CheckInInterval", "DepartureInterval","ArrDepInterval"]
+    FlightScheduleComplete = enrichFlightSchedule(FlightScheduleSorted, baseInputPath, ReferenceData)
 
-    FlightScheduleColumnCheck = FlightScheduleComplete[orderColumns]
+    FlightScheduleColumnCheck = FlightScheduleComplete[headers[1]]
 
     FlightScheduleDoubleSort = FlightScheduleColumnCheck.sort_values(['Date', "ID_in", "ID_out", 'STDnum', "STAnum"],
                                                       ascending=[True, True, True, True, True])
@@ -779,11 +1104,22 @@ def getFlightSchedule(baseInputPath,baseDate, arrFlightList, depFlightList):
     return FlightScheduleCleaned
 
 
-def enrichFlightSchedule(FlightScheduleBare, baseInputPath):
+def readReferenceData(baseInputPath):
     ACSizeData = pandas.read_excel(baseInputPath + 'InputAircraft.xlsx')
+    AirportData = pandas.read_excel(baseInputPath + 'InputAirport.xls')
+
+    return list([ACSizeData, AirportData])
+
+
+def enrichFlightSchedule(FlightScheduleBare, baseInputPath, ReferenceData=None):
+
+    if ReferenceData is None:
+        ReferenceData = readReferenceData(baseInputPath)
+
+    ACSizeData = ReferenceData[0]
     ACTypes = [str(i) for i in ACSizeData['TYPE'].values.tolist()]
 
-    AirportData = pandas.read_excel(baseInputPath + 'InputAirport.xls')
+    AirportData = ReferenceData[1]
     Airports = AirportData["TNA_CODE_IATA"]
 
     lenFSSB = len(FlightScheduleBare)
@@ -866,7 +1202,7 @@ def enrichFlightSchedule(FlightScheduleBare, baseInputPath):
         addData.append(Line)
 
     headers = ['AC_Size', 'Region_In', 'Region_Out', 'Customs_In', 'Customs_Out']
-    newData = DataFrame(addData, columns=headers)
+    newData = pandas.DataFrame(addData, columns=headers)
 
     newData['AC_Size'].astype('int')
 
@@ -877,103 +1213,129 @@ def enrichFlightSchedule(FlightScheduleBare, baseInputPath):
     return FlightSchedule
 
 
-def writeToCSV(FlightSchedule,ProbDists,Statistics,arrFlightList,depFlightList,baseDate,dayRange,baseOutputPath):
+def getPeriodString(baseDate, dayRange):
+    return baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ")"
 
-    t = time.time()
-    status = True
 
-    try:
+def writeFlightLists(arrFlightList,depFlightList,baseDate,dayRange,baseOutputPath,compression='none'):
 
-        headers = getFlightsHeaders()
+    headers = getFlightsHeaders()
 
-        arrHeaders = headers[0]
-        fileNameArr = baseOutputPath + 'Flights/ArrivingFlights_' + baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ').csv'
+    os.makedirs(baseOutputPath + 'Flights/', exist_ok=True)
 
-        arrivals = DataFrame(arrFlightList, columns=arrHeaders)
-        arrivals.to_csv(fileNameArr)
+    fileNameArr = baseOutputPath + 'Flights/ArrivingFlights_' + getPeriodString(baseDate, dayRange) + '.csv'
+    writeFlightList(arrFlightList, headers[0], fileNameArr, compression)
 
-        depHeaders = headers[1]
-        fileNameDep = baseOutputPath + 'Flights/DepartingFlights_' + baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ').csv'
+    fileNameDep = baseOutputPath + 'Flights/DepartingFlights_' + getPeriodString(baseDate, dayRange) + '.csv'
+    writeFlightList(depFlightList, headers[1], fileNameDep, compression)
 
-        departures = DataFrame(depFlightList, columns=depHeaders)
-        departures.to_csv(fileNameDep)
 
-        baseFileNameStats = baseOutputPath + 'FlightStatistics/'
-        baseFileNameAirlines = baseOutputPath + 'Airlines/'
+def writeFlightList(FlightList, flightHeaders, fileName, compression='none'):
 
-        statsRegionIn = Statistics[0]
-        statsRegionOut = Statistics[1]
-        statsAirlineIn = Statistics[2]
-        statsAirlineOut = Statistics[3]
-        transferAirlines = Statistics[4]
+    # A list reloaded from the column cache of fileName is already on disk: its csv is only written when missing (or
+    # asked for in another compression), after which the column manifest is touched so that getFlightList keeps
+    # preferring the column cache over the newer csv.
 
-        statsRegionIn.to_csv(baseFileNameStats + "statsRegionIn" + baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ').csv')
-        statsRegionOut.to_csv(baseFileNameStats + "statsRegionOut" + baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ').csv')
-        statsAirlineIn.to_csv(baseFileNameStats + "statsAirlineIn" + baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ').csv')
-        statsAirlineOut.to_csv(baseFileNameStats + "statsAirlineOut" + baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ').csv')
-        transferAirlines.to_csv(baseFileNameAirlines + "transferAirlines.csv")
+    columnsDirName = getColumnsDirName(fileName)
 
-        if ProbDists != "":
+    if isinstance(FlightList, FlightColumns) and FlightList.dirName == columnsDirName:
 
-            baseFileName = baseOutputPath + 'Probabilities/'
+        if not os.path.isfile(fileName + getCompressionSuffix(compression)):
+            writeCSV(getFlightsFrame(FlightList, flightHeaders), fileName, compression)
+            os.utime(columnsDirName + 'manifest.json')
 
-            airlineInNames = DataFrame(ProbDists[0])
-            airlineOutNames = DataFrame(ProbDists[1])
-            regionInNames = DataFrame(ProbDists[2])
-            regionOutNames = DataFrame(ProbDists[3])
-            airlineInDists = DataFrame(ProbDists[4])
-            airlineOutDists = DataFrame(ProbDists[5])
-            regionInDists = DataFrame(ProbDists[6])
-            regionOutDists = DataFrame(ProbDists[7])
-            inDist = DataFrame(ProbDists[8])
-            inDist = inDist.T
-            outDist = DataFrame(ProbDists[9])
-            outDist = outDist.T
+    else:
 
+        writeCSV(getFlightsFrame(FlightList, flightHeaders), fileName, compression)
+        writeFlightColumns(FlightList, flightHeaders, columnsDirName)
 
-            airlineInNames.to_csv(baseFileName + "airlineInNames" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            airlineOutNames.to_csv(baseFileName + "airlineOutNames" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            regionInNames.to_csv(baseFileName + "regionInNames" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            regionOutNames.to_csv(baseFileName + "regionOutNames" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            airlineInDists.to_csv(baseFileName + "airlineInDists" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            airlineOutDists.to_csv(baseFileName + "airlineOutDists" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            regionInDists.to_csv(baseFileName + "regionInDists" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            regionOutDists.to_csv(baseFileName + "regionOutDists" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            inDist.to_csv(baseFileName + "inDist" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
-            outDist.to_csv(baseFileName + "outDist" + "_" + str(len(dayRange)) + "D.csv", header=False, index=False)
 
-        MinLines = 1000
-        MaxLines = 0
+def writeStatistics(Statistics,baseDate,dayRange,baseOutputPath,compression='none'):
 
-        OffDays = [3,6,7,19,24,30]
+    baseFileNameStats = baseOutputPath + 'FlightStatistics/'
+    baseFileNameAirlines = baseOutputPath + 'Airlines/'
+    os.makedirs(baseFileNameStats, exist_ok=True)
+    os.makedirs(baseFileNameAirlines, exist_ok=True)
 
-        for day in dayRange:
+    statsRegionIn = Statistics[0]
+    statsRegionOut = Statistics[1]
+    statsAirlineIn = Statistics[2]
+    statsAirlineOut = Statistics[3]
+    transferAirlines = Statistics[4]
 
-            dayFlightSchedule = FlightSchedule.loc[FlightSchedule['Date'] == day].reset_index().drop(['index'], axis=1)
+    writeCSV(statsRegionIn, baseFileNameStats + "statsRegionIn" + getPeriodString(baseDate, dayRange) + '.csv', compression)
+    writeCSV(statsRegionOut, baseFileNameStats + "statsRegionOut" + getPeriodString(baseDate, dayRange) + '.csv', compression)
+    writeCSV(statsAirlineIn, baseFileNameStats + "statsAirlineIn" + getPeriodString(baseDate, dayRange) + '.csv', compression)
+    writeCSV(statsAirlineOut, baseFileNameStats + "statsAirlineOut" + getPeriodString(baseDate, dayRange) + '.csv', compression)
+    writeCSV(transferAirlines, baseFileNameAirlines + "transferAirlines.csv", compression)
 
-            if day not in OffDays:
-                MaxLines = max(MaxLines,dayFlightSchedule.shape[0])
-                MinLines = min(MinLines,dayFlightSchedule.shape[0])
 
-            fileNameFS = baseOutputPath + 'FlightSchedules/FlightSchedule_' + baseDate + str(day) + '.csv'
+def writeProbabilityDistributions(ProbDists,dayRange,baseOutputPath,probabilityFormat='csv',probabilityDtype='uint16',
+                                  compression='none'):
 
-            dayFlightSchedule.to_csv(fileNameFS)
+    if ProbDists != "":
+        os.makedirs(baseOutputPath + 'Probabilities/', exist_ok=True)
 
-        print('Max Lines:')
-        print(MaxLines)
-        print('MinLines:')
-        print(MinLines)
+    if ProbDists != "" and probabilityFormat in ['binary', 'both']:
 
-    except requests.exceptions.ConnectionError as error:
+        fileNameBinary = baseOutputPath + 'Probabilities/' + "ProbDists" + "_" + str(len(dayRange)) + "D.bin"
+        writeProbabilityBinary(ProbDists, fileNameBinary, probabilityDtype)
 
-        print(error)
-        status = False
+    if ProbDists != "" and probabilityFormat in ['csv', 'both']:
 
-    elapsed = time.time() - t
-    progressIndicator = "W: 1/1 in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
-    print(progressIndicator)
+        baseFileName = baseOutputPath + 'Probabilities/'
+
+        airlineInNames = pandas.DataFrame(ProbDists[0])
+        airlineOutNames = pandas.DataFrame(ProbDists[1])
+        regionInNames = pandas.DataFrame(ProbDists[2])
+        regionOutNames = pandas.DataFrame(ProbDists[3])
+        airlineInDists = pandas.DataFrame(ProbDists[4])
+        airlineOutDists = pandas.DataFrame(ProbDists[5])
+        regionInDists = pandas.DataFrame(ProbDists[6])
+        regionOutDists = pandas.DataFrame(ProbDists[7])
+        inDist = pandas.DataFrame(ProbDists[8])
+        inDist = inDist.T
+        outDist = pandas.DataFrame(ProbDists[9])
+        outDist = outDist.T
+
+
+        writeCSV(airlineInNames, baseFileName + "airlineInNames" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(airlineOutNames, baseFileName + "airlineOutNames" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(regionInNames, baseFileName + "regionInNames" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(regionOutNames, baseFileName + "regionOutNames" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(airlineInDists, baseFileName + "airlineInDists" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(airlineOutDists, baseFileName + "airlineOutDists" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(regionInDists, baseFileName + "regionInDists" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(regionOutDists, baseFileName + "regionOutDists" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(inDist, baseFileName + "inDist" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+        writeCSV(outDist, baseFileName + "outDist" + "_" + str(len(dayRange)) + "D.csv", compression, header=False, index=False)
+
+
+def writeFlightSchedules(FlightSchedule,baseDate,dayRange,baseOutputPath,compression='none'):
+
+    MinLines = 1000
+    MaxLines = 0
+
+    OffDays = [3,6,7,19,24,30]
+
+    os.makedirs(baseOutputPath + 'FlightSchedules/', exist_ok=True)
 
-    return status
+    for day in dayRange:
+
+        dayFlightSchedule = FlightSchedule.loc[FlightSchedule['Date'] == day].reset_index().drop(['index'], axis=1)
+
+        if day not in OffDays:
+            MaxLines = max(MaxLines,dayFlightSchedule.shape[0])
+            MinLines = min(MinLines,dayFlightSchedule.shape[0])
+
+        fileNameFS = baseOutputPath + 'FlightSchedules/FlightSchedule_' + baseDate + str(day) + '.csv'
+
+        writeCSV(dayFlightSchedule, fileNameFS, compression)
+
+    print('Max Lines:')
+    print(MaxLines)
+    print('MinLines:')
+    print(MinLines)
 
 
 def getFlightList(baseDate, dayRange, flightDirection, baseOutputPath, checkExistingFiles):
@@ -985,19 +1347,42 @@ def getFlightList(baseDate, dayRange, flightDirection, baseOutputPath, checkExis
 
             print("Start gathering arriving flight list")
 
-            fileName = baseOutputPath + 'Flights/ArrivingFlights_' + baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ').csv'
+            fileName = baseOutputPath + 'Flights/ArrivingFlights_' + getPeriodString(baseDate, dayRange) + '.csv'
 
         else:
 
             print("Start gathering departing flight list")
 
-            fileName = baseOutputPath + 'Flights/DepartingFlights_' + baseDate + "(" + str(min(dayRange)) + "-" + str(max(dayRange)) + ').csv'
+            fileName = baseOutputPath + 'Flights/DepartingFlights_' + getPeriodString(baseDate, dayRange) + '.csv'
+
+        columnsDirName = getColumnsDirName(fileName)
+        columnsManifest = columnsDirName + 'manifest.json'
 
-        if os.path.isfile(fileName):
+        headers = getFlightsHeaders()
+        flightHeaders = headers[0] if flightDirection == 'A' else headers[1]
 
-            FlightList = pandas.read_csv(fileName, index_col=0).values.tolist()
+        # the list may have been written compressed (fileName.gz or fileName.zst)
+        fileName = findOutputFile(fileName) or fileName
 
-        else:
+        FlightList = None
+
+        if os.path.isfile(columnsManifest) and (not os.path.isfile(fileName) or os.path.getmtime(columnsManifest) >= os.path.getmtime(fileName)):
+
+            FlightColumnsCached = FlightColumns(columnsDirName)
+
+            if FlightColumnsCached.headers == flightHeaders:
+                FlightList = FlightColumnsCached
+
+        if FlightList is None and os.path.isfile(fileName):
+
+            FlightList = pandas.read_csv(fileName, index_col=0, compression=getInputCompression(fileName)).values.tolist()
+
+            # departure files written before CheckinAllocated existed only contain flights with an allocation
+            FlightList = [row + ['Y'] * (len(flightHeaders) - len(row)) for row in FlightList]
+
+            writeFlightColumns(FlightList, flightHeaders, columnsDirName)
+
+        elif FlightList is None:
 
             FlightList = getFlightListFromAPI(baseDate, dayRange, flightDirection)
 
@@ -1009,36 +1394,89 @@ def getFlightList(baseDate, dayRange, flightDirection, baseOutputPath, checkExis
     return FlightList
 
 
-def getProbabilityDistributions(arrFlightList,depFlightList,baseInputPath,minBucket,computeProbDists):
+def getPreparedFlights(arrFlightList,depFlightList,baseInputPath,airportReference=None):
+
+    # Arrivals ('A') and departures ('D') as DataFrames with the flight list columns, a numeric TimeDiff and the region
+    # and customs class of the origin/destination ('NS' and '0' when unknown), the day of the month of the scheduled
+    # time ('01'..'31') as Day and the scheduled time as ScheduleTime. Built once and shared by getStatistics and
+    # getProbabilityDistributions. airportReference (see getAirportReference) is read from baseInputPath when not given.
+
+    emptyValueString = 'NS'
 
-    t = time.time()
     headers = getFlightsHeaders()
 
+    if airportReference is None:
+        airportReference = getAirportReference(baseInputPath)
+
+    PreparedFlights = {}
+
+    for flightDirection, FlightList, flightHeaders, timeColumn, airportColumn in [['A', arrFlightList, headers[0], 'STA', 'Origin'],
+                                                                                ['D', depFlightList, headers[1], 'STD', 'Destination']]:
+
+        flights = getFlightsFrame(FlightList, flightHeaders)
+
+        airports = flights[airportColumn]
+        flights['Region'] = airports.map(lambda airport: airportReference.get(airport, [emptyValueString, '0'])[0]).astype(object)
+        flights['Customs'] = airports.map(lambda airport: airportReference.get(airport, [emptyValueString, '0'])[1]).astype(object)
+        flights['Day'] = flights[timeColumn].astype(str).str[0:2]
+        flights['ScheduleTime'] = parseScheduleTimes(flights[timeColumn].values)
+        flights['TimeDiff'] = pandas.to_numeric(flights['TimeDiff'])
+
+        PreparedFlights[flightDirection] = flights
+
+    return PreparedFlights
+
+
+class SharedPreparedFlights:
+
+    # getPreparedFlights of the flight lists, built by the first stage that needs it and then shared with the other
+    # stages. Stages whose results come from the stage cache never build it.
+
+    def __init__(self, arrFlightList, depFlightList, baseInputPath):
+
+        self.arrFlightList = arrFlightList
+        self.depFlightList = depFlightList
+        self.baseInputPath = baseInputPath
+        self.PreparedFlights = None
+        self.lock = threading.Lock()
+
+    def get(self):
+
+        with self.lock:
+            if self.PreparedFlights is None:
+                self.PreparedFlights = getPreparedFlights(self.arrFlightList, self.depFlightList, self.baseInputPath)
+
+        return self.PreparedFlights
+
+
+def getProbabilityDistributions(arrFlightList,depFlightList,baseInputPath,minBucket,computeProbDists,PreparedFlights=None):
+
+    t = time.time()
+
     if computeProbDists:
 
         timeDim = 60 * 24 * 2
 
-        arrFlights = DataFrame(arrFlightList, columns=headers[0])
-        depFlights = DataFrame(depFlightList, columns=headers[1])
+        if PreparedFlights is None:
+            PreparedFlights = getPreparedFlights(arrFlightList, depFlightList, baseInputPath)
+        elif isinstance(PreparedFlights, SharedPreparedFlights):
+            PreparedFlights = PreparedFlights.get()
+
+        arrFlightsComp = PreparedFlights['A']
+        depFlightsComp = PreparedFlights['D']
 
-        airlineIn = list(arrFlights.get('Airline'))
-        airlineOut = list(depFlights.get('Airline'))
+        airlineIn = list(arrFlightsComp.get('Airline'))
+        airlineOut = list(depFlightsComp.get('Airline'))
 
         dictAirlineIn = Counter(airlineIn)
         dictAirlineOut = Counter(airlineOut)
 
-        airportIn = list(arrFlights.get('Origin'))
-        airportOut = list(depFlights.get('Destination'))
-
-        regionIn = getRegions(baseInputPath, airportIn)
-        regionOut = getRegions(baseInputPath, airportOut)
+        regionIn = list(arrFlightsComp['Region'])
+        regionOut = list(depFlightsComp['Region'])
 
         dictRegionIn = Counter(regionIn)
         dictRegionOut = Counter(regionOut)
 
-        arrFlightsComp = pandas.concat([arrFlights, pandas.DataFrame({'Region':regionIn})], axis=1)
-        depFlightsComp = pandas.concat([depFlights, pandas.DataFrame({'Region':regionOut})], axis=1)
-
         airlineInNames = []
         airlineInDists = np.empty([0,timeDim])
 
@@ -1102,13 +1540,13 @@ def getProbabilityDistributions(arrFlightList,depFlightList,baseInputPath,minBuc
         emptyLine = np.zeros([1, timeDim])
         for timeDiff in TimeDiffs:
             emptyLine[0, int(timeDim/2 + enforceBounds(timeDiff, timeDim / 2))] += 1
-        inDist = np.cumsum(emptyCountLine) / emptyCountLine.sum()
+        inDist = np.cumsum(emptyLine) / emptyLine.sum()
 
         TimeDiffs = depFlightsComp.get("TimeDiff")
         emptyLine = np.zeros([1, timeDim])
         for timeDiff in TimeDiffs:
             emptyLine[0, int(timeDim/2 + enforceBounds(timeDiff, timeDim / 2))] += 1
-        outDist = np.cumsum(emptyCountLine) / emptyCountLine.sum()
+        outDist = np.cumsum(emptyLine) / emptyLine.sum()
         outDist = (outDist-1)*-1
 
         returnValue = list([airlineInNames,airlineOutNames,regionInNames,regionOutNames,airlineInDists,airlineOutDists,regionInDists,regionOutDists,inDist,outDist])
@@ -1124,31 +1562,28 @@ def getProbabilityDistributions(arrFlightList,depFlightList,baseInputPath,minBuc
     return returnValue
 
 
-def getStatistics(arrFlightList,depFlightList,dayRange,airlineMin):
+def getStatistics(arrFlightList,depFlightList,baseInputPath,dayRange,airlineMin,PreparedFlights=None):
 
     t = time.time()
 
     uniqueDays = list(dayRange)
 
-    headers = getFlightsHeaders()
-
-    arrFlights = DataFrame(arrFlightList, columns=headers[0])
-    depFlights = DataFrame(depFlightList, columns=headers[1])
+    if PreparedFlights is None:
+        PreparedFlights = getPreparedFlights(arrFlightList, depFlightList, baseInputPath)
+    elif isinstance(PreparedFlights, SharedPreparedFlights):
+        PreparedFlights = PreparedFlights.get()
 
-    airportIn = list(arrFlights.get('Origin'))
-    airportOut = list(depFlights.get('Destination'))
+    arrFlightsComp = PreparedFlights['A']
+    depFlightsComp = PreparedFlights['D']
 
-    regionIn = getRegions(baseInputPath, airportIn)
-    regionOut = getRegions(baseInputPath, airportOut)
-
-    arrFlightsComp = pandas.concat([arrFlights, pandas.DataFrame({'Region': regionIn})], axis=1)
-    depFlightsComp = pandas.concat([depFlights, pandas.DataFrame({'Region': regionOut})], axis=1)
+    regionIn = list(arrFlightsComp['Region'])
+    regionOut = list(depFlightsComp['Region'])
 
     uniqueRegionIn = sorted(list(set(regionIn)))
     uniqueRegionOut = sorted(list(set(regionOut)))
 
-    uniqueAirlineIn = sorted(list(set(arrFlights.get('Airline'))))
-    uniqueAirlineOut = sorted(list(set(depFlights.get('Airline'))))
+    uniqueAirlineIn = sorted(list(set(arrFlightsComp.get('Airline'))))
+    uniqueAirlineOut = sorted(list(set(depFlightsComp.get('Airline'))))
 
     statsRegionIn = pandas.DataFrame(columns=uniqueDays,index=uniqueRegionIn)
     statsRegionOut = pandas.DataFrame(columns=uniqueDays,index=uniqueRegionOut)
@@ -1161,8 +1596,8 @@ def getStatistics(arrFlightList,depFlightList,dayRange,airlineMin):
             dayColumn = "0" + str(column)
         else:
             dayColumn = str(column)
-        dayArrFlightsComp = arrFlightsComp[arrFlightsComp.STA.apply(lambda x: x[0:2]) == dayColumn]
-        dayDepFlightsComp = depFlightsComp[depFlightsComp.STD.apply(lambda x: x[0:2]) == dayColumn]
+        dayArrFlightsComp = arrFlightsComp[arrFlightsComp.Day == dayColumn]
+        dayDepFlightsComp = depFlightsComp[depFlightsComp.Day == dayColumn]
         for rowInReg in uniqueRegionIn:
             statsRegionIn.at[rowInReg,column] = len(dayArrFlightsComp[dayArrFlightsComp.Region == rowInReg])
         for rowOutReg in uniqueRegionOut:
@@ -1193,42 +1628,3762 @@ def getStatistics(arrFlightList,depFlightList,dayRange,airlineMin):
 
 
 #######################
-### API CREDENTIALS ###
+### PARAMETER SWEEP ###
 #######################
 
 
-def getCredentials():
+def getSweepCounts(PreparedFlights,dayRange):
 
-    appID = "XXXX"
+    # The counts behind getStatistics and getProbabilityDistributions, computed once for any airlineMin and
+    # minBucket: per airline and region (In/Out) the sorted group names, the movements per day of dayRange and the
+    # 2880-bin TimeDiff histogram, and the histograms of all arrivals (In) and departures (Out)
+
+    timeDim = 60 * 24 * 2
+    dayIndex = {("0" + str(day) if day < 10 else str(day)): i for i, day in enumerate(dayRange)}
+
+    SweepCounts = {}
+
+    for direction, flightDirection in [['In', 'A'], ['Out', 'D']]:
+
+        flights = PreparedFlights[flightDirection]
+
+        timeDiffs = np.clip(flights['TimeDiff'].values.astype(np.float64), -timeDim / 2, timeDim / 2 - 1)
+        bins = np.floor(timeDim / 2 + timeDiffs).astype(np.int64)
+
+        days = np.array([dayIndex.get(day, -1) for day in flights['Day']], dtype=np.int64)
+        inRange = days >= 0
+
+        for group in ['Airline', 'Region']:
+
+            names, codes = np.unique(flights[group].values.astype(str), return_inverse=True)
+            codes = codes.reshape(-1)
+
+            histograms = np.bincount(codes * timeDim + bins, minlength=len(names) * timeDim).reshape(len(names), timeDim)
+            dayCounts = np.bincount(codes[inRange] * len(dayRange) + days[inRange],
+                                    minlength=len(names) * len(dayRange)).reshape(len(names), len(dayRange))
+
+            SweepCounts[group + direction] = {'names': names.tolist(), 'histograms': histograms, 'days': dayCounts}
+
+        SweepCounts[direction] = np.bincount(bins, minlength=timeDim)
+
+    return SweepCounts
+
+
+def getSweepDistributions(SweepCounts,minBucket):
+
+    # getProbabilityDistributions for one minBucket from the counted histograms
+
+    returnValue = [[], [], [], [], None, None, None, None, None, None]
+
+    for namesIndex, table in enumerate(['AirlineIn', 'AirlineOut', 'RegionIn', 'RegionOut']):
+
+        histograms = SweepCounts[table]['histograms']
+        totals = histograms.sum(axis=1)
+        kept = totals >= minBucket
+
+        dists = np.cumsum(histograms[kept], axis=1) / totals[kept].reshape(-1, 1)
+
+        if table.endswith('Out'):
+            dists = (dists - 1) * -1
+
+        returnValue[namesIndex] = [name for name, keep in zip(SweepCounts[table]['names'], kept) if keep]
+        returnValue[namesIndex + 4] = dists
+
+    inLine = SweepCounts['In']
+    outLine = SweepCounts['Out']
+
+    returnValue[8] = np.cumsum(inLine) / inLine.sum()
+    returnValue[9] = (np.cumsum(outLine) / outLine.sum() - 1) * -1
+
+    return returnValue
+
+
+def getSweepStatistics(SweepCounts,dayRange,airlineMin):
+
+    # getStatistics for one airlineMin from the counted movements per day
+
+    Statistics = []
+
+    for table in ['RegionIn', 'RegionOut', 'AirlineIn', 'AirlineOut']:
+        Statistics.append(pandas.DataFrame(SweepCounts[table]['days'].astype(object), index=SweepCounts[table]['names'],
+                                           columns=list(dayRange)))
+
+    Statistics[2] = statsAirlineProcessor(Statistics[2], airlineMin)
+    Statistics[3] = statsAirlineProcessor(Statistics[3], airlineMin)
+
+    allAirlinesRaw = sorted(list(set(SweepCounts['AirlineIn']['names'] + SweepCounts['AirlineOut']['names'])))
+    skyTeamMembers = getSkyTeamMembers()
+    skInd = [1 if x in skyTeamMembers else 0 for x in allAirlinesRaw]
+
+    Statistics.append(pandas.DataFrame({'Airline': allAirlinesRaw, 'Transfer': skInd}))
+
+    return Statistics
+
+
+def getSweepSummary(SweepCounts,dayRange,minBuckets,airlineMins):
+
+    # Per threshold value and table the groups kept, the groups merged (into the region/overall distribution for
+    # minBucket, into 'Other' for airlineMin) and the movements of the merged groups
+
+    rows = []
+
+    for minBucket in minBuckets:
+        for table in ['AirlineIn', 'AirlineOut', 'RegionIn', 'RegionOut']:
+            totals = SweepCounts[table]['histograms'].sum(axis=1)
+            kept = totals >= minBucket
+            rows.append(['minBucket', minBucket, table, int(kept.sum()), int((~kept).sum()), int(totals[~kept].sum())])
+
+    for airlineMin in airlineMins:
+        for table in ['AirlineIn', 'AirlineOut']:
+            totals = SweepCounts[table]['days'].sum(axis=1)
+            kept = totals / len(dayRange) >= airlineMin
+            rows.append(['airlineMin', airlineMin, table, int(kept.sum()), int((~kept).sum()), int(totals[~kept].sum())])
+
+    return pandas.DataFrame(rows, columns=['Parameter', 'Value', 'Table', 'Kept', 'Merged', 'MergedMovements'])
+
+
+def getParameterSweep(arrFlightList,depFlightList,baseInputPath,dayRange,minBuckets,airlineMins,PreparedFlights=None):
+
+    # Statistics per airlineMin and probability distributions per minBucket from a single counting pass, every
+    # extra threshold only costs the thresholding and the cumulative sums
+
+    t = time.time()
+
+    if PreparedFlights is None:
+        PreparedFlights = getPreparedFlights(arrFlightList, depFlightList, baseInputPath)
+
+    SweepCounts = getSweepCounts(PreparedFlights, dayRange)
+
+    Sweep = {'ProbDists': {minBucket: getSweepDistributions(SweepCounts, minBucket) for minBucket in minBuckets},
+             'Statistics': {airlineMin: getSweepStatistics(SweepCounts, dayRange, airlineMin) for airlineMin in airlineMins},
+             'Summary': getSweepSummary(SweepCounts, dayRange, minBuckets, airlineMins)}
+
+    elapsed = time.time() - t
+    progressIndicator = "SW: " + str(len(minBuckets) + len(airlineMins)) + " thresholds in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+    return Sweep
+
+
+def writeParameterSweep(Sweep,baseDate,dayRange,baseOutputPath,probabilityFormat='csv',probabilityDtype='uint16',
+                        compression='none'):
+
+    # Sweep/minBucket<value>/Probabilities/, Sweep/airlineMin<value>/FlightStatistics/ and .../Airlines/ hold the
+    # outputs of every threshold in the layout of the output folder, Sweep/sweepSummary<period>.csv the summary
+
+    baseFileName = baseOutputPath + 'Sweep/'
+    os.makedirs(baseFileName, exist_ok=True)
+
+    for minBucket in Sweep['ProbDists']:
+        sweepOutputPath = baseFileName + 'minBucket' + str(minBucket) + '/'
+        writeProbabilityDistributions(Sweep['ProbDists'][minBucket], dayRange, sweepOutputPath, probabilityFormat,
+                                      probabilityDtype, compression)
+
+    for airlineMin in Sweep['Statistics']:
+        sweepOutputPath = baseFileName + 'airlineMin' + str(airlineMin) + '/'
+        writeStatistics(Sweep['Statistics'][airlineMin], baseDate, dayRange, sweepOutputPath, compression)
+
+    writeCSV(Sweep['Summary'], baseFileName + 'sweepSummary' + getPeriodString(baseDate, dayRange) + '.csv', compression,
+             index=False)
+
+
+#########################
+### COMPRESSED OUTPUT ###
+#########################
+
+
+def getCompressionSuffix(compression):
+    return {'none': '', 'gzip': '.gz', 'zstd': '.zst'}[compression]
+
+
+def findOutputFile(fileName):
+
+    # the most recently written of fileName, fileName.gz and fileName.zst, None when none of them exists
+
+    candidates = [candidate for candidate in [fileName, fileName + '.gz', fileName + '.zst'] if os.path.isfile(candidate)]
+
+    if candidates == []:
+        return None
+
+    return max(candidates, key=os.path.getmtime)
+
+
+def getInputCompression(fileName):
+
+    # compression of a file from its magic bytes, as a pandas compression argument
+
+    with open(fileName, 'rb') as inputFile:
+        magic = inputFile.read(4)
+
+    if magic[0:2] == b'\x1f\x8b':
+        return 'gzip'
+    elif magic == b'\x28\xb5\x2f\xfd':
+        return 'zstd'
+
+    return None
+
+
+class CompressedOutput(io.TextIOBase):
+
+    # Text file that is compressed (gzip or zstd) on a separate thread: write() encodes the text and queues it in
+    # blocks of about a megabyte, the thread compresses the blocks and writes them to disk, so serialization and
+    # compression overlap. Errors of the thread are raised by close().
+
+    def __init__(self, fileName, compression, maxPending=8):
+
+        super().__init__()
+
+        if compression == 'gzip':
+            import gzip
+            self.rawFile = open(fileName, 'wb')
+            self.compressor = gzip.GzipFile(fileobj=self.rawFile, mode='wb', compresslevel=6)
+        else:
+            zstdCompressor = zstandard.ZstdCompressor(level=3)
+            self.rawFile = open(fileName, 'wb')
+            self.compressor = zstdCompressor.stream_writer(self.rawFile)
+
+        self.blocks = []
+        self.blockSize = 0
+        self.error = None
+
+        self.queue = queue.Queue(maxPending)
+        self.thread = threading.Thread(target=self.run, name='CompressedOutput', daemon=True)
+        self.thread.start()
+
+    def writable(self):
+        return True
+
+    def run(self):
+
+        while True:
+
+            block = self.queue.get()
+
+            if block is None:
+                return
+
+            if self.error is None:
+                try:
+                    self.compressor.write(block)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, text):
+
+        data = text.encode('utf-8')
+        self.blocks.append(data)
+        self.blockSize += len(data)
+
+        if self.blockSize >= 1 << 20:
+            self.queue.put(b''.join(self.blocks))
+            self.blocks = []
+            self.blockSize = 0
+
+        return len(text)
+
+    def close(self):
+
+        if self.closed:
+            return
+
+        self.queue.put(b''.join(self.blocks))
+        self.queue.put(None)
+        self.thread.join()
+
+        self.compressor.close()
+        if not self.rawFile.closed:
+            self.rawFile.close()
+
+        super().close()
+
+        if self.error is not None:
+            raise self.error
+
+
+def writeCSV(frame, fileName, compression='none', **csvArgs):
+
+    # DataFrame.to_csv, to fileName + '.gz' or '.zst' when compressed
+
+    if compression == 'none':
+        frame.to_csv(fileName, **csvArgs)
+    else:
+        with CompressedOutput(fileName + getCompressionSuffix(compression), compression) as output:
+            frame.to_csv(output, **csvArgs)
+
+
+def readCSV(fileName, **csvArgs):
+
+    # pandas.read_csv of the file findOutputFile finds for fileName, compressed or not
+
+    outputFileName = findOutputFile(fileName)
+
+    if outputFileName is None:
+        outputFileName = fileName
+
+    return pandas.read_csv(outputFileName, compression=getInputCompression(outputFileName), **csvArgs)
+
+
+#########################
+### FLIGHT LIST CACHE ###
+#########################
+
+
+def getFlightsFrame(FlightList, headers):
+
+    if isinstance(FlightList, FlightColumns):
+        flights = pandas.DataFrame({name: FlightList.getColumnObjects(i) for i, name in enumerate(headers)}, columns=headers)
+    else:
+        flights = pandas.DataFrame(FlightList, columns=headers)
+
+    return flights
+
+
+def getTimeStrings(times):
+
+    # datetime64[m] -> 'dd-mm-YYYY HH:MM' as an object array, the layout of the flight lists
+
+    return np.array([v[8:10] + '-' + v[5:7] + '-' + v[0:4] + ' ' + v[11:16]
+                     for v in np.datetime_as_string(times, unit='m').tolist()], dtype=object)
+
+
+def getCanonicalValue(value):
+
+    # flight list value as text: missing values (None, NaN) empty and integral floats without decimals, so that a
+    # list fetched from the API and the same list reparsed from its csv give the same text
+
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    elif isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value)
+
+
+def hashFlightList(FlightList):
+
+    if isinstance(FlightList, FlightColumns):
+        return FlightList.hash
+
+    digest = hashlib.sha256()
+
+    for row in FlightList:
+        digest.update(('\x1f'.join([getCanonicalValue(value) for value in row]) + '\x1e').encode())
+
+    return digest.hexdigest()
+
+
+def getColumnsDirName(fileName):
+    return fileName[0:fileName.rindex('.csv')] + '.columns/'
+
+
+def writeFlightColumns(FlightList, headers, dirName):
+
+    # One .npy file per column: times as datetime64[m], numeric columns as int64 and all other columns as int32
+    # codes into a sorted array of categories. All files can be opened with mmap_mode='r'.
+
+    timeColumns = ['STA', 'ATA', 'STD', 'ATD']
+    integerColumns = ['Terminal', 'TimeDiff', 'BaggageClaim', 'CheckinInterval', 'DepartureInterval']
+
+    tmpDirName = dirName.rstrip('/') + '.tmp/'
+    if os.path.isdir(tmpDirName):
+        shutil.rmtree(tmpDirName)
+    os.makedirs(tmpDirName)
+
+    manifest = {'headers': headers, 'rows': len(FlightList), 'hash': hashFlightList(FlightList), 'columns': {}}
+
+    for i, name in enumerate(headers):
+
+        values = getColumn(FlightList, i)
+        kind = 'category'
+
+        if name in timeColumns:
+            try:
+                column = np.array([v[6:10] + '-' + v[3:5] + '-' + v[0:2] + 'T' + v[11:16] for v in values], dtype='datetime64[m]')
+                kind = 'time'
+            except (ValueError, TypeError):
+                pass
+        elif name in integerColumns:
+            try:
+                column = np.array([int(v) for v in values], dtype=np.int64)
+                kind = 'integer'
+            except (ValueError, TypeError):
+                pass
+
+        if kind == 'category':
+            categories, codes = np.unique(np.array([str(v) for v in values], dtype=str), return_inverse=True)
+            np.save(tmpDirName + str(i) + '_categories.npy', categories)
+            column = codes.reshape(-1).astype(np.int32)
+
+        np.save(tmpDirName + str(i) + '.npy', column)
+        manifest['columns'][name] = kind
+
+    with open(tmpDirName + 'manifest.json', 'w') as file:
+        json.dump(manifest, file)
+
+    if os.path.isdir(dirName):
+        shutil.rmtree(dirName)
+    os.replace(tmpDirName.rstrip('/'), dirName.rstrip('/'))
+
+
+class FlightColumns:
+
+    # Read-only flight list backed by the memory-mapped column files of writeFlightColumns. Columns are only read
+    # when they are used, rows (FlightColumns[i]) are built on demand in the same layout as the lists of parseFlights.
+
+    def __init__(self, dirName):
+
+        with open(dirName + 'manifest.json') as file:
+            manifest = json.load(file)
+
+        self.dirName = dirName
+        self.headers = manifest['headers']
+        self.kinds = [manifest['columns'][name] for name in self.headers]
+        self.rows = manifest['rows']
+        self.hash = manifest['hash']
+        self.arrays = {}
+        self.values = {}
+
+    def __len__(self):
+        return self.rows
+
+    def getColumnArray(self, i):
+
+        # memory-mapped column files: [categories, codes] of a category column, datetime64[m] or int64 values otherwise
+
+        if i not in self.arrays:
+            column = np.load(self.dirName + str(i) + '.npy', mmap_mode='r')
+            if self.kinds[i] == 'category':
+                categories = np.load(self.dirName + str(i) + '_categories.npy', mmap_mode='r')
+                self.arrays[i] = [categories, column]
+            else:
+                self.arrays[i] = column
+
+        return self.arrays[i]
+
+    def getColumnObjects(self, i):
+
+        # Column in the flight list layout as a numpy array: category and time columns as object arrays pointing to one
+        # string per distinct value, integer columns as the memory-mapped values. No Python object is created per row.
+
+        if i not in self.values:
+
+            if self.kinds[i] == 'category':
+                categories, codes = self.getColumnArray(i)
+                self.values[i] = np.asarray(categories).astype(object)[np.asarray(codes)]
+            elif self.kinds[i] == 'time':
+                times, codes = np.unique(np.asarray(self.getColumnArray(i)), return_inverse=True)
+                self.values[i] = getTimeStrings(times)[codes.reshape(-1)]
+            else:
+                self.values[i] = self.getColumnArray(i)
+
+        return self.values[i]
+
+    def getColumnValues(self, i):
+        return self.getColumnObjects(i).tolist()
+
+    def getColumnSlice(self, i, start, stop):
+
+        # values of rows start:stop without caching the whole column, used for chunked processing
+
+        if i in self.values:
+            return self.values[i][start:stop].tolist()
+
+        if self.kinds[i] == 'category':
+            categories, codes = self.getColumnArray(i)
+            return categories[np.asarray(codes[start:stop])].tolist()
+        elif self.kinds[i] == 'time':
+            return getTimeStrings(self.getColumnArray(i)[start:stop]).tolist()
+
+        return self.getColumnArray(i)[start:stop].tolist()
+
+    def __getitem__(self, row):
+        return [self.getColumnObjects(i)[row].item() if self.kinds[i] == 'integer' else self.getColumnObjects(i)[row]
+                for i in range(len(self.headers))]
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self[row]
+
+    def tolist(self):
+        return [self[row] for row in range(self.rows)]
+
+
+####################
+### FLIGHT STORE ###
+####################
+
+
+def getStoreColumns(flightDirection):
+
+    # flight list headers as column names, followed by the sortable schedule time ('YYYY-MM-DD HH:MM') and the region
+    # of the origin/destination
+
+    headers = getFlightsHeaders()[0 if flightDirection == 'A' else 1]
+
+    return list([header.replace(' ', '_') for header in headers] + ['ScheduleTime', 'Region'])
+
+
+class FlightStore:
+
+    # Arrivals and departures in one SQLite file, one table per direction. A flight is identified by flight number and
+    # scheduled time, flights without a flight number are refused, so storing a flight list again replaces its rows
+    # instead of adding them. The days table records which days of each direction were stored completely, so a period
+    # can be served from the store. Queries return rows in the flight list layout of getFlightsHeaders.
+
+    def __init__(self, fileName):
+
+        import sqlite3
+
+        self.fileName = fileName
+        self.connection = sqlite3.connect(fileName)
+
+        for flightDirection, table, airportColumn in [['A', 'arrivals', 'Origin'], ['D', 'departures', 'Destination']]:
+
+            columns = getStoreColumns(flightDirection)
+            self.connection.execute("CREATE TABLE IF NOT EXISTS " + table + " (" + ", ".join(columns) + ", PRIMARY KEY (FlightNumber, ScheduleTime))")
+
+            for column in ['Rego', 'ScheduleTime', 'Airline', airportColumn, 'Region', 'Gate']:
+                self.connection.execute("CREATE INDEX IF NOT EXISTS " + table + "_" + column + " ON " + table + " (" + column + ")")
+
+        self.connection.execute("CREATE TABLE IF NOT EXISTS days (Direction, Date, PRIMARY KEY (Direction, Date))")
+
+        self.connection.commit()
+
+    def getTable(self, flightDirection):
+        return 'arrivals' if flightDirection == 'A' else 'departures'
+
+    def upsert(self, flightDirection, FlightList, airportReference=None):
+
+        # airportReference (getAirportReference) fills the Region column, without it regions are stored as 'NS'. A
+        # flight list with flights without a flight number raises a ValueError and nothing of it is stored.
+
+        emptyValueString = 'NS'
+
+        columns = getStoreColumns(flightDirection)
+        flightNumberIndex = 1
+        scheduleIndex = 2
+        airportIndex = 5
+        codesharesIndex = 9
+
+        rows = []
+
+        for row in FlightList:
+
+            row = [value.item() if isinstance(value, np.generic) else value for value in row]
+            if getCanonicalValue(row[flightNumberIndex]) in ['', emptyValueString]:
+                raise ValueError("Flight without a flight number at " + str(row[scheduleIndex]) + ", it cannot be stored")
+            if isinstance(row[codesharesIndex], list):
+                row[codesharesIndex] = encodeCodeshares(row[codesharesIndex])
+            scheduleTime = str(row[scheduleIndex])
+            scheduleTime = scheduleTime[6:10] + '-' + scheduleTime[3:5] + '-' + scheduleTime[0:2] + ' ' + scheduleTime[11:16]
+
+            if airportReference is None:
+                region = emptyValueString
+            else:
+                region = airportReference.get(row[airportIndex], [emptyValueString])[0]
+
+            rows.append(row + [scheduleTime, region])
+
+        statement = "INSERT OR REPLACE INTO " + self.getTable(flightDirection) + " VALUES (" + ", ".join(['?'] * len(columns)) + ")"
+
+        with self.connection:
+            self.connection.executemany(statement, rows)
+
+        return len(rows)
+
+    def query(self, flightDirection, regos=None, start=None, end=None, airlines=None, airports=None, regions=None,
+              gates=None):
+
+        # Flights of one direction matching all given filters, in scheduled time order. start and end ('YYYY-MM-DD'
+        # or 'YYYY-MM-DD HH:MM') bound the scheduled time, start inclusive and end exclusive. The other filters take a
+        # value or a list of values; airports are origins for arrivals and destinations for departures.
+
+        columns = getStoreColumns(flightDirection)
+        airportColumn = 'Origin' if flightDirection == 'A' else 'Destination'
+
+        conditions = []
+        parameters = []
+
+        for column, values in [['Rego', regos], ['Airline', airlines], [airportColumn, airports], ['Region', regions],
+                               ['Gate', gates]]:
+            if values is not None:
+                values = makeList(values)
+                conditions.append(column + " IN (" + ", ".join(['?'] * len(values)) + ")")
+                parameters.extend(values)
+
+        if start is not None:
+            conditions.append("ScheduleTime >= ?")
+            parameters.append(start)
+
+        if end is not None:
+            conditions.append("ScheduleTime < ?")
+            parameters.append(end)
+
+        statement = "SELECT " + ", ".join(columns[0:-2]) + " FROM " + self.getTable(flightDirection)
+
+        if conditions != []:
+            statement += " WHERE " + " AND ".join(conditions)
+
+        statement += " ORDER BY ScheduleTime, Rego"
+
+        return [list(row) for row in self.connection.execute(statement, parameters)]
+
+    def addDays(self, flightDirection, dates):
+
+        # marks the dates ('YYYY-MM-DD') as stored completely, after their flight list was stored
+
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO days VALUES (?, ?)", [[flightDirection, date] for date in dates])
+
+    def hasDays(self, flightDirection, dates):
+
+        storedDates = set([row[0] for row in self.connection.execute("SELECT Date FROM days WHERE Direction = ?", [flightDirection])])
+
+        return all([date in storedDates for date in dates])
+
+    def getFlightList(self, flightDirection, dates):
+
+        # flight list of the consecutive dates ('YYYY-MM-DD')
+
+        end = (datetime.strptime(dates[-1], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        return self.query(flightDirection, start=dates[0], end=end)
+
+    def close(self):
+        self.connection.close()
+
+
+def getFlightStoreName(config):
+
+    if config['flightStore'] == '':
+        return config['baseOutputPath'] + 'Flights/flights.sqlite'
+
+    return config['flightStore']
+
+
+def storeFlightLists(config, arrFlightList, depFlightList):
+
+    t = time.time()
+
+    if os.path.isfile(config['baseInputPath'] + 'InputAirport.xls'):
+        airportReference = getAirportReference(config['baseInputPath'])
+    else:
+        airportReference = None
+
+    fileName = getFlightStoreName(config)
+    os.makedirs(os.path.dirname(fileName) or '.', exist_ok=True)
+
+    dates = [getDateString(config['baseDate'], day) for day in getDayRange(config)]
+    scheduleIndex = 2
+
+    store = FlightStore(fileName)
+    stored = 0
+
+    for flightDirection, FlightList in [['A', arrFlightList], ['D', depFlightList]]:
+
+        stored += store.upsert(flightDirection, FlightList, airportReference)
+
+        # only days that have flights were fetched, a day without any is not marked as stored completely
+        scheduleDates = set([str(row[scheduleIndex])[6:10] + '-' + str(row[scheduleIndex])[3:5] + '-' + str(row[scheduleIndex])[0:2]
+                             for row in FlightList])
+        store.addDays(flightDirection, [date for date in dates if date in scheduleDates])
+
+    store.close()
+
+    elapsed = time.time() - t
+    progressIndicator = "DB: " + str(stored) + " flights in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+
+#########################
+### BACKGROUND WRITER ###
+#########################
+
+
+class BackgroundWriter:
+
+    # Writes artefacts on a separate thread while the next stage computes. submit() blocks while maxPending writes are
+    # waiting, so queued artefacts cannot pile up in memory; with maxPending 0 every write runs right away. The first
+    # error of a write is raised again by the next submit(), flush() or close(); the other writes still run. Writes
+    # that are still pending when the interpreter exits are flushed.
+
+    def __init__(self, maxPending=2):
+
+        self.maxPending = maxPending
+        self.error = None
+        self.written = 0
+        self.writeTime = 0.0
+
+        if maxPending > 0:
+            self.queue = queue.Queue(maxPending)
+            self.thread = threading.Thread(target=self.run, name='BackgroundWriter', daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def write(self, writeFunction, writeArgs):
+
+        t = time.time()
+
+        try:
+            writeFunction(*writeArgs)
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+        else:
+            self.written += 1
+
+        self.writeTime += time.time() - t
+
+    def run(self):
+
+        while True:
+
+            task = self.queue.get()
+
+            if task is not None:
+                self.write(task[0], task[1])
+
+            self.queue.task_done()
+
+            if task is None:
+                return
+
+    def raiseError(self):
+
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def submit(self, writeFunction, *writeArgs):
+
+        self.raiseError()
+
+        if self.maxPending > 0:
+            self.queue.put([writeFunction, writeArgs])
+        else:
+            self.write(writeFunction, writeArgs)
+            self.raiseError()
+
+    def flush(self):
+
+        if self.maxPending > 0:
+            self.queue.join()
+
+        self.raiseError()
+
+    def close(self):
+
+        if self.maxPending > 0 and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+            atexit.unregister(self.close)
+
+        progressIndicator = "W: " + str(self.written) + " artefacts in " + str(math.ceil((self.writeTime/60)*100)/100) + " minutes"
+        print(progressIndicator)
+
+        self.raiseError()
+
+
+###################
+### STAGE CACHE ###
+###################
+
+
+def hashFile(fileName):
+    digest = hashlib.sha256()
+
+    with open(fileName, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def hashObject(stageInput):
+    return hashlib.sha256(pickle.dumps(stageInput, protocol=4)).hexdigest()
+
+
+def getStageVersion(stageName):
+
+    # Version of the code of every cached stage, part of the stage inputs. Increase it whenever the stage computes
+    # something different, so results cached by older code are recomputed instead of served.
+
+    stageVersions = {'Statistics': 1, 'ProbDists': 1, 'FlightSchedule': 1, 'DelaySketches': 1, 'RollupCube': 1,
+                     'StatisticsChunked': 1, 'ProbDistsChunked': 1}
+
+    return stageVersions[stageName]
+
+
+def getStageKey(stageName, stageInputs):
+    digest = hashlib.sha256(stageName.encode())
+
+    for inputName in sorted(stageInputs.keys()):
+        digest.update(inputName.encode())
+        digest.update(stageInputs[inputName].encode())
+
+    return digest.hexdigest()
+
+
+# stages can run on worker threads (see runStagesConcurrently), the manifest update is a read-modify-write
+stageManifestLock = threading.Lock()
+
+
+def readStageManifest(cachePath):
+    fileName = cachePath + 'manifest.json'
+
+    if os.path.isfile(fileName):
+        with open(fileName) as file:
+            manifest = json.load(file)
+    else:
+        manifest = {}
+
+    return manifest
+
+
+def writeStageManifest(cachePath, manifest):
+    fileName = cachePath + 'manifest.json'
+
+    with open(fileName + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(fileName + '.tmp', fileName)
+
+
+def runCachedStage(stageName, stageInputs, stageFunction, stageArgs, cachePath):
+
+    # stageInputs maps every input of the stage (flight lists, parameters, input files) to its hash,
+    # the stage is only recomputed when one of these hashes changed since the cached run
+
+    t = time.time()
+
+    stageKey = getStageKey(stageName, stageInputs)
+    fileName = cachePath + stageName + '_' + stageKey[0:16] + '.pkl'
+
+    entry = readStageManifest(cachePath).get(stageName)
+
+    if entry is not None and entry['key'] == stageKey and os.path.isfile(fileName):
+
+        with open(fileName, 'rb') as file:
+            result = pickle.load(file)
+
+        elapsed = time.time() - t
+        progressIndicator = "C: " + stageName + " loaded from cache in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+        print(progressIndicator)
+
+    else:
+
+        result = stageFunction(*stageArgs)
+
+        os.makedirs(cachePath, exist_ok=True)
+
+        with open(fileName + '.tmp', 'wb') as file:
+            pickle.dump(result, file, protocol=4)
+        os.replace(fileName + '.tmp', fileName)
+
+        with stageManifestLock:
+
+            manifest = readStageManifest(cachePath)
+
+            if entry is not None and entry['file'] != os.path.basename(fileName):
+                staleFileName = cachePath + entry['file']
+                if os.path.isfile(staleFileName):
+                    os.remove(staleFileName)
+
+            manifest[stageName] = {'key': stageKey, 'file': os.path.basename(fileName), 'inputs': stageInputs,
+                                   'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                   'minutes': math.ceil(((time.time() - t)/60)*100)/100}
+            writeStageManifest(cachePath, manifest)
+
+    return result
+
+
+#######################
+### API CREDENTIALS ###
+#######################
+
+
+def getCredentials():
+
+    appID = "XXXX"
     appKEY = "XXXX"
 
-    return list([appID,appKEY])
+    return list([appID,appKEY])
+
+
+def getCredentialPool(credentialsConfig=''):
+
+    # 'id:key,id:key' from the config or the SCHIPHOL_CREDENTIALS environment variable, getCredentials otherwise
+
+    credentialsRaw = credentialsConfig
+
+    if credentialsRaw == '':
+        credentialsRaw = os.environ.get('SCHIPHOL_CREDENTIALS', '')
+
+    credentialPool = [entry.strip().split(':', 1) for entry in credentialsRaw.split(',') if ':' in entry]
+
+    if credentialPool == []:
+        credentialPool = [getCredentials()]
+
+    return credentialPool
+
+
+def fetchWorker(credentials, taskQueue, resultQueue):
+
+    # fetches the (date, direction) tasks put on its own queue with its own key until it receives None, each worker
+    # keeps its own rate pause. A failed task is reported with its error instead of flights.
+
+    while True:
+
+        task = taskQueue.get()
+
+        if task is None:
+            break
+
+        t = time.time()
+        error = None
+
+        try:
+            if task[1] == 'AD':
+                DayFlightList = getFlightsDayCombined(task[0], credentials)
+            else:
+                DayFlightList = getFlightsDay(list([task[0], '00:00', task[1]]), credentials)
+        except Exception as e:
+            DayFlightList = [[], []] if task[1] == 'AD' else []
+            error = str(e)
+
+        resultQueue.put([task[0], task[1], DayFlightList, error, time.time() - t])
+
+        time.sleep(30)
+
+
+def getFlightListsSharded(baseDate, dayRange, flightDirections, credentialPool, maxAttempts=3):
+
+    # One worker process per key. Every (date, direction) task is given to whichever worker is free, so every day is
+    # fetched once. When both directions are needed a task fetches them together ('AD'). A task that fails, or whose
+    # worker stops, is given to a free worker again, up to maxAttempts times; days that still fail raise a
+    # FlightAPIError instead of leaving a gap in the flight lists. Returns a flight list per direction, in day order.
+
+    if sorted(flightDirections) == ['A', 'D']:
+        taskDirections = ['AD']
+    else:
+        taskDirections = flightDirections
+
+    tasks = [[getDateString(baseDate, day), taskDirection] for taskDirection in taskDirections for day in dayRange]
+
+    taskQueues = [multiprocessing.Queue() for credentials in credentialPool]
+    resultQueue = multiprocessing.Queue()
+
+    workers = [multiprocessing.Process(target=fetchWorker, args=(credentials, taskQueues[k], resultQueue))
+               for k, credentials in enumerate(credentialPool)]
+
+    for worker in workers:
+        worker.start()
+
+    pendingTasks = list(tasks)
+    workerTasks = [None for worker in workers]
+    attempts = {}
+    results = {}
+    failedTasks = []
+
+    while len(results) + len(failedTasks) < len(tasks):
+
+        for k in range(len(workers)):
+            if workerTasks[k] is None and pendingTasks != [] and workers[k].is_alive():
+                workerTasks[k] = pendingTasks.pop(0)
+                taskQueues[k].put(workerTasks[k])
+
+        if pendingTasks != [] and not any(worker.is_alive() for worker in workers):
+            raise FlightAPIError("All fetch workers stopped, " + str(len(pendingTasks)) + " days were not fetched")
+
+        taskErrors = []
+
+        try:
+
+            result = resultQueue.get(timeout=60)
+
+        except queue.Empty:
+
+            # the task of a worker that stopped without reporting is lost and counts as a failed attempt
+            for k in range(len(workers)):
+                if workerTasks[k] is not None and not workers[k].is_alive():
+                    taskErrors.append([workerTasks[k], "Worker stopped with exit code " + str(workers[k].exitcode)])
+                    workerTasks[k] = None
+
+        else:
+
+            workerTasks[workerTasks.index([result[0], result[1]])] = None
+
+            if result[3] is None:
+                results[(result[0], result[1])] = result[2]
+                progressIndicator = result[1] + ": " + result[0] + " (" + str(len(results)) + "/" + str(len(tasks)) + ") in " + str(math.ceil((result[4]/60)*100)/100) + " minutes"
+                print(progressIndicator)
+            else:
+                taskErrors.append([[result[0], result[1]], result[3]])
+
+        for task, error in taskErrors:
+
+            print(error)
+
+            attempts[tuple(task)] = attempts.get(tuple(task), 0) + 1
+
+            if attempts[tuple(task)] < maxAttempts:
+                pendingTasks.append(task)
+            else:
+                failedTasks.append(task)
+
+    for k in range(len(workers)):
+        taskQueues[k].put(None)
+
+    for worker in workers:
+        worker.join()
+
+    if failedTasks != []:
+        raise FlightAPIError("No flights received after " + str(maxAttempts) + " attempts for " + ', '.join([task[1] + ": " + task[0] for task in failedTasks]))
+
+    FlightLists = {}
+
+    for flightDirection in flightDirections:
+        FlightList = []
+        for day in dayRange:
+            if taskDirections == ['AD']:
+                DayFlightList = results[(getDateString(baseDate, day), 'AD')]['AD'.index(flightDirection)]
+            else:
+                DayFlightList = results[(getDateString(baseDate, day), flightDirection)]
+            FlightList = addRowsFlightList(FlightList, DayFlightList)
+        FlightLists[flightDirection] = FlightList
+
+    return FlightLists
+
+
+###############################
+### PRESENCE PROBABILITIES ###
+###############################
+
+
+def readProbabilityDistributions(dayRange, baseOutputPath):
+
+    # reads the ten files written by writeProbabilityDistributions back into the ProbDists list format
+
+    baseFileName = baseOutputPath + 'Probabilities/'
+    fileSuffix = "_" + str(len(dayRange)) + "D.csv"
+
+    ProbDists = []
+
+    for namesFile in ["airlineInNames", "airlineOutNames", "regionInNames", "regionOutNames"]:
+        try:
+            names = readCSV(baseFileName + namesFile + fileSuffix, header=None, keep_default_na=False, dtype=str)
+            ProbDists.append(names[0].tolist())
+        except pandas.errors.EmptyDataError:
+            ProbDists.append([])
+
+    for distsFile in ["airlineInDists", "airlineOutDists", "regionInDists", "regionOutDists"]:
+        try:
+            dists = readCSV(baseFileName + distsFile + fileSuffix, header=None).values
+            ProbDists.append(dists.astype(np.float64))
+        except pandas.errors.EmptyDataError:
+            ProbDists.append(np.empty([0, 60 * 24 * 2]))
+
+    for distFile in ["inDist", "outDist"]:
+        dist = readCSV(baseFileName + distFile + fileSuffix, header=None).values
+        ProbDists.append(dist.reshape(-1).astype(np.float64))
+
+    return ProbDists
+
+
+class PresenceProbabilities:
+
+    # Name -> row index over the airline, region and overall distributions of one ProbDists result. For arrivals a
+    # value is the probability that the flight has arrived at the offset (minutes relative to the scheduled time),
+    # for departures the probability that it has not yet departed. Airlines without a distribution fall back to
+    # their region, regions without a distribution to the overall distribution.
+
+    def __init__(self, names, dists, scale=1.0):
+
+        # names maps 'A'/'D' to [airlineNames, regionNames], dists maps 'A'/'D' to a matrix with the airline rows,
+        # region rows and overall row in that order. Stored values are divided by scale (quantized binary files).
+
+        self.dists = dists
+        self.scale = scale
+        self.timeDim = dists['A'].shape[1]
+        self.airlineRows = {}
+        self.regionRows = {}
+        self.overallRow = {}
+
+        for direction in ['A', 'D']:
+
+            airlineNames = list(names[direction][0])
+            regionNames = list(names[direction][1])
+
+            self.airlineRows[direction] = {name: row for row, name in enumerate(airlineNames)}
+            self.regionRows[direction] = {name: row + len(airlineNames) for row, name in enumerate(regionNames)}
+            self.overallRow[direction] = len(airlineNames) + len(regionNames)
+
+    def getRows(self, direction, airlines=None, regions=None, size=None):
+
+        if airlines is not None:
+            size = len(airlines)
+        elif regions is not None:
+            size = len(regions)
+
+        rows = np.full(size, self.overallRow[direction], dtype=np.int64)
+
+        # regions first, so that airline rows overwrite them where available
+        for names, nameRows in [[regions, self.regionRows[direction]], [airlines, self.airlineRows[direction]]]:
+            if names is not None:
+                uniqueNames, inverse = np.unique(np.asarray(names).astype(str), return_inverse=True)
+                uniqueRows = np.array([nameRows.get(name, -1) for name in uniqueNames], dtype=np.int64)
+                groupRows = uniqueRows[inverse.reshape(-1)]
+                rows = np.where(groupRows >= 0, groupRows, rows)
+
+        return rows
+
+    def getProbabilities(self, direction, offsets, airlines=None, regions=None):
+
+        offsets = np.asarray(offsets)
+
+        for name, names in [['airlines', airlines], ['regions', regions]]:
+            if names is not None and len(names) != len(offsets):
+                raise ValueError(name + " has " + str(len(names)) + " entries, offsets has " + str(len(offsets)))
+
+        rows = self.getRows(direction, airlines, regions, len(offsets))
+        columns = np.clip(np.floor(offsets).astype(np.int64) + self.timeDim // 2, 0, self.timeDim - 1)
+
+        probabilities = self.dists[direction][rows, columns]
+
+        if self.scale != 1.0:
+            probabilities = probabilities / self.scale
+
+        return probabilities.astype(np.float64)
+
+    def getGroups(self):
+
+        groups = {}
+
+        for direction in ['A', 'D']:
+            groups[direction] = {'airlines': sorted(self.airlineRows[direction].keys()),
+                                 'regions': sorted(self.regionRows[direction].keys())}
+
+        return groups
+
+
+def getPresenceProbabilities(ProbDists):
+
+    timeDim = len(ProbDists[8])
+    names = {}
+    dists = {}
+
+    for direction, offset in [['A', 0], ['D', 1]]:
+
+        airlineDists = np.asarray(ProbDists[4 + offset]).reshape(-1, timeDim)
+        regionDists = np.asarray(ProbDists[6 + offset]).reshape(-1, timeDim)
+        overallDist = np.asarray(ProbDists[8 + offset]).reshape(1, timeDim)
+
+        names[direction] = [ProbDists[0 + offset], ProbDists[2 + offset]]
+        dists[direction] = np.concatenate([airlineDists, regionDists, overallDist], axis=0)
+
+    return PresenceProbabilities(names, dists)
+
+
+def getBinaryDataOffset(headerLength):
+
+    # magic (8 bytes) + header length (4 bytes) + header, rounded up to 64 bytes so the data is aligned for mmap
+
+    return int(math.ceil((8 + 4 + headerLength) / 64.0)) * 64
+
+
+def writeProbabilityBinary(ProbDists, fileName, probabilityDtype='uint16'):
+
+    # Single file with a JSON header (names, row ranges, dtype) followed by one row of timeDim values per
+    # distribution. Rows are ordered per direction (airlines, regions, overall) so that each direction is one
+    # contiguous block. uint16 stores round(p * 65535), float32 stores p.
+
+    timeDim = len(ProbDists[8])
+
+    blocks = [['airlineIn', ProbDists[0], ProbDists[4]], ['regionIn', ProbDists[2], ProbDists[6]], ['in', ['in'], ProbDists[8]],
+              ['airlineOut', ProbDists[1], ProbDists[5]], ['regionOut', ProbDists[3], ProbDists[7]], ['out', ['out'], ProbDists[9]]]
+
+    if probabilityDtype == 'uint16':
+        scale = 65535.0
+    elif probabilityDtype == 'float32':
+        scale = 1.0
+    else:
+        raise ValueError("Unknown probabilityDtype " + probabilityDtype + ", use uint16 or float32")
+
+    header = {'format': 'SchipholProbDists', 'version': 1, 'timeDim': timeDim, 'dtype': probabilityDtype,
+              'scale': scale, 'blocks': {}}
+
+    rows = 0
+    distsList = []
+
+    for block in blocks:
+        dists = np.asarray(block[2], dtype=np.float64).reshape(-1, timeDim)
+        header['blocks'][block[0]] = {'names': [str(name) for name in block[1]], 'firstRow': rows, 'rows': dists.shape[0]}
+        distsList.append(dists)
+        rows += dists.shape[0]
+
+    header['rows'] = rows
+
+    data = np.concatenate(distsList, axis=0)
+
+    if probabilityDtype == 'uint16':
+        data = np.round(np.clip(data, 0, 1) * scale).astype('<u2')
+    else:
+        data = data.astype('<f4')
+
+    headerBytes = json.dumps(header).encode()
+    padding = getBinaryDataOffset(len(headerBytes)) - (8 + 4 + len(headerBytes))
+
+    with open(fileName + '.tmp', 'wb') as file:
+        file.write(b'SPDBIN01')
+        file.write(len(headerBytes).to_bytes(4, 'little'))
+        file.write(headerBytes)
+        file.write(b'\0' * padding)
+        file.write(data.tobytes())
+    os.replace(fileName + '.tmp', fileName)
+
+
+def readProbabilityBinary(fileName):
+
+    with open(fileName, 'rb') as file:
+        if file.read(8) != b'SPDBIN01':
+            raise ValueError(fileName + " is not a binary probability distribution file")
+        headerLength = int.from_bytes(file.read(4), 'little')
+        header = json.loads(file.read(headerLength).decode())
+
+    dtype = '<u2' if header['dtype'] == 'uint16' else '<f4'
+    data = np.memmap(fileName, dtype=dtype, mode='r', offset=getBinaryDataOffset(headerLength),
+                     shape=(header['rows'], header['timeDim']))
+
+    return list([header, data])
+
+
+def readPresenceProbabilitiesBinary(fileName):
+
+    # the distributions stay memory-mapped, processes reading the same file share its pages
+
+    binary = readProbabilityBinary(fileName)
+    header = binary[0]
+    data = binary[1]
+
+    names = {}
+    dists = {}
+
+    for direction, airlineBlock, regionBlock, overallBlock in [['A', 'airlineIn', 'regionIn', 'in'], ['D', 'airlineOut', 'regionOut', 'out']]:
+        firstRow = header['blocks'][airlineBlock]['firstRow']
+        lastRow = header['blocks'][overallBlock]['firstRow'] + 1
+        names[direction] = [header['blocks'][airlineBlock]['names'], header['blocks'][regionBlock]['names']]
+        dists[direction] = data[firstRow:lastRow]
+
+    return PresenceProbabilities(names, dists, header['scale'])
+
+
+def servePresenceProbabilities(presence, host='127.0.0.1', port=8765):
+
+    # POST /query with {"direction": "A", "offsets": [...], "airlines": [...], "regions": [...]} returns
+    # {"probabilities": [...]}, GET /groups returns the available airline and region names
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class PresenceRequestHandler(BaseHTTPRequestHandler):
+
+        def sendJSON(self, statusCode, content):
+            body = json.dumps(content).encode()
+            self.send_response(statusCode)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/groups':
+                self.sendJSON(200, presence.getGroups())
+            else:
+                self.sendJSON(404, {'error': 'unknown path'})
+
+        def do_POST(self):
+            if self.path != '/query':
+                self.sendJSON(404, {'error': 'unknown path'})
+                return
+            try:
+                query = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                probabilities = presence.getProbabilities(query['direction'], query['offsets'],
+                                                          query.get('airlines'), query.get('regions'))
+            except (ValueError, KeyError, TypeError) as error:
+                self.sendJSON(400, {'error': str(error)})
+            else:
+                self.sendJSON(200, {'probabilities': probabilities.tolist()})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), PresenceRequestHandler)
+    print("Serving presence probabilities on http://" + host + ":" + str(port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def queryPresenceProbabilities(url, direction, offsets, airlines=None, regions=None):
+
+    import urllib.request
+
+    query = {'direction': direction, 'offsets': np.asarray(offsets).tolist()}
+
+    if airlines is not None:
+        query['airlines'] = np.asarray(airlines).astype(str).tolist()
+    if regions is not None:
+        query['regions'] = np.asarray(regions).astype(str).tolist()
+
+    request = urllib.request.Request(url.rstrip('/') + '/query', data=json.dumps(query).encode(),
+                                     headers={'Content-Type': 'application/json'})
+
+    with urllib.request.urlopen(request) as response:
+        probabilities = json.loads(response.read())['probabilities']
+
+    return np.array(probabilities)
+
+
+###############################
+### OUT-OF-CORE ANALYTICS ###
+###############################
+
+
+def getFlightPartitions(baseOutputPath, baseDates):
+
+    # [arriving, departing] flight list files in the Flights folder for each base date, for example '2018-07-'
+
+    partitions = []
+    baseFileName = baseOutputPath + 'Flights/'
+
+    for baseDate in baseDates:
+        for fileName in sorted(os.listdir(baseFileName)):
+            if fileName.startswith('ArrivingFlights_' + baseDate + '(') and fileName.endswith('.csv'):
+                depFileName = findOutputFile(baseFileName + 'DepartingFlights_' + fileName[len('ArrivingFlights_'):])
+                arrFileName = findOutputFile(baseFileName + fileName)
+                if depFileName is not None:
+                    partitions.append([arrFileName, depFileName])
+            elif fileName.startswith('ArrivingFlights_' + baseDate + '(') and fileName.endswith(('.csv.gz', '.csv.zst')):
+                # compressed lists only, without an uncompressed version next to them
+                csvFileName = fileName[0:fileName.index('.csv') + len('.csv')]
+                depFileName = findOutputFile(baseFileName + 'DepartingFlights_' + csvFileName[len('ArrivingFlights_'):])
+                if not os.path.isfile(baseFileName + csvFileName) and findOutputFile(baseFileName + csvFileName) == baseFileName + fileName and depFileName is not None:
+                    partitions.append([baseFileName + fileName, depFileName])
+
+    return partitions
+
+
+def iterFlightChunks(fileName, headers, chunkSize):
+
+    # DataFrames of at most chunkSize flights, from the column cache when it is up to date, otherwise from the csv
+
+    columnsManifest = getColumnsDirName(fileName) + 'manifest.json'
+
+    FlightList = None
+
+    if os.path.isfile(columnsManifest) and os.path.getmtime(columnsManifest) >= os.path.getmtime(fileName):
+        FlightList = FlightColumns(getColumnsDirName(fileName))
+
+    if FlightList is not None and FlightList.headers == headers:
+
+        for start in range(0, len(FlightList), chunkSize):
+            stop = min(start + chunkSize, len(FlightList))
+            yield pandas.DataFrame({name: FlightList.getColumnSlice(i, start, stop) for i, name in enumerate(headers)}, columns=headers)
+
+    else:
+
+        for chunk in pandas.read_csv(fileName, index_col=0, chunksize=chunkSize, compression=getInputCompression(fileName)):
+            chunk.columns = headers[0:len(chunk.columns)]
+            for name in headers[len(chunk.columns):]:
+                chunk[name] = 'Y'
+            yield chunk.reset_index(drop=True)
+
+
+def getStatisticsChunked(partitions,baseInputPath,dayRange,airlineMin,chunkSize=100000):
+
+    # getStatistics over flight list files, one chunk in memory at a time; only the day counts are kept
+
+    t = time.time()
+
+    uniqueDays = list(dayRange)
+    dayColumns = {("0" + str(day) if day < 10 else str(day)): day for day in dayRange}
+
+    headers = getFlightsHeaders()
+    airportReference = getAirportReference(baseInputPath)
+
+    counts = {'RegionIn': Counter(), 'RegionOut': Counter(), 'AirlineIn': Counter(), 'AirlineOut': Counter()}
+    groups = {'RegionIn': set(), 'RegionOut': set(), 'AirlineIn': set(), 'AirlineOut': set()}
+
+    for partition in partitions:
+
+        for direction, fileName, flightHeaders, timeColumn, airportColumn in [['In', partition[0], headers[0], 'STA', 'Origin'],
+                                                                              ['Out', partition[1], headers[1], 'STD', 'Destination']]:
+
+            for chunk in iterFlightChunks(fileName, flightHeaders, chunkSize):
+
+                regions = [airportReference.get(airport, ['NS'])[0] for airport in chunk[airportColumn]]
+                days = [dayColumns.get(str(scheduleTime)[0:2]) for scheduleTime in chunk[timeColumn]]
+
+                groups['Region' + direction].update(regions)
+                groups['Airline' + direction].update(chunk['Airline'])
+
+                counts['Region' + direction].update(zip(regions, days))
+                counts['Airline' + direction].update(zip(chunk['Airline'], days))
+
+    Statistics = []
+
+    for table in ['RegionIn', 'RegionOut', 'AirlineIn', 'AirlineOut']:
+
+        uniqueGroups = sorted(list(groups[table]))
+        stats = pandas.DataFrame(columns=uniqueDays, index=uniqueGroups)
+
+        for column in dayRange:
+            for row in uniqueGroups:
+                stats.at[row, column] = counts[table][(row, column)]
+
+        Statistics.append(stats)
+
+    Statistics[2] = statsAirlineProcessor(Statistics[2], airlineMin)
+    Statistics[3] = statsAirlineProcessor(Statistics[3], airlineMin)
+
+    allAirlinesRaw = sorted(list(groups['AirlineIn'] | groups['AirlineOut']))
+    skyTeamMembers = getSkyTeamMembers()
+    skInd = [1 if x in skyTeamMembers else 0 for x in allAirlinesRaw]
+
+    Statistics.append(pandas.DataFrame({'Airline': allAirlinesRaw, 'Transfer': skInd}))
+
+    elapsed = time.time() - t
+    progressIndicator = "S: " + str(len(partitions)) + " partitions in " + str(math.ceil((elapsed / 60) * 100) / 100) + " minutes"
+    print(progressIndicator)
+
+    return Statistics
+
+
+def getProbabilityDistributionsChunked(partitions,baseInputPath,minBucket,computeProbDists,chunkSize=100000):
+
+    # getProbabilityDistributions over flight list files, one chunk in memory at a time; only the per group
+    # histograms of TimeDiff are kept
+
+    t = time.time()
+
+    if computeProbDists:
+
+        timeDim = 60 * 24 * 2
+
+        headers = getFlightsHeaders()
+        airportReference = getAirportReference(baseInputPath)
+
+        histograms = {'AirlineIn': {}, 'AirlineOut': {}, 'RegionIn': {}, 'RegionOut': {}, 'In': {}, 'Out': {}}
+
+        for partition in partitions:
+
+            for direction, fileName, flightHeaders, airportColumn in [['In', partition[0], headers[0], 'Origin'],
+                                                                      ['Out', partition[1], headers[1], 'Destination']]:
+
+                for chunk in iterFlightChunks(fileName, flightHeaders, chunkSize):
+
+                    timeDiffs = np.clip(chunk['TimeDiff'].values.astype(np.float64), -timeDim / 2, timeDim / 2 - 1)
+                    bins = np.floor(timeDim / 2 + timeDiffs).astype(np.int64)
+
+                    regions = np.array([airportReference.get(airport, ['NS'])[0] for airport in chunk[airportColumn]], dtype=object)
+                    airlines = chunk['Airline'].values.astype(object)
+
+                    for table, keys in [['Airline' + direction, airlines], ['Region' + direction, regions],
+                                        [direction, np.zeros(len(chunk), dtype=object)]]:
+
+                        uniqueKeys, inverse = np.unique(keys.astype(str), return_inverse=True)
+                        inverse = inverse.reshape(-1)
+                        chunkHistograms = np.bincount(inverse * timeDim + bins, minlength=len(uniqueKeys) * timeDim)
+
+                        for k, key in enumerate(uniqueKeys):
+                            if key not in histograms[table]:
+                                histograms[table][key] = np.zeros(timeDim)
+                            histograms[table][key] += chunkHistograms[k * timeDim:(k + 1) * timeDim]
+
+        returnValue = [[], [], [], [], None, None, None, None, None, None]
+
+        for namesIndex, table in enumerate(['AirlineIn', 'AirlineOut', 'RegionIn', 'RegionOut']):
+
+            names = [key for key in sorted(histograms[table].keys()) if histograms[table][key].sum() >= minBucket]
+            dists = np.empty([0, timeDim])
+
+            for key in names:
+                distribution = np.cumsum(histograms[table][key]) / histograms[table][key].sum()
+                dists = np.append(dists, distribution.reshape(1, timeDim), axis=0)
+
+            if table.endswith('Out'):
+                dists = (dists - 1) * -1
+
+            returnValue[namesIndex] = names
+            returnValue[namesIndex + 4] = dists
+
+        inLine = histograms['In'].get('0', np.zeros(timeDim))
+        outLine = histograms['Out'].get('0', np.zeros(timeDim))
+
+        returnValue[8] = np.cumsum(inLine) / inLine.sum()
+        returnValue[9] = (np.cumsum(outLine) / outLine.sum() - 1) * -1
+
+    else:
+
+        returnValue = ""
+
+    elapsed = time.time() - t
+    progressIndicator = "P: " + str(len(partitions)) + " partitions in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+    return returnValue
+
+
+def writeSortedRun(records, fileName):
+
+    records.sort(key=lambda record: record[0:3])
+
+    with open(fileName, 'wb') as runFile:
+        for record in records:
+            pickle.dump(record, runFile, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def iterSortedRun(fileName):
+
+    with open(fileName, 'rb') as runFile:
+        while True:
+            try:
+                yield pickle.load(runFile)
+            except EOFError:
+                return
+
+
+def iterSortedMovements(partitions, tempPath, chunkSize=100000):
+
+    # Movements of all partitions as [rego, 'YYYYmmddHHMM', direction (0 arrival, 1 departure), flight list row] in
+    # registration and time order, arrivals before departures at the same time. At most chunkSize movements are held
+    # in memory: they are sorted and written to a run file, the run files are merged lazily.
+
+    headers = getFlightsHeaders()
+    runFileNames = []
+    records = []
+
+    for partition in partitions:
+        for direction, fileName in enumerate(partition):
+            for flights in iterFlightChunks(fileName, headers[direction], chunkSize):
+                for row in flights.values.tolist():
+                    scheduleTime = str(row[2])
+                    movementKey = scheduleTime[6:10] + scheduleTime[3:5] + scheduleTime[0:2] + scheduleTime[11:13] + scheduleTime[14:16]
+                    records.append([str(row[0]), movementKey, direction, row])
+                    if len(records) >= chunkSize:
+                        runFileNames.append(tempPath + 'run' + str(len(runFileNames)) + '.pkl')
+                        writeSortedRun(records, runFileNames[-1])
+                        records = []
+
+    runFileNames.append(tempPath + 'run' + str(len(runFileNames)) + '.pkl')
+    writeSortedRun(records, runFileNames[-1])
+
+    return heapq.merge(*[iterSortedRun(fileName) for fileName in runFileNames], key=lambda record: record[0:3])
+
+
+def getScheduleEnrichment(Line, airportReference, aircraftSizes):
+
+    # AC_Size, Region_In, Region_Out, Customs_In and Customs_Out of a schedule row, as enrichFlightSchedule
+
+    emptyValueString = 'NS'
+    emptyValueInteger = 0
+
+    airportIn = airportReference.get(Line[11], [emptyValueString, emptyValueInteger]) if Line[11] != emptyValueString else [emptyValueString, emptyValueInteger]
+    airportOut = airportReference.get(Line[12], [emptyValueString, emptyValueInteger]) if Line[12] != emptyValueString else [emptyValueString, emptyValueInteger]
+
+    return list([aircraftSizes.get(str(Line[10]), 4), airportIn[0], airportOut[0], airportIn[1], airportOut[1]])
+
+
+def writeFlightScheduleExternal(partitions, baseInputPath, fileName, chunkSize=100000):
+
+    # Flight schedule of the flight list files of all partitions, for periods that do not fit in memory. The movements
+    # are externally sorted on registration and time (iterSortedMovements), each registration's timeline is paired by
+    # getDayRotation and its rows are written to fileName right away. Rows are in registration and time order and the
+    # Date column holds 'YYYY-MM-DD', as days of different months would otherwise collide.
+
+    t = time.time()
+
+    headers = getScheduleHeaders()
+    airportReference = getAirportReference(baseInputPath)
+    aircraftSizes = getAircraftSizes(baseInputPath)
+
+    tempPath = fileName + '.runs/'
+    os.makedirs(tempPath, exist_ok=True)
+
+    written = 0
+
+    try:
+
+        movementStream = iterSortedMovements(partitions, tempPath, chunkSize)
+
+        with open(fileName, 'w', newline='') as scheduleFile:
+
+            writer = csv.writer(scheduleFile)
+            writer.writerow(headers[1])
+
+            columnIndex = {column: i for i, column in enumerate(headers[0] + ['AC_Size', 'Region_In', 'Region_Out', 'Customs_In', 'Customs_Out'])}
+            orderIndex = [columnIndex[column] for column in headers[1]]
+
+            for rego, records in itertools.groupby(movementStream, key=lambda record: record[0]):
+
+                movements = cleanMovements([[record[2], record[3], getCarrierFlights(record[3][1], decodeCodeshares(record[3][9]))]
+                                            for record in records])
+
+                for day, dayMovements in itertools.groupby(movements, key=lambda movement: str(movement[1][2])[0:10]):
+
+                    dateString = day[6:10] + '-' + day[3:5] + '-' + day[0:2]
+
+                    for Line in getDayRotation(rego, list(dayMovements), dateString, dateString):
+                        if Line[23] >= 40:
+                            Line = Line + getScheduleEnrichment(Line, airportReference, aircraftSizes)
+                            writer.writerow([Line[i] for i in orderIndex])
+                            written += 1
+
+    finally:
+
+        shutil.rmtree(tempPath, ignore_errors=True)
+
+    elapsed = time.time() - t
+    progressIndicator = "F: " + str(written) + " rows in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+    return written
+
+
+######################
+### DELAY SKETCHES ###
+######################
+
+
+class DelaySketch:
+
+    # Merging t-digest over TimeDiff values: a sorted set of centroids (mean, weight) whose size is bounded by the
+    # compression, with small centroids at the tails. New values are buffered and merged in batches, sketches of
+    # different days or shards combine with merge. Unlike the histograms nothing is clipped at +/- one day. singles
+    # marks the centroids that only hold copies of a single value, the CDF steps at those.
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.singles = np.empty(0, dtype=bool)
+        self.buffer = []
+        self.bufferSize = 0
+        self.count = 0.0
+        # weight of all values including the missing (NaN) ones, which counts the flights of a group as the
+        # histogram backend does for minBucket
+        self.rows = 0.0
+
+    def update(self, values, weights=None, singles=None):
+
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+
+        if weights is None:
+            weights = np.ones(len(values))
+        else:
+            weights = np.asarray(weights, dtype=np.float64).reshape(-1)
+
+        if singles is None:
+            singles = np.ones(len(values), dtype=bool)
+
+        valid = ~np.isnan(values)
+        self.rows += float(weights.sum())
+        self.buffer.append([values[valid], weights[valid], singles[valid]])
+        self.bufferSize += int(valid.sum())
+        self.count += float(weights[valid].sum())
+
+        if self.bufferSize > 20 * self.compression:
+            self.compress()
+
+    def merge(self, other):
+        other.compress()
+        self.update(other.means, other.weights, other.singles)
+        self.rows += other.rows - other.count
+
+    def compress(self):
+
+        if self.bufferSize == 0:
+            return
+
+        means = np.concatenate([self.means] + [values for values, weights, singles in self.buffer])
+        weights = np.concatenate([self.weights] + [weights for values, weights, singles in self.buffer])
+        singles = np.concatenate([self.singles] + [singles for values, weights, singles in self.buffer])
+        self.buffer = []
+        self.bufferSize = 0
+
+        order = np.argsort(means, kind='mergesort')
+        means = means[order]
+        weights = weights[order]
+        singles = singles[order]
+
+        # k1 scale function, a centroid may grow while it spans at most one unit of k
+        total = weights.sum()
+        cumulative = np.cumsum(weights) / total
+        scale = self.compression / (2 * math.pi) * np.arcsin(2 * np.clip(cumulative, 0, 1) - 1)
+
+        newMeans = []
+        newWeights = []
+        newSingles = []
+        currentMean = means[0]
+        currentWeight = weights[0]
+        currentSingle = singles[0]
+        kLimit = self.compression / (2 * math.pi) * math.asin(2 * (0.0) - 1) + 1
+
+        for i in range(1, len(means)):
+            if scale[i] <= kLimit:
+                currentSingle = currentSingle and singles[i] and means[i] == currentMean
+                currentWeight += weights[i]
+                currentMean += (means[i] - currentMean) * weights[i] / currentWeight
+            else:
+                newMeans.append(currentMean)
+                newWeights.append(currentWeight)
+                newSingles.append(currentSingle)
+                kLimit = scale[i - 1] + 1
+                currentMean = means[i]
+                currentWeight = weights[i]
+                currentSingle = singles[i]
+
+        newMeans.append(currentMean)
+        newWeights.append(currentWeight)
+        newSingles.append(currentSingle)
+
+        self.means = np.array(newMeans)
+        self.weights = np.array(newWeights)
+        self.singles = np.array(newSingles, dtype=bool)
+
+    def cdf(self, offsets):
+
+        # P(TimeDiff <= offset) for whole-minute TimeDiffs. A centroid of a single value is a step of its full weight at
+        # that value, so the CDF is exact there. The other centroids have half of their weight on either side of their
+        # mean as in the t-digest, read at offset + 0.5 from a CDF that is linear between their means.
+
+        self.compress()
+        offsets = np.asarray(offsets, dtype=np.float64)
+
+        if self.count == 0:
+            return np.zeros(offsets.shape)
+
+        means, inverse = np.unique(self.means, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        weights = np.bincount(inverse, weights=self.weights)
+        singles = np.bincount(inverse, weights=~self.singles) == 0
+
+        steps = np.concatenate([[0], np.cumsum(weights[singles])])
+        probabilities = steps[np.searchsorted(means[singles], offsets, side='right')]
+
+        if not singles.all():
+            means = means[~singles]
+            weights = weights[~singles]
+            xp = np.concatenate([[means[0] - 0.5], means, [means[-1] + 0.5]])
+            fp = np.concatenate([[0], np.cumsum(weights) - weights / 2, [weights.sum()]])
+            probabilities = probabilities + np.interp(offsets + 0.5, xp, fp)
+
+        return probabilities / self.count
+
+
+def mergeDelaySketches(sketchSet, otherSketchSet):
+
+    for key in otherSketchSet['sketches']:
+        if key not in sketchSet['sketches']:
+            sketchSet['sketches'][key] = DelaySketch(otherSketchSet['compression'])
+        sketchSet['sketches'][key].merge(otherSketchSet['sketches'][key])
+
+    return sketchSet
+
+
+def getDelaySketches(arrFlightList, depFlightList, baseInputPath, groupBy=('Airline', 'Region', 'Hour', 'Weekday'),
+                     compression=100, sketchSet=None, airportReference=None):
+
+    # One sketch per direction and combination of groupBy values (Airline, Region, Hour, Weekday). Passing the result
+    # of a previous call as sketchSet adds the flights of another day or shard to it. airportReference (see
+    # getAirportReference) is read from baseInputPath when not given.
+
+    emptyValueString = 'NS'
+
+    headers = getFlightsHeaders()
+
+    if airportReference is None:
+        airportReference = getAirportReference(baseInputPath)
+
+    if sketchSet is None:
+        sketchSet = {'groupBy': list(groupBy), 'compression': compression, 'sketches': {}}
+
+    for direction, FlightList, flightHeaders, timeColumn, airportColumn in [['A', arrFlightList, headers[0], 'STA', 'Origin'],
+                                                                            ['D', depFlightList, headers[1], 'STD', 'Destination']]:
+
+        flights = getFlightsFrame(FlightList, flightHeaders)
+
+        if len(flights) == 0:
+            continue
+
+        scheduleTimes = parseScheduleTimes(flights[timeColumn].values)
+
+        flights['Region'] = flights[airportColumn].map(lambda airport: airportReference.get(airport, [emptyValueString, '0'])[0]).astype(object)
+        flights['Hour'] = ((scheduleTimes.astype(np.int64) // 60) % 24).astype(int)
+        flights['Weekday'] = ((scheduleTimes.astype('datetime64[D]').astype(np.int64) + 3) % 7).astype(int)
+        flights['TimeDiff'] = pandas.to_numeric(flights['TimeDiff'], errors='coerce')
+
+        for groupValues, group in flights.groupby(sketchSet['groupBy'], sort=False):
+            key = tuple([direction] + [str(value) for value in makeList(list(groupValues) if isinstance(groupValues, tuple) else groupValues)])
+            if key not in sketchSet['sketches']:
+                sketchSet['sketches'][key] = DelaySketch(sketchSet['compression'])
+            sketchSet['sketches'][key].update(group['TimeDiff'].values)
+
+    return sketchSet
+
+
+def queryDelaySketches(sketchSet, direction, offsets, **filters):
+
+    # merges the sketches of direction whose group values match filters (for example Airline='KLM', Hour='7') and
+    # returns P(TimeDiff <= offset), for departures the probability of still being present like the histograms
+
+    groupBy = sketchSet['groupBy']
+    merged = DelaySketch(sketchSet['compression'])
+
+    for key in sketchSet['sketches']:
+        if key[0] == direction and all(key[1 + groupBy.index(name)] == str(value) for name, value in filters.items()):
+            merged.merge(sketchSet['sketches'][key])
+
+    probabilities = merged.cdf(offsets)
+
+    if direction == 'D':
+        probabilities = 1 - probabilities
+
+    return probabilities
+
+
+def getProbabilityDistributionsSketch(arrFlightList,depFlightList,baseInputPath,minBucket,computeProbDists,compression=100):
+
+    # same output as getProbabilityDistributions, with the distributions read from sketches instead of histograms
+
+    t = time.time()
+
+    if computeProbDists:
+
+        timeDim = 60 * 24 * 2
+        offsets = np.arange(timeDim) - timeDim / 2
+
+        sketchSet = getDelaySketches(arrFlightList, depFlightList, baseInputPath, ['Airline', 'Region'], compression)
+
+        returnValue = [[], [], [], [], [], [], [], [], None, None]
+
+        for direction, directionOffset in [['A', 0], ['D', 1]]:
+
+            for groupIndex, namesIndex in [[1, 0], [2, 2]]:
+
+                groupSketches = {}
+
+                for key in sketchSet['sketches']:
+                    if key[0] == direction:
+                        if key[groupIndex] not in groupSketches:
+                            groupSketches[key[groupIndex]] = DelaySketch(compression)
+                        groupSketches[key[groupIndex]].merge(sketchSet['sketches'][key])
+
+                names = [name for name in sorted(groupSketches.keys()) if groupSketches[name].rows >= minBucket]
+                dists = np.array([groupSketches[name].cdf(offsets) for name in names]).reshape(-1, timeDim)
+
+                if direction == 'D':
+                    dists = (dists - 1) * -1
+
+                returnValue[namesIndex + directionOffset] = names
+                returnValue[namesIndex + 4 + directionOffset] = dists
+
+            overallDist = queryDelaySketches(sketchSet, direction, offsets)
+            returnValue[8 + directionOffset] = overallDist
+
+    else:
+
+        returnValue = ""
+
+    elapsed = time.time() - t
+    progressIndicator = "P: 1/1 in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+    return returnValue
+
+
+def writeDelaySketches(sketchSet, fileName):
+
+    # .npz with one (3, centroids) array of means, weights and single-value flags per group, keys are the group values
+    # joined by '|'
+
+    arrays = {}
+
+    for key in sketchSet['sketches']:
+        sketch = sketchSet['sketches'][key]
+        sketch.compress()
+        arrays['|'.join(key)] = np.array([sketch.means, sketch.weights, sketch.singles])
+        arrays['__rows__|' + '|'.join(key)] = np.array(sketch.rows)
+
+    arrays['__groupBy__'] = np.array(sketchSet['groupBy'])
+    arrays['__compression__'] = np.array(sketchSet['compression'])
+
+    np.savez_compressed(fileName, **arrays)
+
+
+def readDelaySketches(fileName):
+
+    arrays = np.load(fileName)
+    sketchSet = {'groupBy': arrays['__groupBy__'].tolist(), 'compression': int(arrays['__compression__']), 'sketches': {}}
+
+    for name in arrays.files:
+        if not name.startswith('__'):
+            sketch = DelaySketch(sketchSet['compression'])
+            sketch.means = arrays[name][0]
+            sketch.weights = arrays[name][1]
+            sketch.singles = arrays[name][2].astype(bool)
+            sketch.count = float(sketch.weights.sum())
+            sketch.rows = float(arrays['__rows__|' + name])
+            sketchSet['sketches'][tuple(name.split('|'))] = sketch
+
+    return sketchSet
+
+
+#################
+### OCCUPANCY ###
+#################
+
+
+def parseScheduleTimes(times):
+
+    # 'dd-mm-YYYY HH:MM' strings -> datetime64[m], 'NS' and other missing values become NaT
+
+    parsed = pandas.to_datetime(pandas.Series(times, dtype=object).astype(str), format='%d-%m-%Y %H:%M', errors='coerce')
+
+    return parsed.values.astype('datetime64[m]')
+
+
+def getTurnaroundIntervals(FlightSchedule):
+
+    # Ground time of every schedule row as [start, end) in minutes since 1970. Rows without an arrival start at 00:00
+    # of the departure day, rows without a departure end at 23:59 of the arrival day (as ArrDepInterval does).
+
+    STA = parseScheduleTimes(FlightSchedule['STA'].values)
+    STD = parseScheduleTimes(FlightSchedule['STD'].values)
+
+    noArrival = np.isnat(STA)
+    noDeparture = np.isnat(STD)
+
+    dayStartDep = STD.astype('datetime64[D]').astype('datetime64[m]')
+    dayEndArr = STA.astype('datetime64[D]').astype('datetime64[m]') + np.timedelta64(23 * 60 + 59, 'm')
+
+    starts = np.where(noArrival, dayStartDep, STA).astype(np.int64)
+    ends = np.where(noDeparture, dayEndArr, STD).astype(np.int64)
+
+    return list([starts, np.maximum(starts, ends)])
+
+
+def getScheduleGroups(FlightSchedule):
+
+    # pier, terminal and size class of every turnaround, the arrival side is used unless it is missing
+
+    emptyValueString = 'NS'
+
+    pierIn = FlightSchedule['GateGroupIn'].astype(str).values
+    pierOut = FlightSchedule['GateGroupOut'].astype(str).values
+    pier = np.where(pierIn != emptyValueString, pierIn, pierOut)
+
+    terminalIn = FlightSchedule['TerminalIn'].astype(str).values
+    terminalOut = FlightSchedule['TerminalOut'].astype(str).values
+    terminal = np.where((terminalIn != '0') & (terminalIn != emptyValueString), terminalIn, terminalOut)
+
+    size = FlightSchedule['AC_Size'].astype(str).values
+
+    return {'Pier': pier, 'Terminal': terminal, 'AC_Size': size}
+
+
+def countIntervals(starts, ends, groups, firstMinute, numberOfBuckets, bucketMinutes):
+
+    # Difference array per group: +1 in the bucket where an interval starts and -1 in the bucket after the one where
+    # it ends, the cumulative sum over the buckets is the number of intervals touching each bucket
+
+    startBuckets = np.clip((starts - firstMinute) // bucketMinutes, 0, numberOfBuckets)
+    endBuckets = np.clip(-((firstMinute - ends) // bucketMinutes), 0, numberOfBuckets)
+
+    groupNames, groupCodes = np.unique(np.asarray(groups).astype(str), return_inverse=True)
+    groupCodes = groupCodes.reshape(-1)
+
+    width = numberOfBuckets + 1
+    diff = np.bincount(groupCodes * width + startBuckets, minlength=len(groupNames) * width)
+    diff = diff - np.bincount(groupCodes * width + endBuckets, minlength=len(groupNames) * width)
+
+    counts = np.cumsum(diff.reshape(len(groupNames), width), axis=1)[:, 0:numberOfBuckets]
+
+    return list([groupNames, counts])
+
+
+def getOccupancy(FlightSchedule, bucketMinutes=1, startDate=None, endDate=None):
+
+    # Aircraft on ground per bucket of bucketMinutes, in total and per pier, terminal and AC size. An aircraft counts in
+    # every bucket its ground time overlaps. startDate/endDate ('YYYY-MM-DD', inclusive) default to the schedule range.
+
+    t = time.time()
+
+    intervals = getTurnaroundIntervals(FlightSchedule)
+    starts = intervals[0]
+    ends = intervals[1]
+
+    if startDate is None:
+        firstMinute = int(starts.min()) // 1440 * 1440 if len(starts) > 0 else 0
+    else:
+        firstMinute = int(np.datetime64(startDate, 'm').astype(np.int64))
+
+    if endDate is None:
+        lastMinute = (int(ends.max()) // 1440 + 1) * 1440 if len(ends) > 0 else firstMinute + 1440
+    else:
+        lastMinute = int((np.datetime64(endDate, 'D') + np.timedelta64(1, 'D')).astype('datetime64[m]').astype(np.int64))
+
+    numberOfBuckets = int(math.ceil((lastMinute - firstMinute) / float(bucketMinutes)))
+
+    index = pandas.DatetimeIndex(np.datetime64(firstMinute, 'm') + np.arange(numberOfBuckets) * np.timedelta64(bucketMinutes, 'm'))
+
+    total = countIntervals(starts, ends, np.zeros(len(starts), dtype=int), firstMinute, numberOfBuckets, bucketMinutes)
+
+    if len(total[0]) > 0:
+        Occupancy = {'Total': pandas.Series(total[1][0], index=index, name='Total')}
+    else:
+        Occupancy = {'Total': pandas.Series(np.zeros(numberOfBuckets, dtype=np.int64), index=index, name='Total')}
+
+    groups = getScheduleGroups(FlightSchedule)
+
+    for dimension in ['Pier', 'Terminal', 'AC_Size']:
+        counts = countIntervals(starts, ends, groups[dimension], firstMinute, numberOfBuckets, bucketMinutes)
+        Occupancy[dimension] = pandas.DataFrame(counts[1].T, index=index, columns=counts[0])
+
+    elapsed = time.time() - t
+    progressIndicator = "O: 1/1 in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+    return Occupancy
+
+
+def writeOccupancy(Occupancy,baseDate,dayRange,baseOutputPath):
+
+    baseFileName = baseOutputPath + 'Occupancy/'
+    os.makedirs(baseFileName, exist_ok=True)
+
+    for dimension in ['Total', 'Pier', 'Terminal', 'AC_Size']:
+        Occupancy[dimension].to_csv(baseFileName + "occupancy" + dimension + getPeriodString(baseDate, dayRange) + '.csv')
+
+
+######################
+### GATE CONFLICTS ###
+######################
+
+
+def getMinute(moment):
+
+    # minutes since 1970 of an int, numpy datetime64 or 'dd-mm-YYYY HH:MM' string
+
+    if isinstance(moment, str):
+        moment = np.datetime64(moment[6:10] + '-' + moment[3:5] + '-' + moment[0:2] + 'T' + moment[11:16], 'm')
+
+    if isinstance(moment, np.datetime64):
+        moment = moment.astype('datetime64[m]').astype(np.int64)
+
+    return int(moment)
+
+
+def getGateIntervals(FlightSchedule, towMinutes=30):
+
+    # Gate occupation of every schedule row. When GateIn and GateOut differ the aircraft is towed: the arrival gate is
+    # held for the first towMinutes of the ground time and the departure gate for the last towMinutes.
+
+    emptyValueString = 'NS'
+
+    intervals = getTurnaroundIntervals(FlightSchedule)
+    starts = intervals[0]
+    ends = intervals[1]
+
+    gateIn = FlightSchedule['GateIn'].astype(str).values
+    gateOut = FlightSchedule['GateOut'].astype(str).values
+    rows = np.arange(len(FlightSchedule))
+
+    towed = (gateIn != gateOut) & (gateIn != emptyValueString) & (gateOut != emptyValueString)
+    single = ~towed & ((gateIn != emptyValueString) | (gateOut != emptyValueString))
+    singleGate = np.where(gateIn != emptyValueString, gateIn, gateOut)
+
+    gates = np.concatenate([singleGate[single], gateIn[towed], gateOut[towed]])
+    gateStarts = np.concatenate([starts[single], starts[towed], np.maximum(starts[towed], ends[towed] - towMinutes)])
+    gateEnds = np.concatenate([ends[single], np.minimum(ends[towed], starts[towed] + towMinutes), ends[towed]])
+    gateRows = np.concatenate([rows[single], rows[towed], rows[towed]])
+
+    return list([gates, gateStarts, gateEnds, gateRows])
+
+
+class GateIndex:
+
+    # Turnaround intervals sorted per gate on start time, together with the running maximum of the end times. A point
+    # query is two binary searches: intervals starting after the moment and intervals ending before the running
+    # maximum passes the moment cannot contain it.
+
+    def __init__(self, FlightSchedule, towMinutes=30):
+
+        self.FlightSchedule = FlightSchedule
+
+        intervals = getGateIntervals(FlightSchedule, towMinutes)
+
+        gateNames, gateCodes = np.unique(intervals[0], return_inverse=True)
+        gateCodes = gateCodes.reshape(-1)
+        order = np.lexsort((intervals[2], intervals[1], gateCodes))
+
+        self.gateNames = gateNames.tolist()
+        self.gateNameCodes = {gate: code for code, gate in enumerate(self.gateNames)}
+        self.gateCodes = gateCodes[order]
+        self.starts = intervals[1][order]
+        self.ends = intervals[2][order]
+        self.rows = intervals[3][order]
+
+        self.offsets = np.searchsorted(self.gateCodes, np.arange(len(gateNames) + 1))
+
+        # running maximum of the end times that restarts at every gate, the gate code keeps segments apart
+        segmentKey = self.gateCodes.astype(np.int64) * (1 << 32) + (self.ends - self.ends.min() if len(self.ends) > 0 else 0)
+        self.maxEnds = np.maximum.accumulate(segmentKey) - self.gateCodes.astype(np.int64) * (1 << 32)
+        if len(self.ends) > 0:
+            self.maxEnds = self.maxEnds + self.ends.min()
+
+    def getGateSlice(self, gate):
+
+        if gate not in self.gateNameCodes:
+            return list([0, 0])
+
+        code = self.gateNameCodes[gate]
+
+        return list([self.offsets[code], self.offsets[code + 1]])
+
+    def getOccupantRows(self, gate, moment):
+
+        moment = getMinute(moment)
+        gateSlice = self.getGateSlice(gate)
+        lo = gateSlice[0]
+        hi = gateSlice[1]
+
+        last = lo + np.searchsorted(self.starts[lo:hi], moment, side='right')
+        first = lo + np.searchsorted(self.maxEnds[lo:hi], moment, side='right')
+
+        candidates = np.arange(first, last)
+        candidates = candidates[self.ends[candidates] > moment]
+
+        return self.rows[candidates]
+
+    def getOccupants(self, gate, moment):
+        return self.FlightSchedule.iloc[self.getOccupantRows(gate, moment)]
+
+    def getOverlaps(self):
+
+        # sweep per gate with a heap of the intervals still on the gate, every interval left in the heap when the next
+        # one starts overlaps it
+
+        overlaps = []
+        registrations = self.FlightSchedule['AC_reg'].astype(str).values
+
+        for code, gate in enumerate(self.gateNames):
+
+            active = []
+
+            for i in range(self.offsets[code], self.offsets[code + 1]):
+
+                while active and active[0][0] <= self.starts[i]:
+                    heapq.heappop(active)
+
+                for activeEnd, j in active:
+                    overlapMinutes = min(activeEnd, self.ends[i]) - self.starts[i]
+                    overlaps.append([gate, self.rows[j], self.rows[i], registrations[self.rows[j]], registrations[self.rows[i]],
+                                     np.datetime64(int(self.starts[i]), 'm'), int(overlapMinutes)])
+
+                heapq.heappush(active, (self.ends[i], i))
+
+        headers = ['Gate', 'Row1', 'Row2', 'AC_reg1', 'AC_reg2', 'Start', 'OverlapMinutes']
+
+        return pandas.DataFrame(overlaps, columns=headers)
+
+    def getGateSummary(self):
+
+        # MinGap is the smallest time between a turnaround and the latest end before it (negative for an overlap),
+        # Utilisation the occupied share of the days covered by the schedule
+
+        if len(self.starts) == 0:
+            return pandas.DataFrame(columns=['Gate', 'Turnarounds', 'MinGap', 'OccupiedMinutes', 'Utilisation'])
+
+        previousMaxEnds = np.concatenate([[0], self.maxEnds[:-1]])
+        firstOfGate = np.zeros(len(self.starts), dtype=bool)
+        firstOfGate[self.offsets[:-1][self.offsets[:-1] < len(self.starts)]] = True
+
+        gaps = np.where(firstOfGate, np.iinfo(np.int64).max, self.starts - previousMaxEnds)
+        newMinutes = np.where(firstOfGate, self.ends - self.starts,
+                              np.maximum(0, self.ends - np.maximum(self.starts, previousMaxEnds)))
+
+        span = ((self.ends.max() // 1440 + 1) - self.starts.min() // 1440) * 1440
+
+        summary = []
+
+        for code, gate in enumerate(self.gateNames):
+            lo = self.offsets[code]
+            hi = self.offsets[code + 1]
+            minGap = gaps[lo:hi].min()
+            occupied = int(newMinutes[lo:hi].sum())
+            summary.append([gate, hi - lo, None if minGap == np.iinfo(np.int64).max else int(minGap), occupied,
+                            occupied / float(span)])
+
+        return pandas.DataFrame(summary, columns=['Gate', 'Turnarounds', 'MinGap', 'OccupiedMinutes', 'Utilisation'])
+
+
+def writeGateConflicts(GateIndexSchedule,baseDate,dayRange,baseOutputPath):
+
+    baseFileName = baseOutputPath + 'Gates/'
+    os.makedirs(baseFileName, exist_ok=True)
+
+    GateIndexSchedule.getOverlaps().to_csv(baseFileName + "gateOverlaps" + getPeriodString(baseDate, dayRange) + '.csv')
+    GateIndexSchedule.getGateSummary().to_csv(baseFileName + "gateSummary" + getPeriodString(baseDate, dayRange) + '.csv')
+
+
+######################
+### ROTATION GRAPH ###
+######################
+
+
+class RotationGraph:
+
+    # All movements of the period per registration, sorted on time and stored as arrays with CSR offsets per
+    # registration, separately for arrivals (direction 0) and departures (direction 1). Turnarounds link an arrival to
+    # the next movement of the same aircraft when that is a departure, whatever the day, so an aircraft staying
+    # overnight is one turnaround instead of two half rows. Moments are minutes since 1970, numpy datetime64 or
+    # 'dd-mm-YYYY HH:MM' strings (see getMinute); every query per registration is a binary search.
+
+    def __init__(self, arrFlightList, depFlightList):
+
+        self.FlightLists = [arrFlightList, depFlightList]
+
+        regos = [np.asarray(getColumn(FlightList, 0), dtype=str) for FlightList in self.FlightLists]
+        times = [parseScheduleTimes(getColumn(FlightList, 2)) for FlightList in self.FlightLists]
+
+        self.regos = np.unique(np.concatenate(regos)).tolist()
+        self.regoCodes = {rego: code for code, rego in enumerate(self.regos)}
+
+        self.times = []
+        self.rows = []
+        self.offsets = []
+
+        for direction in [0, 1]:
+
+            valid = np.flatnonzero(~np.isnat(times[direction]))
+            codes = np.searchsorted(self.regos, regos[direction][valid]) if len(self.regos) > 0 else valid
+            minutes = times[direction][valid].astype(np.int64)
+            order = np.lexsort((minutes, codes))
+
+            self.times.append(minutes[order])
+            self.rows.append(valid[order])
+            self.offsets.append(np.searchsorted(codes[order], np.arange(len(self.regos) + 1)))
+
+        # combined timeline per registration, arrivals before departures at the same time
+        codes = np.concatenate([np.repeat(np.arange(len(self.regos)), np.diff(self.offsets[direction])) for direction in [0, 1]])
+        minutes = np.concatenate(self.times)
+        directions = np.concatenate([np.zeros(len(self.times[0]), dtype=np.int8), np.ones(len(self.times[1]), dtype=np.int8)])
+        positions = np.concatenate([np.arange(len(self.times[0])), np.arange(len(self.times[1]))])
+        order = np.lexsort((directions, minutes, codes))
+
+        codes = codes[order]
+        directions = directions[order]
+        positions = positions[order]
+
+        linked = np.flatnonzero((directions[:-1] == 0) & (directions[1:] == 1) & (codes[:-1] == codes[1:]))
+
+        # turnarounds as positions into the sorted arrivals and departures, per registration in time order
+        self.turnaroundArrivals = positions[linked]
+        self.turnaroundDepartures = positions[linked + 1]
+        self.turnaroundOffsets = np.searchsorted(codes[linked], np.arange(len(self.regos) + 1))
+
+    def getSlice(self, direction, rego):
+
+        if rego not in self.regoCodes:
+            return list([0, 0])
+
+        code = self.regoCodes[rego]
+
+        return list([self.offsets[direction][code], self.offsets[direction][code + 1]])
+
+    def getFlight(self, direction, position):
+        return self.FlightLists[direction][int(self.rows[direction][position])]
+
+    def getNextLeg(self, rego, moment):
+
+        # position of the first departure at or after the moment, None when the aircraft does not leave again
+
+        start, stop = self.getSlice(1, rego)
+        position = start + np.searchsorted(self.times[1][start:stop], getMinute(moment), side='left')
+
+        return int(position) if position < stop else None
+
+    def getPreviousLeg(self, rego, moment):
+
+        # position of the last arrival at or before the moment, None when the aircraft has not arrived yet
+
+        start, stop = self.getSlice(0, rego)
+        position = start + np.searchsorted(self.times[0][start:stop], getMinute(moment), side='right') - 1
+
+        return int(position) if position >= start else None
+
+    def getGroundTime(self, rego, moment):
+
+        # [arrival, departure] minutes of the stay the aircraft is in at the moment, None when it is airborne (or not
+        # seen yet). The departure is None when the aircraft does not leave within the period.
+
+        minute = getMinute(moment)
+        arrival = self.getPreviousLeg(rego, minute)
+
+        if arrival is None:
+            return None
+
+        start, stop = self.getSlice(1, rego)
+        lastDeparture = start + np.searchsorted(self.times[1][start:stop], minute, side='left') - 1
+
+        if lastDeparture >= start and self.times[1][lastDeparture] >= self.times[0][arrival]:
+            return None
+
+        departure = self.getNextLeg(rego, minute)
+        departureMinute = int(self.times[1][departure]) if departure is not None else None
+
+        return list([int(self.times[0][arrival]), departureMinute])
+
+    def getTurnaroundSlice(self, rego=None):
+
+        if rego is None:
+            return list([0, len(self.turnaroundArrivals)])
+
+        if rego not in self.regoCodes:
+            return list([0, 0])
+
+        code = self.regoCodes[rego]
+
+        return list([self.turnaroundOffsets[code], self.turnaroundOffsets[code + 1]])
+
+    def getTurnarounds(self, rego=None):
+
+        # linked turnarounds of one registration (or all), with flight IDs chosen as in getFlightSchedule
+
+        start, stop = self.getTurnaroundSlice(rego)
+
+        turnarounds = []
+
+        for arrival, departure in zip(self.turnaroundArrivals[start:stop], self.turnaroundDepartures[start:stop]):
+
+            arrFlight = self.getFlight(0, arrival)
+            depFlight = self.getFlight(1, departure)
+
+            IDs = getFlightIDS(getCarrierFlights(arrFlight[1], decodeCodeshares(arrFlight[9])),
+                               getCarrierFlights(depFlight[1], decodeCodeshares(depFlight[9])))
+
+            STA = int(self.times[0][arrival])
+            STD = int(self.times[1][departure])
+
+            turnarounds.append([str(arrFlight[0]), IDs[0], IDs[1], arrFlight[2], depFlight[2], STD - STA,
+                                STD // 1440 != STA // 1440])
+
+        return pandas.DataFrame(turnarounds, columns=['AC_reg', 'ID_in', 'ID_out', 'STA', 'STD', 'GroundMinutes', 'Overnight'])
+
+    def getOvernightStays(self, rego=None):
+
+        turnarounds = self.getTurnarounds(rego)
+
+        return turnarounds[turnarounds.Overnight].reset_index(drop=True)
+
+
+def writeRotations(Rotations,baseDate,dayRange,baseOutputPath):
+
+    baseFileName = baseOutputPath + 'Rotations/'
+    os.makedirs(baseFileName, exist_ok=True)
+
+    Rotations.getTurnarounds().to_csv(baseFileName + "turnarounds" + getPeriodString(baseDate, dayRange) + '.csv')
+
+
+########################
+### DELAY SIMULATION ###
+########################
+
+
+def getDelayCDFs(presence, direction):
+
+    # Cumulative delay distribution of every row of one direction (column c is a delay of c - timeDim / 2 minutes).
+    # Departure rows hold the probability that the flight has not yet departed and are turned back into a cumulative
+    # distribution.
+
+    dists = np.asarray(presence.dists[direction], dtype=np.float64) / presence.scale
+
+    if direction == 'D':
+        dists = 1 - dists
+
+    cdf = np.maximum.accumulate(np.clip(dists, 0, 1), axis=1)
+    cdf[:, -1] = 1
+
+    return cdf
+
+
+def getSamplingTable(presence, direction):
+
+    # the rows of getDelayCDFs offset by 2 * row, so that a single searchsorted over the flattened table samples all
+    # flights at once
+
+    cdf = getDelayCDFs(presence, direction)
+    offsets = 2 * np.arange(cdf.shape[0], dtype=np.float64).reshape(-1, 1)
+
+    return (cdf + offsets).reshape(-1)
+
+
+def sampleDelays(table, rows, timeDim, draws):
+
+    # inverse-CDF sampling, draws is a (scenarios, flights) array of uniform numbers in [0, 1)
+
+    columns = np.searchsorted(table, draws + 2 * rows, side='right') - rows * timeDim
+
+    return np.minimum(columns, timeDim - 1) - timeDim // 2
+
+
+def simulateDelays(FlightSchedule, presence, scenarios, seed=None):
+
+    # Arrival and departure delays in minutes (scenarios x schedule rows) drawn from the airline distribution of the
+    # operator, falling back to the region of the origin/destination and to the overall distribution. Rows without an
+    # arrival or departure get a delay of 0 on that side.
+
+    random = np.random.default_rng(seed)
+
+    airlines = FlightSchedule['Operator'].astype(str).values
+    delays = []
+
+    for direction, regionColumn, timeColumn in [['A', 'Region_In', 'STA'], ['D', 'Region_Out', 'STD']]:
+
+        rows = presence.getRows(direction, airlines, FlightSchedule[regionColumn].astype(str).values)
+        table = getSamplingTable(presence, direction)
+
+        directionDelays = sampleDelays(table, rows, presence.timeDim, random.random((scenarios, len(rows))))
+        directionDelays[:, np.isnat(parseScheduleTimes(FlightSchedule[timeColumn].values))] = 0
+
+        delays.append(directionDelays)
+
+    return list([delays[0], delays[1]])
+
+
+def getSimulatedIntervals(FlightSchedule, delays):
+
+    # ground time [start, end) per scenario and row in minutes since 1970, as getTurnaroundIntervals but with actual
+    # instead of scheduled times
+
+    intervals = getTurnaroundIntervals(FlightSchedule)
+
+    starts = intervals[0] + delays[0]
+    ends = np.maximum(starts, intervals[1] + delays[1])
+
+    return list([starts, ends])
+
+
+def iterSimulatedSchedules(FlightSchedule, presence, scenarios, seed=None):
+
+    # one copy of the schedule per scenario, with simulated ATA and ATD
+
+    delays = simulateDelays(FlightSchedule, presence, scenarios, seed)
+
+    for scenario in range(scenarios):
+
+        SimulatedSchedule = FlightSchedule.copy()
+
+        for timeColumn, actualColumn, direction in [['STA', 'ATA', 0], ['STD', 'ATD', 1]]:
+            scheduled = parseScheduleTimes(FlightSchedule[timeColumn].values)
+            actual = pandas.Series(scheduled + delays[direction][scenario].astype('timedelta64[m]'))
+            SimulatedSchedule[actualColumn] = actual.dt.strftime('%d-%m-%Y %H:%M').fillna('NS').values
+
+        yield SimulatedSchedule
+
+
+def getPercentileColumns(percentiles):
+    return ['P' + "{:g}".format(percentile) for percentile in percentiles]
+
+
+def getOccupancyPercentiles(FlightSchedule, presence, scenarios=1000, percentiles=(5, 50, 95), bucketMinutes=5,
+                            seed=None, batchSize=100, maxBatchCells=2 ** 24):
+
+    # Percentiles over the scenarios of the aircraft on ground per bucket, in total and per pier, terminal and AC
+    # size. Scenarios are simulated batchSize at a time, fewer when a batch would count more than maxBatchCells
+    # (scenario, group, bucket) cells; per group and bucket only a histogram of the counts is kept, so memory does not
+    # grow with the number of scenarios.
+
+    t = time.time()
+
+    intervals = getTurnaroundIntervals(FlightSchedule)
+    maxDelay = presence.timeDim // 2
+
+    if len(intervals[0]) > 0:
+        firstMinute = (int(intervals[0].min()) - maxDelay) // 1440 * 1440
+        lastMinute = (int(intervals[1].max()) + maxDelay) // 1440 * 1440 + 1440
+    else:
+        firstMinute = 0
+        lastMinute = 1440
+
+    numberOfBuckets = int(math.ceil((lastMinute - firstMinute) / float(bucketMinutes)))
+    width = numberOfBuckets + 1
+
+    groups = getScheduleGroups(FlightSchedule)
+    groups['Total'] = np.full(len(FlightSchedule), 'Total')
+
+    dimensions = ['Total', 'Pier', 'Terminal', 'AC_Size']
+    groupNames = {}
+    groupCodes = {}
+    histograms = {}
+
+    for dimension in dimensions:
+        names, codes = np.unique(np.asarray(groups[dimension]).astype(str), return_inverse=True)
+        groupNames[dimension] = names
+        groupCodes[dimension] = codes.reshape(-1)
+        histograms[dimension] = np.zeros([len(names) * numberOfBuckets, 1], dtype=np.int64)
+
+    # short buckets and many groups mean large difference arrays per scenario
+    maxGroups = max([len(groupNames[dimension]) for dimension in dimensions])
+    batchSize = max(1, min(batchSize, maxBatchCells // (maxGroups * width)))
+
+    random = np.random.default_rng(seed)
+
+    for batchStart in range(0, scenarios, batchSize):
+
+        batch = min(batchSize, scenarios - batchStart)
+        delays = simulateDelays(FlightSchedule, presence, batch, random.integers(2 ** 32))
+        simulated = getSimulatedIntervals(FlightSchedule, delays)
+
+        startBuckets = np.clip((simulated[0] - firstMinute) // bucketMinutes, 0, numberOfBuckets)
+        endBuckets = np.clip(-((firstMinute - simulated[1]) // bucketMinutes), 0, numberOfBuckets)
+
+        for dimension in dimensions:
+
+            # difference array per scenario and group, as countIntervals
+            numberOfGroups = len(groupNames[dimension])
+            cells = (np.arange(batch).reshape(-1, 1) * numberOfGroups + groupCodes[dimension]) * width
+            diff = np.bincount((cells + startBuckets).reshape(-1), minlength=batch * numberOfGroups * width)
+            diff = diff - np.bincount((cells + endBuckets).reshape(-1), minlength=batch * numberOfGroups * width)
+
+            counts = np.cumsum(diff.reshape(batch, numberOfGroups, width), axis=2)[:, :, 0:numberOfBuckets]
+            counts = counts.reshape(batch, numberOfGroups * numberOfBuckets)
+
+            # the histograms grow with the largest count seen so far
+            histogram = histograms[dimension]
+            if counts.max(initial=0) >= histogram.shape[1]:
+                histogram = np.pad(histogram, [[0, 0], [0, int(counts.max()) + 1 - histogram.shape[1]]])
+                histograms[dimension] = histogram
+
+            # one group at a time, so the counted histogram is never larger than the histogram of one group
+            cellIndex = np.arange(numberOfBuckets).reshape(1, -1)
+            for group in range(numberOfGroups):
+                cells = slice(group * numberOfBuckets, (group + 1) * numberOfBuckets)
+                histogram[cells] += np.bincount((cellIndex * histogram.shape[1] + counts[:, cells]).reshape(-1),
+                                                minlength=numberOfBuckets * histogram.shape[1]).reshape(numberOfBuckets, -1)
+
+    index = pandas.DatetimeIndex(np.datetime64(firstMinute, 'm') + np.arange(numberOfBuckets) * np.timedelta64(bucketMinutes, 'm'))
+    percentileColumns = getPercentileColumns(percentiles)
+
+    OccupancyPercentiles = {}
+
+    for dimension in dimensions:
+
+        # smallest count reached by at least the percentile share of the scenarios
+        cumulative = np.cumsum(histograms[dimension], axis=1)
+        thresholds = [max(1, math.ceil(scenarios * percentile / 100.0 - 1e-9)) for percentile in percentiles]
+        values = np.stack([np.argmax(cumulative >= threshold, axis=1) for threshold in thresholds], axis=1)
+        values = values.reshape(len(groupNames[dimension]), numberOfBuckets, len(percentiles))
+
+        if dimension == 'Total':
+            OccupancyPercentiles[dimension] = pandas.DataFrame(values[0], index=index, columns=percentileColumns)
+        else:
+            columns = pandas.MultiIndex.from_product([groupNames[dimension], percentileColumns])
+            OccupancyPercentiles[dimension] = pandas.DataFrame(values.transpose(1, 0, 2).reshape(numberOfBuckets, -1),
+                                                               index=index, columns=columns)
+
+    elapsed = time.time() - t
+    progressIndicator = "M: " + str(scenarios) + " scenarios in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+    return OccupancyPercentiles
+
+
+def writeOccupancyPercentiles(OccupancyPercentiles,baseDate,dayRange,baseOutputPath):
+
+    baseFileName = baseOutputPath + 'Occupancy/'
+    os.makedirs(baseFileName, exist_ok=True)
+
+    for dimension in ['Total', 'Pier', 'Terminal', 'AC_Size']:
+        OccupancyPercentiles[dimension].to_csv(baseFileName + "occupancyPercentiles" + dimension + getPeriodString(baseDate, dayRange) + '.csv')
+
+
+#####################
+### LOAD FORECAST ###
+#####################
+
+
+def convolveDelays(impulses, spectrum, blockLength, timeDim):
+
+    # Rows of impulses convolved with one delay pdf by overlap-add FFT in blocks of blockLength minutes. spectrum is
+    # the rfft of the pdf at blockLength, which must be at least 2 * timeDim - 1. Output row n holds the mass at
+    # minute n - timeDim / 2 of the impulse grid; rows have the full convolution length, minutes + timeDim - 1.
+
+    segmentLength = blockLength - timeDim + 1
+    numberOfRows, numberOfMinutes = impulses.shape
+    numberOfSegments = int(math.ceil(numberOfMinutes / float(segmentLength)))
+
+    padded = np.zeros([numberOfRows, numberOfSegments * segmentLength])
+    padded[:, 0:numberOfMinutes] = impulses
+
+    blocks = np.fft.irfft(np.fft.rfft(padded.reshape(numberOfRows, numberOfSegments, segmentLength), blockLength, axis=2) * spectrum,
+                          blockLength, axis=2)
+
+    # every block overlaps the next segment with its last timeDim - 1 minutes
+    tails = np.zeros([numberOfRows, numberOfSegments, segmentLength])
+    tails[:, :, 0:timeDim - 1] = blocks[:, :, segmentLength:]
+
+    convolved = np.zeros([numberOfRows, (numberOfSegments + 1) * segmentLength])
+    convolved[:, 0:numberOfSegments * segmentLength] += blocks[:, :, 0:segmentLength].reshape(numberOfRows, -1)
+    convolved[:, segmentLength:] += tails.reshape(numberOfRows, -1)
+
+    # past the full convolution length the padded segments only add zeros
+    return convolved[:, 0:numberOfMinutes + timeDim - 1]
+
+
+def getPresenceLoad(FlightSchedule, presence, weightColumn='AC_Size', bucketMinutes=1):
+
+    # Expected presence per minute in total and per pier and terminal: every turnaround contributes its weight (the
+    # AC size by default, 1 without weightColumn) times the probability that it has arrived minus the probability
+    # that it has departed, using the airline/region/overall distributions of its operator and origin/destination.
+    # Arrivals (departures) of one distribution row are summed into an impulse train per group and convolved once
+    # with the delay pdf. Rows without an arrival or departure start or end at the fixed times of
+    # getTurnaroundIntervals. Buckets of bucketMinutes hold the average load.
+
+    t = time.time()
+
+    timeDim = presence.timeDim
+    half = timeDim // 2
+    blockLength = 1 << int(math.ceil(math.log(4 * timeDim, 2)))
+
+    intervals = getTurnaroundIntervals(FlightSchedule)
+    times = {'A': parseScheduleTimes(FlightSchedule['STA'].values), 'D': parseScheduleTimes(FlightSchedule['STD'].values)}
+
+    if weightColumn is None:
+        weights = np.ones(len(FlightSchedule))
+    else:
+        weights = pandas.to_numeric(FlightSchedule[weightColumn], errors='coerce').fillna(0).values.astype(np.float64)
+
+    if len(FlightSchedule) > 0:
+        displayFirst = int(intervals[0].min()) // 1440 * 1440
+        displayLast = (int(intervals[1].max()) // 1440 + 1) * 1440
+    else:
+        displayFirst = 0
+        displayLast = 1440
+
+    # the grid has room for the delays before the first and after the last scheduled time
+    margin = int(math.ceil(half / 1440.0)) * 1440
+    firstMinute = displayFirst - margin
+    numberOfMinutes = displayLast - firstMinute + margin
+
+    groups = getScheduleGroups(FlightSchedule)
+    airlines = FlightSchedule['Operator'].astype(str).values
+    regions = {'A': FlightSchedule['Region_In'].astype(str).values, 'D': FlightSchedule['Region_Out'].astype(str).values}
+
+    rows = {}
+    spectra = {}
+    for direction in ['A', 'D']:
+        rows[direction] = presence.getRows(direction, airlines, regions[direction])
+        pdfs = np.diff(getDelayCDFs(presence, direction), axis=1, prepend=0)
+        spectra[direction] = np.fft.rfft(pdfs, blockLength, axis=1)
+
+    Load = {}
+
+    for dimension in ['Pier', 'Terminal']:
+
+        groupNames, groupCodes = np.unique(np.asarray(groups[dimension]).astype(str), return_inverse=True)
+        groupCodes = groupCodes.reshape(-1)
+
+        # mass per group and grid minute, shifted by half a distribution as the convolutions are
+        density = np.zeros([len(groupNames), numberOfMinutes + timeDim - 1])
+
+        for direction, sign in [['A', 1.0], ['D', -1.0]]:
+
+            scheduled = ~np.isnat(times[direction])
+            minutes = times[direction][scheduled].astype(np.int64) - firstMinute
+
+            for row in np.unique(rows[direction][scheduled]):
+
+                inRow = rows[direction][scheduled] == row
+                cells = np.bincount(groupCodes[scheduled][inRow] * numberOfMinutes + minutes[inRow],
+                                    weights=weights[scheduled][inRow], minlength=len(groupNames) * numberOfMinutes)
+
+                impulses = cells.reshape(len(groupNames), numberOfMinutes)
+                occupied = np.flatnonzero(impulses.any(axis=1))
+
+                convolved = convolveDelays(impulses[occupied], spectra[direction][row], blockLength, timeDim)
+                density[occupied] += sign * convolved
+
+        # turnarounds without an arrival or departure start or end at a fixed time
+        for fixed, fixedMinutes, sign in [[np.isnat(times['A']), intervals[0], 1.0], [np.isnat(times['D']), intervals[1], -1.0]]:
+            np.add.at(density, (groupCodes[fixed], fixedMinutes[fixed] - firstMinute + half), sign * weights[fixed])
+
+        load = np.cumsum(density, axis=1)[:, half + displayFirst - firstMinute:half + displayLast - firstMinute]
+
+        index = pandas.DatetimeIndex(np.datetime64(displayFirst, 'm') + np.arange(displayLast - displayFirst) * np.timedelta64(1, 'm'))
+        Load[dimension] = pandas.DataFrame(np.maximum(load, 0).T, index=index, columns=groupNames)
+
+    Load['Total'] = Load['Pier'].sum(axis=1).rename('Total')
+
+    if bucketMinutes > 1:
+        for dimension in Load:
+            Load[dimension] = Load[dimension].resample(str(bucketMinutes) + 'min').mean()
+
+    elapsed = time.time() - t
+    progressIndicator = "L: 1/1 in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+    return Load
+
+
+def writePresenceLoad(Load,baseDate,dayRange,baseOutputPath):
+
+    baseFileName = baseOutputPath + 'Forecast/'
+    os.makedirs(baseFileName, exist_ok=True)
+
+    for dimension in ['Total', 'Pier', 'Terminal']:
+        Load[dimension].to_csv(baseFileName + "presenceLoad" + dimension + getPeriodString(baseDate, dayRange) + '.csv')
+
+
+###################
+### ROLLUP CUBE ###
+###################
+
+
+def getAircraftSizes(baseInputPath):
+
+    # AC type -> size class from InputAircraft.xlsx, read once instead of once per schedule row
+
+    ACSizeData = pandas.read_excel(baseInputPath + 'InputAircraft.xlsx')
+
+    aircraftSizes = {}
+
+    for indexAC, ACType in enumerate(ACSizeData['TYPE'].values.tolist()):
+        if str(ACType) not in aircraftSizes:
+            aircraftSizes[str(ACType)] = int(ACSizeData.iat[indexAC, 1])
+
+    return aircraftSizes
+
+
+def getCubeDimensions():
+    return list(['Date', 'Hour', 'Direction', 'Airline', 'Region', 'Customs', 'Pier', 'AC_Size'])
+
+
+def getCubeFrame(FlightList, flightHeaders, direction, airportReference, aircraftSizes):
+
+    # one row per movement with the cube dimensions as strings. Missing airports and gates are 'NS' (customs '0') and
+    # unknown aircraft types get size 4, as in enrichFlightSchedule
+
+    emptyValueString = 'NS'
+
+    flights = getFlightsFrame(FlightList, flightHeaders)
+
+    timeColumn = 'STA' if direction == 'A' else 'STD'
+    airportColumn = 'Origin' if direction == 'A' else 'Destination'
+
+    scheduleTimes = parseScheduleTimes(flights[timeColumn].values)
+    airports = [airportReference.get(airport, [emptyValueString, '0']) for airport in flights[airportColumn].astype(str)]
+    gates = flights['Gate'].astype(str)
+
+    cubeFrame = pandas.DataFrame({
+        'Date': np.datetime_as_string(scheduleTimes.astype('datetime64[D]')),
+        'Hour': ["{:02d}".format(hour) for hour in (scheduleTimes.astype(np.int64) // 60) % 24],
+        'Direction': direction,
+        'Airline': flights['Airline'].astype(str).values,
+        'Region': [airport[0] for airport in airports],
+        'Customs': [airport[1] for airport in airports],
+        'Pier': np.where(gates.isin([emptyValueString, 'None', '']), emptyValueString, gates.str[0] + '-pier'),
+        'AC_Size': [str(aircraftSizes.get(ACType, 4)) for ACType in flights['AC Type'].astype(str)]},
+        columns=getCubeDimensions())
+
+    return cubeFrame[~np.isnat(scheduleTimes)]
+
+
+def getCubeLabel(dimension, value):
+
+    # hours are stored zero-padded so that labels sort as strings, Hour=7 and Hour='07' select the same cells
+
+    if dimension == 'Hour':
+        return "{:02d}".format(int(value))
+
+    return str(value)
+
+
+class RollupCube:
+
+    # Movement counts per combination of the cube dimensions (see getCubeDimensions), stored sparsely: only the
+    # cells with at least one movement, as one code array per dimension into its sorted labels plus a count array.
+    # Weekday (0 = Monday) is derived from Date and can be used like the stored dimensions.
+
+    def __init__(self, labels, codes, counts):
+
+        self.dimensions = list(labels.keys())
+        self.labels = labels
+        self.codes = codes
+        self.counts = counts
+
+    def getCodes(self, dimension):
+
+        if dimension == 'Weekday':
+            weekdays = (np.array(self.labels['Date'], dtype='datetime64[D]').astype(np.int64) + 3) % 7
+            return weekdays[self.codes['Date']]
+
+        return self.codes[dimension]
+
+    def getLabels(self, dimension):
+
+        if dimension == 'Weekday':
+            return np.arange(7)
+
+        return self.labels[dimension]
+
+    def getMask(self, **filters):
+
+        # a filter is a single value, a list of values or a slice of labels (Date=slice('2018-07-01', '2018-07-07'))
+
+        mask = np.ones(len(self.counts), dtype=bool)
+
+        for dimension in filters:
+
+            value = filters[dimension]
+            labels = self.getLabels(dimension).astype(str)
+
+            if isinstance(value, slice):
+                selected = np.ones(len(labels), dtype=bool)
+                if value.start is not None:
+                    selected &= labels >= getCubeLabel(dimension, value.start)
+                if value.stop is not None:
+                    selected &= labels <= getCubeLabel(dimension, value.stop)
+            else:
+                selected = np.isin(labels, [getCubeLabel(dimension, item) for item in makeList(value)])
+
+            mask &= selected[self.getCodes(dimension)]
+
+        return mask
+
+    def getCount(self, **filters):
+        return int(self.counts[self.getMask(**filters)].sum())
+
+    def rollup(self, by, **filters):
+
+        # movement counts per combination of the by dimensions over the cells that pass the filters, as a Series
+        # indexed by the by labels (only combinations with movements)
+
+        by = makeList(by)
+        mask = self.getMask(**filters)
+
+        shape = [len(self.getLabels(dimension)) for dimension in by]
+        cells = np.ravel_multi_index([self.getCodes(dimension)[mask] for dimension in by], shape)
+
+        # totals only of the combinations that occur, not of every combination of the by dimensions
+        occupied, inverse = np.unique(cells, return_inverse=True)
+        totals = np.bincount(inverse.reshape(-1), weights=self.counts[mask], minlength=len(occupied)).astype(np.int64)
+
+        byCodes = np.unravel_index(occupied, shape)
+        index = [self.getLabels(dimension)[codes] for dimension, codes in zip(by, byCodes)]
+
+        if len(by) == 1:
+            return pandas.Series(totals, index=pandas.Index(index[0], name=by[0]), name='Movements')
+
+        return pandas.Series(totals, index=pandas.MultiIndex.from_arrays(index, names=by), name='Movements')
+
+
+def getRollupCube(arrFlightList, depFlightList, baseInputPath):
+
+    t = time.time()
+
+    headers = getFlightsHeaders()
+    airportReference = getAirportReference(baseInputPath)
+    aircraftSizes = getAircraftSizes(baseInputPath)
 
+    movements = pandas.concat([getCubeFrame(arrFlightList, headers[0], 'A', airportReference, aircraftSizes),
+                               getCubeFrame(depFlightList, headers[1], 'D', airportReference, aircraftSizes)])
 
-###################
-### MAIN SCRIPT ###
-###################
+    labels = {}
+    movementCodes = []
 
+    for dimension in getCubeDimensions():
+        dimensionLabels, dimensionCodes = np.unique(np.asarray(movements[dimension].values, dtype=str), return_inverse=True)
+        labels[dimension] = dimensionLabels
+        movementCodes.append(dimensionCodes.reshape(-1))
 
-if __name__ == "__main__":
+    # one cell per distinct combination of codes
+    shape = [max(len(labels[dimension]), 1) for dimension in getCubeDimensions()]
+    cells, counts = np.unique(np.ravel_multi_index(movementCodes, shape), return_counts=True)
+
+    codes = {}
+    for dimension, cellCodes in zip(getCubeDimensions(), np.unravel_index(cells, shape)):
+        codes[dimension] = cellCodes.astype(np.min_scalar_type(max(len(labels[dimension]) - 1, 0)))
+
+    cube = RollupCube(labels, codes, counts.astype(np.uint32))
+
+    elapsed = time.time() - t
+    progressIndicator = "R: 1/1 in " + str(math.ceil((elapsed/60)*100)/100) + " minutes"
+    print(progressIndicator)
+
+    return cube
+
+
+def writeRollupCube(cube, fileName):
+
+    arrays = {'counts': cube.counts}
+
+    for dimension in cube.dimensions:
+        arrays['labels_' + dimension] = np.asarray(cube.labels[dimension], dtype=str)
+        arrays['codes_' + dimension] = cube.codes[dimension]
+
+    np.savez_compressed(fileName, **arrays)
+
+
+def readRollupCube(fileName):
+
+    arrays = np.load(fileName)
+
+    labels = {}
+    codes = {}
+
+    for dimension in getCubeDimensions():
+        labels[dimension] = arrays['labels_' + dimension]
+        codes[dimension] = arrays['codes_' + dimension]
+
+    return RollupCube(labels, codes, arrays['counts'])
+
+
+##########################
+### FLIGHT DATA ENGINE ###
+##########################
+
+
+class LRUCache:
+
+    # Bounded least recently used cache that can be shared by threads. get(key, loader) returns the cached value or
+    # calls loader(); when several threads miss the same key at the same time the loader runs once and the others
+    # wait for its result. Exceptions of the loader are passed on to all of them and are not cached. A value loaded
+    # with maxAge (seconds) is loaded again once it is older than that.
+
+    def __init__(self, maxSize):
+
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.expiry = {}
+        self.pending = {}
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader, maxAge=None):
+
+        from concurrent.futures import Future
+
+        with self.lock:
+
+            if key in self.expiry and self.expiry[key] < time.time():
+                del self.entries[key]
+                del self.expiry[key]
+
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+            future = self.pending.get(key)
+            isLoader = future is None
+
+            if isLoader:
+                future = Future()
+                self.pending[key] = future
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not isLoader:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as error:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(error)
+            raise
+
+        with self.lock:
+            del self.pending[key]
+            self.entries[key] = value
+            if maxAge is not None:
+                self.expiry[key] = time.time() + maxAge
+            while len(self.entries) > self.maxSize:
+                self.expiry.pop(self.entries.popitem(last=False)[0], None)
+
+        future.set_result(value)
+
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.expiry.clear()
+
+    def getStats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'maxSize': self.maxSize, 'hits': self.hits, 'misses': self.misses}
+
+
+class FlightDataEngine:
+
+    # Long-lived entry point for embedding the script in a service. The engine owns its configuration (getDefaultConfig
+    # updated with config), the reference files of baseInputPath (read once), a requests.Session for the API per
+    # thread and bounded LRU caches of fetched days, prepared flights, flight schedules, statistics and probability
+    # distributions, so repeated requests for a period are answered from memory. Days from yesterday on can still
+    # change, they and every result of a period with such a day are only kept for maxAge seconds. A day that cannot be
+    # fetched completely is tried fetchAttempts times and then raises a FlightAPIError, it is never cached. All
+    # methods can be called from several threads; cached results are shared between the callers and must be treated
+    # as read-only.
+
+    def __init__(self, config=None, cacheSize=16, dayCacheSize=400, maxAge=600, fetchAttempts=3):
+
+        self.config = getDefaultConfig()
+        if config is not None:
+            self.config.update(config)
+
+        self.maxAge = maxAge
+        self.fetchAttempts = fetchAttempts
+
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.sessions = []
+        self.credentialCycle = itertools.cycle(getCredentialPool(self.config['credentials']))
+
+        self.reference = LRUCache(1)
+        self.days = LRUCache(dayCacheSize)
+        self.prepared = LRUCache(cacheSize)
+        self.schedules = LRUCache(cacheSize)
+        self.statistics = LRUCache(cacheSize)
+        self.distributions = LRUCache(cacheSize)
+
+    def getReferenceData(self):
+
+        # [ACSizeData, AirportData, airportReference]
+
+        baseInputPath = self.config['baseInputPath']
+
+        def readReference():
+            ReferenceData = readReferenceData(baseInputPath)
+            return ReferenceData + [getAirportReference(baseInputPath, ReferenceData[1])]
+
+        return self.reference.get(baseInputPath, readReference)
+
+    def getCredentials(self):
+
+        # with several keys the days are fetched with the keys in turn
+        with self.lock:
+            return next(self.credentialCycle)
+
+    def getSession(self):
+
+        # requests.Session is not thread-safe, every thread uses its own
+
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+            with self.lock:
+                self.sessions.append(self.local.session)
+
+        return self.local.session
+
+    def getMaxAge(self, dates):
+
+        # None when every date ('YYYY-mm-dd') is final, before yesterday, so late actual times are in
+
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+
+        if all([date < yesterday for date in dates]):
+            return None
+
+        return self.maxAge
+
+    def getPeriodMaxAge(self, baseDate, dayRange):
+        return self.getMaxAge([getDateString(baseDate, day) for day in dayRange])
+
+    def getFlightsDay(self, date):
+
+        # [arrivals, departures] of one day ('YYYY-mm-dd') from the API. A day without any flight is most likely a
+        # failed request, it is raised instead of cached
+
+        def fetchDay():
+            DayFlightLists = getFlightsDayCombined(date, self.getCredentials(), self.getSession())
+            if DayFlightLists[0] == [] and DayFlightLists[1] == []:
+                raise FlightAPIError("No flights received for " + date)
+            return DayFlightLists
+
+        return self.days.get(date, lambda: getDayWithRetries(fetchDay, date, self.fetchAttempts), self.getMaxAge([date]))
+
+    def getFlightLists(self, baseDate, dayRange):
+
+        arrFlightList = []
+        depFlightList = []
+
+        for day in dayRange:
+            DayFlightLists = self.getFlightsDay(getDateString(baseDate, day))
+            arrFlightList = addRowsFlightList(arrFlightList, DayFlightLists[0])
+            depFlightList = addRowsFlightList(depFlightList, DayFlightLists[1])
+
+        return list([arrFlightList, depFlightList])
+
+    def getPreparedFlights(self, baseDate, dayRange):
+
+        def prepare():
+            flightLists = self.getFlightLists(baseDate, dayRange)
+            return getPreparedFlights(flightLists[0], flightLists[1], self.config['baseInputPath'], self.getReferenceData()[2])
+
+        return self.prepared.get((baseDate, tuple(dayRange)), prepare, self.getPeriodMaxAge(baseDate, dayRange))
+
+    def getFlightSchedule(self, baseDate, dayRange):
+
+        def build():
+            flightLists = self.getFlightLists(baseDate, dayRange)
+            return getFlightSchedule(self.config['baseInputPath'], baseDate, flightLists[0], flightLists[1],
+                                     self.getReferenceData()[0:2])
+
+        return self.schedules.get((baseDate, tuple(dayRange)), build, self.getPeriodMaxAge(baseDate, dayRange))
+
+    def getStatistics(self, baseDate, dayRange, airlineMin=None):
+
+        if airlineMin is None:
+            airlineMin = self.config['airlineMin']
+
+        def build():
+            return getStatistics(None, None, self.config['baseInputPath'], dayRange, airlineMin,
+                                 self.getPreparedFlights(baseDate, dayRange))
+
+        return self.statistics.get((baseDate, tuple(dayRange), airlineMin), build, self.getPeriodMaxAge(baseDate, dayRange))
+
+    def getProbabilityDistributions(self, baseDate, dayRange, minBucket=None):
+
+        if minBucket is None:
+            minBucket = self.config['minBucket']
+
+        def build():
+            return getProbabilityDistributions(None, None, self.config['baseInputPath'], minBucket, True,
+                                               self.getPreparedFlights(baseDate, dayRange))
+
+        return self.distributions.get((baseDate, tuple(dayRange), minBucket), build, self.getPeriodMaxAge(baseDate, dayRange))
+
+    def getCacheStats(self):
+        return {name: cache.getStats() for name, cache in [['reference', self.reference], ['days', self.days],
+                                                           ['prepared', self.prepared], ['schedules', self.schedules],
+                                                           ['statistics', self.statistics],
+                                                           ['distributions', self.distributions]]}
+
+    def clear(self):
+        for cache in [self.reference, self.days, self.prepared, self.schedules, self.statistics, self.distributions]:
+            cache.clear()
+
+    def close(self):
+        self.clear()
+        with self.lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions = []
+            self.local = threading.local()
+
+
+##############################
+### COMMAND LINE INTERFACE ###
+##############################
+
+
+def getDefaultConfig():
+
+    config = {'baseInputPath': 'Input/', 'baseOutputPath': 'Output/', 'checkExistingFiles': True,
+              'computeProbDists': True, 'baseDate': '2018-07-', 'dayStart': 1, 'dayEnd': 30, 'minBucket': 200,
+              'airlineMin': 25, 'useStageCache': True, 'cachePath': '', 'probabilityFormat': 'csv',
+              'probabilityDtype': 'uint16', 'occupancyBucket': 1,
+              'towMinutes': 30, 'distributionBackend': 'histogram', 'sketchCompression': 100,
+              'sketchGroupBy': 'Airline,Region,Hour,Weekday', 'chunkSize': 0, 'partitions': '',
+              'credentials': '', 'scenarios': 1000, 'percentiles': '5,50,95', 'simulationBucket': 5, 'simulationSeed': 0,
+              'simulationSchedules': 0, 'useFlightStore': False, 'flightStore': '', 'writerQueue': 2,
+              'outputCompression': 'none', 'forecastWeight': 'AC_Size', 'sweepMinBuckets': '', 'sweepAirlineMins': ''}
+
+    return config
+
+
+def readConfigFile(config, fileName):
+
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+
+    if not parser.read(fileName):
+        print("Config file " + fileName + " not found")
+        sys.exit(1)
+
+    if parser.has_section('FlightData'):
+
+        section = parser['FlightData']
+
+        for key in section:
+            if key not in config:
+                print("Unknown config key: " + key)
+                sys.exit(1)
+            elif isinstance(config[key], bool):
+                config[key] = section.getboolean(key)
+            elif isinstance(config[key], int):
+                config[key] = section.getint(key)
+            else:
+                config[key] = section.get(key)
+
+    return config
+
+
+def getDayRange(config):
+    return range(config['dayStart'], config['dayEnd'] + 1)
+
+
+def getCachePath(config):
+
+    if config['cachePath'] == '':
+        cachePath = config['baseOutputPath'] + 'Cache/'
+    else:
+        cachePath = config['cachePath']
+
+    return cachePath
+
+
+def getArgumentParser():
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--config', help="config file with a [FlightData] section (default: flightdata.ini if present)")
+    common.add_argument('--input', dest='baseInputPath', help="input folder with InputAircraft.xlsx and InputAirport.xls")
+    common.add_argument('--output', dest='baseOutputPath', help="output folder")
+    common.add_argument('--base-date', dest='baseDate', help="year and month, for example 2018-07-")
+    common.add_argument('--days', help="day range of the base date, for example 1-31")
+    common.add_argument('--min-bucket', dest='minBucket', type=int, help="minimum bucket size of the probability distributions")
+    common.add_argument('--airline-min', dest='airlineMin', type=int, help="minimum A/D movements per day for a separate airline category")
+    common.add_argument('--cache-path', dest='cachePath', help="stage cache folder (default: <output>/Cache/)")
+    common.add_argument('--prob-format', dest='probabilityFormat', choices=['csv', 'binary', 'both'], help="file format of the probability distributions")
+    common.add_argument('--prob-dtype', dest='probabilityDtype', choices=['uint16', 'float32'], help="value type of the binary probability file")
+    common.add_argument('--dist-backend', dest='distributionBackend', choices=['histogram', 'sketch'], help="compute the probability distributions from histograms or delay sketches")
+    common.add_argument('--chunk-size', dest='chunkSize', type=int, help="run stats/probs/schedule out-of-core over the flight list files, this many flights at a time")
+    common.add_argument('--partitions', help="comma separated base dates of the flight list files used by --chunk-size (default: --base-date)")
+    common.add_argument('--flight-store', dest='flightStore', help="SQLite flight store (default: <output>/Flights/flights.sqlite)")
+    common.add_argument('--store-flights', dest='useFlightStore', action='store_true', default=None, help="also store fetched flight lists in the flight store")
+    common.add_argument('--output-compression', dest='outputCompression', choices=['none', 'gzip', 'zstd'], help="compress the flight lists, statistics, probabilities and schedules (zstd needs the zstandard package)")
+    common.add_argument('--writer-queue', dest='writerQueue', type=int, help="outputs waiting for the background writer before a stage blocks, 0 writes in the foreground (default: 2)")
+    common.add_argument('--refetch', dest='checkExistingFiles', action='store_false', default=None, help="ignore existing flight lists")
+    common.add_argument('--no-cache', dest='useStageCache', action='store_false', default=None, help="do not use the stage cache")
+    common.add_argument('--no-probs', dest='computeProbDists', action='store_false', default=None, help="skip the probability distributions")
+
+    parser = argparse.ArgumentParser(prog='schiphol-flightdata', description="Schiphol flight lists, flight schedules, statistics and presence probabilities")
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    subparsers.add_parser('fetch', parents=[common], help="gather and write the arriving and departing flight lists")
+    subparsers.add_parser('stats', parents=[common], help="compute and write the flight statistics")
+    subparsers.add_parser('probs', parents=[common], help="compute and write the presence probability distributions")
+    subparsers.add_parser('schedule', parents=[common], help="compute and write the daily flight schedules")
+    subparsers.add_parser('write', parents=[common], help="run all stages and write all outputs")
+    subparsers.add_parser('status', parents=[common], help="show configuration, available outputs and the stage cache")
+
+    occupancy = subparsers.add_parser('occupancy', parents=[common], help="compute and write aircraft on ground per pier, terminal and size")
+    occupancy.add_argument('--bucket', dest='occupancyBucket', type=int, help="bucket size in minutes (default: 1)")
+
+    gates = subparsers.add_parser('gates', parents=[common], help="compute and write gate overlaps, gaps and utilisation")
+    gates.add_argument('--tow-minutes', dest='towMinutes', type=int, help="minutes a towed aircraft holds each gate (default: 30)")
+
+    subparsers.add_parser('rotations', parents=[common], help="write the turnarounds of every aircraft linked across midnight")
+
+    sketches = subparsers.add_parser('sketches', parents=[common], help="compute and write delay sketches per group")
+    sketches.add_argument('--group-by', dest='sketchGroupBy', help="comma separated groups out of Airline,Region,Hour,Weekday")
+    sketches.add_argument('--compression', dest='sketchCompression', type=int, help="t-digest compression (default: 100)")
+
+    subparsers.add_parser('store', parents=[common], help="store the flight lists of the period in the flight store")
+    subparsers.add_parser('cube', parents=[common], help="compute and write the movement counts per date, hour, direction, airline, region, customs, pier and size")
+
+    forecast = subparsers.add_parser('forecast', parents=[common], help="write the expected presence per minute per pier and terminal")
+    forecast.add_argument('--weight', dest='forecastWeight', help="schedule column weighting every turnaround, or none (default: AC_Size)")
+    forecast.add_argument('--bucket', dest='occupancyBucket', type=int, help="bucket size in minutes (default: 1)")
 
-    baseInputPath = '/Users/juleslortye/Dropbox/TU Delft Thesis/Python/FlightData/Input/'
-    baseOutputPath = '/Users/juleslortye/Dropbox/TU Delft Thesis/Python/FlightData/Output/'
+    simulate = subparsers.add_parser('simulate', parents=[common], help="simulate delays and write occupancy percentiles over the scenarios")
+    simulate.add_argument('--scenarios', type=int, help="number of simulated scenarios (default: 1000)")
+    simulate.add_argument('--percentiles', help="comma separated percentiles of the aircraft on ground (default: 5,50,95)")
+    simulate.add_argument('--bucket', dest='simulationBucket', type=int, help="bucket size in minutes (default: 5)")
+    simulate.add_argument('--seed', dest='simulationSeed', type=int, help="random seed (default: 0)")
+    simulate.add_argument('--schedules', dest='simulationSchedules', type=int, help="also write the flight schedules of the first n scenarios")
 
-    checkExistingFiles = True
-    computeProbDists = True
-    baseDate = '2018-07-'
-    dayRange = range(1,31)
-    minBucket = 200
-    airlineMin = 25
+    sweep = subparsers.add_parser('sweep', parents=[common], help="write statistics and probability distributions for several airlineMin and minBucket values")
+    sweep.add_argument('--min-buckets', dest='sweepMinBuckets', help="comma separated minBucket values (default: --min-bucket)")
+    sweep.add_argument('--airline-mins', dest='sweepAirlineMins', help="comma separated airlineMin values (default: --airline-min)")
 
-    arrFlightList = getFlightList(baseDate, dayRange, 'A', baseOutputPath, checkExistingFiles)
-    depFlightList = getFlightList(baseDate, dayRange, 'D', baseOutputPath, checkExistingFiles)
+    serve = subparsers.add_parser('serve', parents=[common], help="serve the written presence probabilities over local HTTP")
+    serve.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    serve.add_argument('--port', type=int, default=8765, help="port to listen on (default: 8765)")
 
-    Statistics = getStatistics(arrFlightList,depFlightList,dayRange,airlineMin)
+    return parser
+
+
+def getConfig(arguments):
+
+    config = getDefaultConfig()
+
+    if arguments.config is not None:
+        config = readConfigFile(config, arguments.config)
+    elif os.path.isfile('flightdata.ini'):
+        config = readConfigFile(config, 'flightdata.ini')
+
+    for key in ['baseInputPath', 'baseOutputPath', 'baseDate', 'minBucket', 'airlineMin', 'cachePath',
+                'checkExistingFiles', 'useStageCache', 'computeProbDists', 'probabilityFormat', 'probabilityDtype',
+                'occupancyBucket', 'towMinutes', 'distributionBackend', 'sketchCompression', 'sketchGroupBy',
+                'chunkSize', 'partitions', 'scenarios', 'percentiles', 'simulationBucket', 'simulationSeed', 'simulationSchedules',
+                'useFlightStore', 'flightStore', 'writerQueue', 'outputCompression',
+                'forecastWeight', 'sweepMinBuckets', 'sweepAirlineMins']:
+        value = getattr(arguments, key, None)
+        if value is not None:
+            config[key] = value
+
+    if arguments.days is not None:
+        days = arguments.days.split('-')
+        config['dayStart'] = int(days[0])
+        config['dayEnd'] = int(days[-1])
+
+    return config
+
+
+def hasFlightList(config, flightDirection):
+
+    prefix = 'ArrivingFlights_' if flightDirection == 'A' else 'DepartingFlights_'
+    fileName = config['baseOutputPath'] + 'Flights/' + prefix + getPeriodString(config['baseDate'], getDayRange(config)) + '.csv'
+
+    return config['checkExistingFiles'] and (findOutputFile(fileName) is not None or os.path.isfile(getColumnsDirName(fileName) + 'manifest.json'))
+
+
+def loadFlightLists(config):
+
+    dayRange = getDayRange(config)
+    credentialPool = getCredentialPool(config['credentials'])
+
+    FlightLists = {}
+    fetchDirections = [flightDirection for flightDirection in ['A', 'D'] if not hasFlightList(config, flightDirection)]
+
+    # directions without a file are read from the flight store when it holds every day of the period
+    if config['useFlightStore'] and fetchDirections != [] and os.path.isfile(getFlightStoreName(config)):
+
+        dates = [getDateString(config['baseDate'], day) for day in dayRange]
+        store = FlightStore(getFlightStoreName(config))
+
+        for flightDirection in fetchDirections:
+            if store.hasDays(flightDirection, dates):
+                print("Read " + ('arriving' if flightDirection == 'A' else 'departing') + " flight list from the flight store")
+                FlightLists[flightDirection] = store.getFlightList(flightDirection, dates)
+
+        store.close()
+
+        fetchDirections = [flightDirection for flightDirection in fetchDirections if flightDirection not in FlightLists]
+
+    # with several keys the missing directions are fetched in parallel, one worker per key, with a single key both
+    # directions are fetched in one pass
+    if len(credentialPool) > 1 and fetchDirections != []:
+        FlightLists = getFlightListsSharded(config['baseDate'], dayRange, fetchDirections, credentialPool)
+    elif fetchDirections == ['A', 'D']:
+        FlightListsAPI = getFlightListsFromAPI(config['baseDate'], dayRange)
+        FlightLists = {'A': FlightListsAPI[0], 'D': FlightListsAPI[1]}
 
-    ProbDists = getProbabilityDistributions(arrFlightList,depFlightList,baseInputPath,minBucket,computeProbDists)
+    for flightDirection in ['A', 'D']:
+        if flightDirection not in FlightLists:
+            FlightLists[flightDirection] = getFlightList(config['baseDate'], dayRange, flightDirection, config['baseOutputPath'],
+                                                         config['checkExistingFiles'])
+
+    return list([FlightLists['A'], FlightLists['D']])
+
+
+def runStage(stageName, config, arrFlightList, depFlightList, PreparedFlights=None):
+
+    baseInputPath = config['baseInputPath']
+    baseDate = config['baseDate']
+    dayRange = getDayRange(config)
+
+    if stageName == 'Statistics':
+        stageFunction = getStatistics
+        stageArgs = [arrFlightList, depFlightList, baseInputPath, dayRange, config['airlineMin']]
+        parameters = {'dayRange': dayRange, 'airlineMin': config['airlineMin']}
+        referenceFiles = ['InputAirport.xls']
+        if PreparedFlights is not None:
+            stageArgs.append(PreparedFlights)
+    elif stageName == 'ProbDists' and config['distributionBackend'] == 'sketch':
+        stageFunction = getProbabilityDistributionsSketch
+        stageArgs = [arrFlightList, depFlightList, baseInputPath, config['minBucket'], config['computeProbDists'],
+                     config['sketchCompression']]
+        parameters = {'minBucket': config['minBucket'], 'computeProbDists': config['computeProbDists'],
+                      'distributionBackend': 'sketch', 'sketchCompression': config['sketchCompression']}
+        referenceFiles = ['InputAirport.xls']
+    elif stageName == 'ProbDists':
+        stageFunction = getProbabilityDistributions
+        stageArgs = [arrFlightList, depFlightList, baseInputPath, config['minBucket'], config['computeProbDists']]
+        parameters = {'minBucket': config['minBucket'], 'computeProbDists': config['computeProbDists']}
+        referenceFiles = ['InputAirport.xls']
+        if PreparedFlights is not None:
+            stageArgs.append(PreparedFlights)
+    elif stageName == 'DelaySketches':
+        stageFunction = getDelaySketches
+        stageArgs = [arrFlightList, depFlightList, baseInputPath, config['sketchGroupBy'].split(','), config['sketchCompression']]
+        parameters = {'sketchGroupBy': config['sketchGroupBy'], 'sketchCompression': config['sketchCompression']}
+        referenceFiles = ['InputAirport.xls']
+    elif stageName == 'RollupCube':
+        stageFunction = getRollupCube
+        stageArgs = [arrFlightList, depFlightList, baseInputPath]
+        parameters = {}
+        referenceFiles = ['InputAirport.xls', 'InputAircraft.xlsx']
+    else:
+        stageFunction = getFlightSchedule
+        stageArgs = [baseInputPath, baseDate, arrFlightList, depFlightList]
+        parameters = {'baseDate': baseDate}
+        referenceFiles = ['InputAirport.xls', 'InputAircraft.xlsx']
+
+    if config['useStageCache']:
+
+        stageInputs = {'arrFlightList': hashFlightList(arrFlightList), 'depFlightList': hashFlightList(depFlightList),
+                       'stageVersion': hashObject(getStageVersion(stageName))}
+        for parameter in parameters:
+            stageInputs[parameter] = hashObject(parameters[parameter])
+        for referenceFile in referenceFiles:
+            stageInputs[referenceFile] = hashFile(baseInputPath + referenceFile)
+
+        result = runCachedStage(stageName + '_' + getPeriodString(baseDate, dayRange), stageInputs, stageFunction,
+                                stageArgs, getCachePath(config))
+
+    else:
+
+        result = stageFunction(*stageArgs)
+
+    return result
+
+
+def runStagesConcurrently(stageNames, config, arrFlightList, depFlightList, PreparedFlights=None):
+
+    # One worker thread per stage, the stages share the flight lists and the prepared dataset (a dict of
+    # getPreparedFlights or a SharedPreparedFlights) read-only. Returns the futures in the order of stageNames so the
+    # caller can use every result as soon as it is done.
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=len(stageNames))
+    futures = [executor.submit(runStage, stageName, config, arrFlightList, depFlightList, PreparedFlights)
+               for stageName in stageNames]
+    executor.shutdown(wait=False)
+
+    return list(futures)
+
+
+def getPartitions(config):
+
+    if config['partitions'] == '':
+        baseDates = [config['baseDate']]
+    else:
+        baseDates = config['partitions'].split(',')
+
+    partitions = getFlightPartitions(config['baseOutputPath'], baseDates)
+
+    if partitions == []:
+        print("No flight list files found for " + ", ".join(baseDates) + ", run fetch first")
+        sys.exit(1)
+
+    return partitions
+
+
+def runChunkedStage(stageName, config):
+
+    # Statistics/ProbDists over the flight list files of config['partitions'], chunkSize flights at a time
+
+    partitions = getPartitions(config)
+    dayRange = getDayRange(config)
+
+    if stageName == 'Statistics':
+        stageFunction = getStatisticsChunked
+        stageArgs = [partitions, config['baseInputPath'], dayRange, config['airlineMin'], config['chunkSize']]
+        parameters = {'dayRange': dayRange, 'airlineMin': config['airlineMin']}
+    else:
+        stageFunction = getProbabilityDistributionsChunked
+        stageArgs = [partitions, config['baseInputPath'], config['minBucket'], config['computeProbDists'], config['chunkSize']]
+        parameters = {'minBucket': config['minBucket'], 'computeProbDists': config['computeProbDists']}
+
+    if config['useStageCache']:
+
+        stageInputs = {'InputAirport.xls': hashFile(config['baseInputPath'] + 'InputAirport.xls'),
+                       'stageVersion': hashObject(getStageVersion(stageName + 'Chunked'))}
+        for parameter in parameters:
+            stageInputs[parameter] = hashObject(parameters[parameter])
+        for partition in partitions:
+            for fileName in partition:
+                stageInputs[os.path.basename(fileName)] = hashFile(fileName)
+
+        result = runCachedStage(stageName + 'Chunked_' + getPeriodString(config['baseDate'], dayRange), stageInputs,
+                                stageFunction, stageArgs, getCachePath(config))
+
+    else:
+
+        result = stageFunction(*stageArgs)
+
+    return result
+
+
+def commandFetch(config):
+    flightLists = loadFlightLists(config)
+    writeFlightLists(flightLists[0], flightLists[1], config['baseDate'], getDayRange(config), config['baseOutputPath'],
+                     config['outputCompression'])
+    if config['useFlightStore']:
+        storeFlightLists(config, flightLists[0], flightLists[1])
+
+
+def commandStore(config):
+    flightLists = loadFlightLists(config)
+    storeFlightLists(config, flightLists[0], flightLists[1])
+
+
+def commandStats(config):
+    if config['chunkSize'] > 0:
+        Statistics = runChunkedStage('Statistics', config)
+    else:
+        flightLists = loadFlightLists(config)
+        Statistics = runStage('Statistics', config, flightLists[0], flightLists[1])
+    writeStatistics(Statistics, config['baseDate'], getDayRange(config), config['baseOutputPath'], config['outputCompression'])
+
+
+def commandProbs(config):
+    if config['chunkSize'] > 0:
+        ProbDists = runChunkedStage('ProbDists', config)
+    else:
+        flightLists = loadFlightLists(config)
+        ProbDists = runStage('ProbDists', config, flightLists[0], flightLists[1])
+    writeProbabilityDistributions(ProbDists, getDayRange(config), config['baseOutputPath'], config['probabilityFormat'],
+                                  config['probabilityDtype'], config['outputCompression'])
+
+
+def commandSchedule(config):
+
+    # with a chunk size the schedule of all partitions is built out-of-core and written as a single file
+    if config['chunkSize'] > 0:
+        baseDates = [config['baseDate']] if config['partitions'] == '' else config['partitions'].split(',')
+        fileName = config['baseOutputPath'] + 'FlightSchedules/FlightSchedule_' + '_'.join([baseDate.strip('-') for baseDate in baseDates]) + '.csv'
+        writeFlightScheduleExternal(getPartitions(config), config['baseInputPath'], fileName, config['chunkSize'])
+        return
+
+    flightLists = loadFlightLists(config)
+    FlightSchedule = runStage('FlightSchedule', config, flightLists[0], flightLists[1])
+    writeFlightSchedules(FlightSchedule, config['baseDate'], getDayRange(config), config['baseOutputPath'],
+                         config['outputCompression'])
+
+
+def commandOccupancy(config):
+    flightLists = loadFlightLists(config)
+    FlightSchedule = runStage('FlightSchedule', config, flightLists[0], flightLists[1])
+    Occupancy = getOccupancy(FlightSchedule, config['occupancyBucket'])
+    writeOccupancy(Occupancy, config['baseDate'], getDayRange(config), config['baseOutputPath'])
+
+
+def commandGates(config):
+    flightLists = loadFlightLists(config)
+    FlightSchedule = runStage('FlightSchedule', config, flightLists[0], flightLists[1])
+    writeGateConflicts(GateIndex(FlightSchedule, config['towMinutes']), config['baseDate'], getDayRange(config), config['baseOutputPath'])
+
+
+def commandRotations(config):
+    flightLists = loadFlightLists(config)
+    writeRotations(RotationGraph(flightLists[0], flightLists[1]), config['baseDate'], getDayRange(config), config['baseOutputPath'])
+
+
+def commandSketches(config):
+    flightLists = loadFlightLists(config)
+    sketchSet = runStage('DelaySketches', config, flightLists[0], flightLists[1])
+    writeDelaySketches(sketchSet, config['baseOutputPath'] + 'Probabilities/delaySketches' + getPeriodString(config['baseDate'], getDayRange(config)) + '.npz')
+
+
+def commandWrite(config):
+
+    flightLists = loadFlightLists(config)
+    arrFlightList = flightLists[0]
+    depFlightList = flightLists[1]
+
+    baseDate = config['baseDate']
+    dayRange = getDayRange(config)
+    baseOutputPath = config['baseOutputPath']
+    compression = config['outputCompression']
+
+    # every artefact is written in the background as soon as its stage is done, while the next stage computes
+    writer = BackgroundWriter(config['writerQueue'])
+
+    writer.submit(writeFlightLists, arrFlightList, depFlightList, baseDate, dayRange, baseOutputPath, compression)
 
-    FlightSchedule = getFlightSchedule(baseInputPath,baseDate,arrFlightList,depFlightList)
+    # Statistics and probability distributions run side by side. From histograms they work on the same enriched
+    # dataset, which is only built when one of them is not read from the stage cache.
+    if config['distributionBackend'] == 'sketch':
+        PreparedFlights = None
+    else:
+        PreparedFlights = SharedPreparedFlights(arrFlightList, depFlightList, config['baseInputPath'])
+    futures = runStagesConcurrently(['Statistics', 'ProbDists'], config, arrFlightList, depFlightList, PreparedFlights)
+
+    Statistics = futures[0].result()
+    writer.submit(writeStatistics, Statistics, baseDate, dayRange, baseOutputPath, compression)
+
+    ProbDists = futures[1].result()
+    writer.submit(writeProbabilityDistributions, ProbDists, dayRange, baseOutputPath, config['probabilityFormat'],
+                  config['probabilityDtype'], compression)
+
+    FlightSchedule = runStage('FlightSchedule', config, arrFlightList, depFlightList)
+    writer.submit(writeFlightSchedules, FlightSchedule, baseDate, dayRange, baseOutputPath, compression)
+
+    writer.close()
+
+
+def commandStatus(config):
+
+    baseOutputPath = config['baseOutputPath']
+    dayRange = getDayRange(config)
+    period = getPeriodString(config['baseDate'], dayRange)
+
+    for key in sorted(config.keys()):
+        print(key + ": " + str(config[key]))
+
+    print("")
+    print("Outputs for " + period + ":")
+
+    outputFiles = [['Arriving flights', baseOutputPath + 'Flights/ArrivingFlights_' + period + '.csv'],
+                   ['Departing flights', baseOutputPath + 'Flights/DepartingFlights_' + period + '.csv'],
+                   ['Region statistics', baseOutputPath + 'FlightStatistics/statsRegionIn' + period + '.csv'],
+                   ['Airline statistics', baseOutputPath + 'FlightStatistics/statsAirlineIn' + period + '.csv'],
+                   ['Probabilities', baseOutputPath + 'Probabilities/inDist_' + str(len(dayRange)) + 'D.csv']]
+
+    for outputFile in outputFiles:
+        print("  " + outputFile[0] + ": " + ("yes" if findOutputFile(outputFile[1]) is not None else "no"))
+
+    scheduleDays = [day for day in dayRange
+                    if findOutputFile(baseOutputPath + 'FlightSchedules/FlightSchedule_' + config['baseDate'] + str(day) + '.csv') is not None]
+    print("  Flight schedules: " + str(len(scheduleDays)) + "/" + str(len(dayRange)) + " days")
+
+    cachePath = getCachePath(config)
+    manifest = readStageManifest(cachePath)
+
+    print("")
+    print("Stage cache (" + cachePath + "): " + str(len(manifest)) + " entries")
+
+    for stageName in sorted(manifest.keys()):
+        entry = manifest[stageName]
+        available = os.path.isfile(cachePath + entry['file'])
+        print("  " + stageName + ": created " + entry['created'] + ", " + str(entry['minutes']) + " minutes"
+              + ("" if available else " (file missing)"))
+
+
+def commandCube(config):
+    flightLists = loadFlightLists(config)
+    cube = runStage('RollupCube', config, flightLists[0], flightLists[1])
+    writeRollupCube(cube, config['baseOutputPath'] + 'FlightStatistics/rollupCube' + getPeriodString(config['baseDate'], getDayRange(config)) + '.npz')
+
+
+def commandForecast(config):
+
+    flightLists = loadFlightLists(config)
+    FlightSchedule = runStage('FlightSchedule', config, flightLists[0], flightLists[1])
+    ProbDists = runStage('ProbDists', config, flightLists[0], flightLists[1])
+
+    if ProbDists == "":
+        print("The forecast needs the probability distributions, remove --no-probs")
+        return
+
+    weightColumn = None if config['forecastWeight'] == 'none' else config['forecastWeight']
+
+    Load = getPresenceLoad(FlightSchedule, getPresenceProbabilities(ProbDists), weightColumn, config['occupancyBucket'])
+    writePresenceLoad(Load, config['baseDate'], getDayRange(config), config['baseOutputPath'])
+
+
+def commandSimulate(config):
+
+    flightLists = loadFlightLists(config)
+    FlightSchedule = runStage('FlightSchedule', config, flightLists[0], flightLists[1])
+    ProbDists = runStage('ProbDists', config, flightLists[0], flightLists[1])
+
+    if ProbDists == "":
+        print("The simulation needs the probability distributions, remove --no-probs")
+        return
+
+    presence = getPresenceProbabilities(ProbDists)
+    dayRange = getDayRange(config)
+    percentiles = [float(percentile) for percentile in config['percentiles'].split(',')]
+
+    OccupancyPercentiles = getOccupancyPercentiles(FlightSchedule, presence, config['scenarios'], percentiles,
+                                                   config['simulationBucket'], config['simulationSeed'])
+    writeOccupancyPercentiles(OccupancyPercentiles, config['baseDate'], dayRange, config['baseOutputPath'])
+
+    if config['simulationSchedules'] > 0:
+
+        baseFileName = config['baseOutputPath'] + 'Simulation/'
+        os.makedirs(baseFileName, exist_ok=True)
+
+        SimulatedSchedules = iterSimulatedSchedules(FlightSchedule, presence, config['simulationSchedules'], config['simulationSeed'])
+        for scenario, SimulatedSchedule in enumerate(SimulatedSchedules):
+            SimulatedSchedule.to_csv(baseFileName + 'FlightSchedule' + getPeriodString(config['baseDate'], dayRange) + '_S' + str(scenario + 1) + '.csv', index=False)
+
+
+def getSweepValues(values, default):
+    return [default] if values == '' else [int(value) for value in values.split(',')]
+
+
+def commandSweep(config):
+
+    flightLists = loadFlightLists(config)
+    dayRange = getDayRange(config)
+
+    minBuckets = getSweepValues(config['sweepMinBuckets'], config['minBucket'])
+    airlineMins = getSweepValues(config['sweepAirlineMins'], config['airlineMin'])
+
+    Sweep = getParameterSweep(flightLists[0], flightLists[1], config['baseInputPath'], dayRange, minBuckets, airlineMins)
+    writeParameterSweep(Sweep, config['baseDate'], dayRange, config['baseOutputPath'], config['probabilityFormat'],
+                        config['probabilityDtype'], config['outputCompression'])
+
+    print(Sweep['Summary'].to_string(index=False))
+
+
+def loadPresenceProbabilities(config):
+
+    dayRange = getDayRange(config)
+    fileNameBinary = config['baseOutputPath'] + 'Probabilities/' + "ProbDists" + "_" + str(len(dayRange)) + "D.bin"
+
+    if os.path.isfile(fileNameBinary):
+        presence = readPresenceProbabilitiesBinary(fileNameBinary)
+    else:
+        presence = getPresenceProbabilities(readProbabilityDistributions(dayRange, config['baseOutputPath']))
+
+    return presence
+
+
+def commandServe(config, arguments):
+    servePresenceProbabilities(loadPresenceProbabilities(config), arguments.host, arguments.port)
+
+
+def main(argv=None):
+
+    arguments = getArgumentParser().parse_args(argv)
+    config = getConfig(arguments)
+
+    commands = {'fetch': commandFetch, 'stats': commandStats, 'probs': commandProbs, 'schedule': commandSchedule,
+                'write': commandWrite, 'status': commandStatus, 'occupancy': commandOccupancy,
+                'gates': commandGates, 'sketches': commandSketches, 'simulate': commandSimulate,
+                'cube': commandCube, 'store': commandStore,
+                'rotations': commandRotations, 'forecast': commandForecast, 'sweep': commandSweep}
+
+    if arguments.command == 'serve':
+        commandServe(config, arguments)
+    else:
+        commands[arguments.command](config)
+
+    return 0
+
+
+###################
+### MAIN SCRIPT ###
+###################
+
+
+if __name__ == "__main__":
 
-    status = writeToCSV(FlightSchedule,ProbDists,Statistics,arrFlightList,depFlightList,baseDate,dayRange,baseOutputPath)
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import math
+
+import numpy as np
+
+import main
+
+
+def convolve(impulses, pdf, timeDim):
+    blockLength = 1 << int(math.ceil(math.log(2 * timeDim - 1, 2)))
+    return main.convolveDelays(impulses, np.fft.rfft(pdf, blockLength), blockLength, timeDim)
+
+
+def test_convolve_delays_matches_direct_convolution():
+
+    random = np.random.default_rng(3)
+    timeDim = 16
+    pdf = random.random(timeDim)
+    pdf = pdf / pdf.sum()
+
+    # one, several and a partial last segment of blockLength - timeDim + 1 = 17 minutes
+    for numberOfMinutes in [5, 17, 34, 50]:
+
+        impulses = np.zeros([3, numberOfMinutes])
+        impulses[0, 0] = 1
+        impulses[1, numberOfMinutes - 1] = 2
+        impulses[2] = random.random(numberOfMinutes)
+
+        convolved = convolve(impulses, pdf, timeDim)
+
+        assert convolved.shape == (3, numberOfMinutes + timeDim - 1)
+        for row in range(3):
+            assert np.allclose(convolved[row], np.convolve(impulses[row], pdf))
+
+
+def test_convolve_delays_keeps_the_mass_across_block_boundaries():
+
+    timeDim = 8
+    pdf = np.zeros(timeDim)
+    pdf[timeDim - 1] = 1
+
+    impulses = np.zeros([1, 40])
+    impulses[0, [0, 8, 9, 39]] = 1
+
+    convolved = convolve(impulses, pdf, timeDim)
+
+    assert np.allclose(convolved[0, [7, 15, 16, 46]], 1)
+    assert np.isclose(convolved.sum(), 4)
@@ -0,0 +1,53 @@
+import numpy as np
+
+import main
+
+
+def getTable(cdf):
+    offsets = 2 * np.arange(cdf.shape[0], dtype=np.float64).reshape(-1, 1)
+    return (cdf + offsets).reshape(-1)
+
+
+def sampleDelaysPerFlight(cdf, rows, timeDim, draws):
+    delays = np.zeros(draws.shape, dtype=np.int64)
+    for scenario in range(draws.shape[0]):
+        for flight in range(draws.shape[1]):
+            column = np.searchsorted(cdf[rows[flight]], draws[scenario, flight], side='right')
+            delays[scenario, flight] = min(column, timeDim - 1) - timeDim // 2
+    return delays
+
+
+def test_sample_delays_matches_per_flight_search():
+
+    random = np.random.default_rng(7)
+    timeDim = 12
+
+    pdf = random.random((4, timeDim))
+    pdf[1, :] = 0
+    pdf[1, 3] = 1
+    pdf[2, 0:6] = 0
+    cdf = np.cumsum(pdf, axis=1)
+    cdf = cdf / cdf[:, -1:]
+
+    rows = np.array([0, 1, 2, 3, 3, 1, 0])
+    draws = random.random((50, len(rows)))
+    draws[0, :] = 0
+    draws[1, :] = cdf[rows, 2]
+
+    delays = main.sampleDelays(getTable(cdf), rows, timeDim, draws)
+
+    assert np.array_equal(delays, sampleDelaysPerFlight(cdf, rows, timeDim, draws))
+    assert np.all(delays[:, [1, 5]] == 3 - timeDim // 2)
+    assert np.all(delays[:, 2] >= 6 - timeDim // 2)
+
+
+def test_sample_delays_clips_to_last_minute():
+
+    timeDim = 4
+    cdf = np.array([[0.25, 0.5, 0.75, 0.75], [0.5, 0.5, 0.5, 0.5]])
+    rows = np.array([0, 1])
+    draws = np.array([[0.8, 0.9], [0.75, 0.5]])
+
+    delays = main.sampleDelays(getTable(cdf), rows, timeDim, draws)
+
+    assert np.array_equal(delays, np.array([[1, 1], [1, 1]]))
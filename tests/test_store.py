@@ -0,0 +1,49 @@
+import pytest
+
+import main
+
+
+def getArrival(flightNumber, scheduleTime, gate='D4', codeshares=None):
+    return ['PH-BXA', flightNumber, scheduleTime, scheduleTime, '73H', 'LHR', 'KLM', gate, '1',
+            codeshares if codeshares is not None else 'NS', 5, '12']
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = main.FlightStore(str(tmp_path / 'flights.sqlite'))
+    yield store
+    store.close()
+
+
+def test_upsert_replaces_a_flight_stored_again(store):
+
+    store.upsert('A', [getArrival('KL1000', '01-07-2018 08:00', codeshares=['AF1234', 'DL5678']),
+                       getArrival('KL1000', '02-07-2018 08:00')])
+    store.upsert('A', [getArrival('KL1000', '01-07-2018 08:00', gate='E7', codeshares=['AF1234', 'DL5678'])])
+
+    flights = store.query('A')
+
+    assert len(flights) == 2
+    assert [flight[7] for flight in flights] == ['E7', 'D4']
+    assert flights[0][9] == main.encodeCodeshares(['AF1234', 'DL5678'])
+    assert store.getFlightList('A', ['2018-07-02']) == [getArrival('KL1000', '02-07-2018 08:00')]
+    assert store.query('D') == []
+
+
+def test_upsert_refuses_flights_without_a_flight_number(store):
+
+    with pytest.raises(ValueError):
+        store.upsert('A', [getArrival('KL1000', '01-07-2018 08:00'), getArrival('NS', '01-07-2018 09:00')])
+
+    assert store.query('A') == []
+
+
+def test_has_days_only_for_added_days_of_the_direction(store):
+
+    store.addDays('A', ['2018-07-01', '2018-07-02'])
+    store.addDays('A', ['2018-07-02'])
+
+    assert store.hasDays('A', ['2018-07-01', '2018-07-02'])
+    assert not store.hasDays('A', ['2018-07-01', '2018-07-03'])
+    assert not store.hasDays('D', ['2018-07-01'])
+    assert store.hasDays('D', [])